@@ -0,0 +1,38 @@
+import importlib
+
+
+# public names and the modules they live in; a module is only imported once
+# one of its names is used, so that e.g. the codebook or schema validation
+# don't load pandas and the whole pipeline
+_exports = {
+    'GetCombinedMemberLevelData': 'asthma.data_processing',
+    'ClaimViewDataProcessing': 'asthma.data_processing',
+    'ClaimViewChunkedDataProcessing': 'asthma.data_processing',
+    'PharmacyViewDataProcessing': 'asthma.data_processing',
+    'PharmacyViewChunkedDataProcessing': 'asthma.data_processing',
+    'ClaimViewDataValidation': 'asthma.data_validation',
+    'PharmacyViewDataValidation': 'asthma.data_validation',
+    'ValidateSchema': 'asthma.validate_schema',
+    'ValidateStatistics': 'asthma.validate_statistics',
+    'MemberLevelAssembler': 'asthma.assembly',
+    'StageCheckpoints': 'asthma.checkpoint',
+    'ExecutionPlanner': 'asthma.planning',
+    'BatchRunner': 'asthma.batch',
+    'MemberFeatureStore': 'asthma.feature_store',
+    'get_compiled_codebook': 'asthma.compiled_codebook',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module 'asthma' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_exports[name]), name)
+    # cached, so that the module is only looked up once
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
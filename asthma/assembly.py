@@ -0,0 +1,48 @@
+import pandas as pd
+
+
+__all__ = ['MemberLevelAssembler']
+
+
+class MemberLevelAssembler:
+
+    def __init__(self, members=None, key='member_medicaid_id'):
+        self._members = members
+        self._key = key
+        self._blocks = []
+        self._fill_values = {}
+
+    def add(self, block, fill_values=None):
+        if self._key in block.columns:
+            block = block.set_index(self._key)
+
+        columns = [col for b in self._blocks for col in b.columns]
+        duplicated = set(columns).intersection(block.columns)
+        if duplicated:
+            raise ValueError(f'Columns {sorted(duplicated)} already added.')
+
+        # fill values are declared per column, or once for every column of
+        # the block
+        if fill_values is not None:
+            if not isinstance(fill_values, dict):
+                fill_values = {col: fill_values for col in block.columns}
+            self._fill_values.update(fill_values)
+        self._blocks.append(block)
+        return self
+
+    def _get_member_index(self):
+        if self._members is not None:
+            index = pd.Index(self._members)
+        else:
+            index = self._blocks[0].index.append(
+                [block.index for block in self._blocks[1:]])
+        return index.drop_duplicates().sort_values().rename(self._key)
+
+    def assemble(self):
+        index = self._get_member_index()
+        blocks = [block if block.index.equals(index) else block.reindex(index)
+                  for block in self._blocks]
+        df = pd.concat(blocks, axis=1)
+        for col, value in self._fill_values.items():
+            df[col] = df[col].fillna(value)
+        return df.reset_index()
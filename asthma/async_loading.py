@@ -0,0 +1,52 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from asthma.validate_schema import ValidateSchema
+from asthma.validate_statistics import ValidateStatistics
+
+
+__all__ = ['AsyncViewLoader']
+
+
+class AsyncViewLoader:
+
+    def __init__(self, views, validate_schema=True, fast_validation=False):
+        # (filepath, view) pairs, the view being 'claim' or 'pharmacy'
+        self._views = list(views)
+        self._validate_schema = validate_schema
+        # every file is checked from its footer before any is loaded
+        self._fast_validation = fast_validation
+
+    async def _load_view(self, filepath):
+        validator = ValidateSchema(filepath)
+        # footer, reference schema and data reads are all blocking calls, so
+        # they run in worker threads to overlap their I/O
+        reads = [asyncio.to_thread(pd.read_parquet, filepath)]
+        if self._validate_schema:
+            reads += [asyncio.to_thread(validator.read_default_schema),
+                      asyncio.to_thread(validator.read_data_schema)]
+        df, *schemas = await asyncio.gather(*reads)
+        if schemas:
+            validator.compare_schemas(*schemas)
+        return df
+
+    async def load_async(self):
+        return await asyncio.gather(
+            *[self._load_view(filepath) for filepath, _ in self._views])
+
+    def load(self):
+        if self._fast_validation:
+            for filepath, view in self._views:
+                ValidateStatistics(filepath, view).validate()
+
+        print('Reading {:,} views from their paths ...'
+              .format(len(self._views)))
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.load_async())
+
+        # an event loop is already running (e.g. in a notebook), so the
+        # loader gets its own loop in a separate thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.load_async()).result()
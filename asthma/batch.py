@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import argparse
+import contextlib
+import multiprocessing
+import multiprocessing.connection
+import pandas as pd
+from asthma.compiled_codebook import get_compiled_codebook
+from asthma.data_processing import GetCombinedMemberLevelData
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+__all__ = ['BatchRunner', 'main']
+
+
+def _get_address_space_size():
+    # /proc is only there on Linux; elsewhere the limit is absolute
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _init_worker(memory_limit_mb):
+    # the limit is on the address space of the worker, which runs one job
+    # at a time, so it applies per job; it comes on top of what the worker
+    # already maps (interpreter, pandas, pyarrow), as a limit below that
+    # would leave the worker unable to even report back
+    if memory_limit_mb is not None:
+        limit = _get_address_space_size() + int(memory_limit_mb * 2 ** 20)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # no-op for forked workers, which inherit the compiled codebook
+    get_compiled_codebook().compile()
+
+
+def _run_job(job, validate_schema, fast_validation):
+    start = time.perf_counter()
+    result = {'job_id': job['job_id'], 'output': job['output']}
+    directory = os.path.dirname(job['output'])
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # each job logs the pipeline messages next to its output, so that the
+    # workers don't interleave them on the console
+    with open(f"{job['output']}.log", 'w') as log, \
+            contextlib.redirect_stdout(log):
+        try:
+            df = GetCombinedMemberLevelData(
+                job['claim'], job['pharmacy'], validate_schema,
+                fast_validation=fast_validation).get_data()
+            df.to_parquet(job['output'], index=False)
+            result.update(status='done', num_members=df.shape[0])
+        except MemoryError:
+            result.update(status='failed', error='Memory limit exceeded.')
+        except Exception as e:
+            result.update(status='failed', error=f'{type(e).__name__}: {e}')
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def _run_job_in_process(job, validate_schema, fast_validation,
+                        memory_limit_mb, sender):
+    _init_worker(memory_limit_mb)
+    sender.send(_run_job(job, validate_schema, fast_validation))
+    sender.close()
+
+
+class BatchRunner:
+
+    _manifest_columns = ['claim', 'pharmacy', 'output']
+
+    def __init__(self, manifest, max_workers=None, memory_limit_mb=None,
+                 validate_schema=True, fast_validation=False):
+        if memory_limit_mb is not None and resource is None:
+            raise OSError('Memory limits are not supported on this platform.')
+
+        self.jobs = self._read_manifest(manifest)
+        self.max_workers = max_workers
+        self.memory_limit_mb = memory_limit_mb
+        self.validate_schema = validate_schema
+        self.fast_validation = fast_validation
+
+    def _read_manifest(self, manifest):
+        if isinstance(manifest, pd.DataFrame):
+            df = manifest.copy()
+        elif os.path.splitext(manifest)[-1] == '.json':
+            df = pd.read_json(manifest)
+        elif os.path.splitext(manifest)[-1] == '.csv':
+            df = pd.read_csv(manifest)
+        else:
+            raise TypeError('The manifest has to be a .csv or .json file.')
+
+        for column in self._manifest_columns:
+            if column not in df.columns:
+                raise KeyError(f'The manifest needs a "{column}" column.')
+        if df.output.duplicated().any():
+            raise ValueError('Every job needs its own output path.')
+        if 'job_id' not in df.columns:
+            df['job_id'] = [os.path.splitext(os.path.basename(path))[0]
+                            for path in df.output]
+        return df[['job_id'] + self._manifest_columns].to_dict('records')
+
+    def _start_job(self, context, job):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_job_in_process,
+            args=(job, self.validate_schema, self.fast_validation,
+                  self.memory_limit_mb, sender))
+        process.start()
+        # the worker holds the only sending end, so a worker that dies
+        # without reporting shows up as an EOF
+        sender.close()
+        return receiver, process
+
+    @staticmethod
+    def _get_result(job, receiver, process):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = {'job_id': job['job_id'], 'output': job['output'],
+                      'status': 'failed', 'seconds': None,
+                      'error': 'Worker died (e.g. out of memory).'}
+        process.join()
+        receiver.close()
+        if result['status'] == 'failed' and process.exitcode:
+            result['error'] += f' Exit code {process.exitcode}.'
+        return result
+
+    def run(self):
+        # compiled before the workers start, so that forked workers share it
+        get_compiled_codebook().compile()
+        context = multiprocessing.get_context()
+        max_workers = self.max_workers or os.cpu_count() or 1
+        print('Running {:,} jobs on {:,} workers ...'.format(len(self.jobs),
+                                                             max_workers))
+
+        # every job gets its own worker process, so that a job killed for
+        # its memory doesn't take other jobs down with it
+        results = [None] * len(self.jobs)
+        pending = list(enumerate(self.jobs))
+        running = {}
+        while pending or running:
+            while pending and len(running) < max_workers:
+                i, job = pending.pop(0)
+                receiver, process = self._start_job(context, job)
+                running[receiver] = (i, job, process)
+
+            for receiver in multiprocessing.connection.wait(list(running)):
+                i, job, process = running.pop(receiver)
+                result = self._get_result(job, receiver, process)
+                results[i] = result
+                if result['status'] == 'done':
+                    detail = '{:,} members in {:.2f} seconds'.format(
+                        result['num_members'], result['seconds'])
+                else:
+                    detail = result['error']
+                print('   [{}/{}] {} {} ({})'.format(
+                    sum(r is not None for r in results), len(self.jobs),
+                    job['job_id'], result['status'], detail))
+        return pd.DataFrame(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Build member-level data for every claim and pharmacy '
+                    'file pair of a manifest (.csv or .json with claim, '
+                    'pharmacy and output columns).')
+    parser.add_argument('manifest')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--memory-limit-mb', type=int, default=None)
+    parser.add_argument('--no-schema-validation', action='store_true')
+    parser.add_argument('--fast-validation', action='store_true')
+    parser.add_argument('--report', default=None,
+                        help='Path of a .csv file for the job results.')
+    args = parser.parse_args(argv)
+
+    results = BatchRunner(
+        args.manifest, max_workers=args.workers,
+        memory_limit_mb=args.memory_limit_mb,
+        validate_schema=not args.no_schema_validation,
+        fast_validation=args.fast_validation).run()
+    if args.report is not None:
+        results.to_csv(args.report, index=False)
+    num_failed = (results.status == 'failed').sum()
+    print('{:,} jobs done, {:,} failed.'.format(
+        results.shape[0] - num_failed, num_failed))
+    return 1 if num_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
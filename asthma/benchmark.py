@@ -0,0 +1,404 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from asthma.codebook import CONTROLLERS
+from asthma.data_processing import GetCombinedMemberLevelData
+
+
+class SyntheticViews:
+
+    _diagnosis_codes = np.array(
+        ['J45.20', 'J4521', 'j45.909', 'J45 .909', 'J82.33', '493.90',
+         '49390', 'J30.9', '477.1', 'E66.01', '278.00', 'G47.33', '327.23',
+         'K21.9', '530.81', 'R05', 'Z00.00', '', '', '', '', '', ''],
+        dtype=object)
+    _icd_9_codes = ['493.90', '49390', '477.1', '278.00', '327.23', '530.81']
+    _revenue_codes = np.array(
+        [100, 120, 450, 451, 981, 510, 520, 250, 300, 636, 720, 982],
+        dtype=float)
+    _pos_codes = np.array(
+        ['11', ' 21', '23 ', 'Not Applicable', '02', '10', '22', '81', '41',
+         '6'], dtype=object)
+    _claim_diagnosis_columns = (
+        ['claim_header_diagnosis_primary'] +
+        [f'claim_header_diagnosis_{i}' for i in range(2, 8)] +
+        [f'claim_line_diagnosis_{i}' for i in range(1, 5)])
+
+    def __init__(self, num_members=1_000, num_claims=20_000,
+                 num_prescriptions=10_000, seed=0):
+        self.num_members = num_members
+        self.num_claims = num_claims
+        self.num_prescriptions = num_prescriptions
+        self.seed = seed
+
+    def get_params(self):
+        return {'num_members': self.num_members,
+                'num_claims': self.num_claims,
+                'num_prescriptions': self.num_prescriptions,
+                'seed': self.seed}
+
+    def _get_member_ids(self, rng, n):
+        return (100_000 + rng.integers(0, self.num_members, n)).astype(str)
+
+    def get_claims(self):
+        rng = np.random.default_rng(self.seed)
+        n = self.num_claims
+        ids = self._get_member_ids(rng, n)
+        df = pd.DataFrame({
+            # padded ids exercise the id clean-up in the pipeline
+            'member_medicaid_id': np.char.add(' ', ids).astype(object),
+            'member_first_name': np.char.add('FIRST', ids).astype(object),
+            'member_last_name': np.char.add('LAST', ids).astype(object),
+            'claimid': (np.arange(n) // 3).astype(str).astype(object),
+            'dos_from': (pd.Timestamp('2020-01-01') +
+                         pd.to_timedelta(rng.integers(0, 730, n), unit='D')),
+            'revenue_code': rng.choice(self._revenue_codes, n),
+            'place_of_service': rng.choice(self._pos_codes, n),
+            'total_paid_amt': rng.gamma(2, 100, n).round(2),
+            'attending_providerid': rng.choice(
+                np.array([f'P{i}' for i in range(50)], dtype=object), n),
+        })
+        df.loc[rng.random(n) < 0.05, 'revenue_code'] = np.nan
+
+        for col in self._claim_diagnosis_columns:
+            codes = rng.choice(self._diagnosis_codes, n)
+            df[col] = codes
+            df[f'{col}_icd_vers'] = np.where(
+                codes == '', np.nan,
+                np.where(np.isin(codes, self._icd_9_codes), 9, 10))
+        for i in range(1, 3):
+            codes = rng.choice(np.array(['0DB68ZX', '99213', ''],
+                                        dtype=object), n)
+            df[f'claim_procedure_{i}'] = codes
+            df[f'claim_procedure_{i}_icd_vers'] = np.where(codes == '',
+                                                           np.nan, 10)
+        return df
+
+    def get_pharmacy(self):
+        rng = np.random.default_rng(self.seed + 1)
+        n = self.num_prescriptions
+        names = np.array(CONTROLLERS[:40] +
+                         ['ALBUTEROL 90 MCG/INH', 'LEVALBUTEROL HCL',
+                          'AMOXICILLIN 500 MG', ' montelukast sodium tab 10 mg '
+                          '(base equiv) '], dtype=object)
+        return pd.DataFrame({
+            'member_medicaid_id': self._get_member_ids(rng, n).astype(object),
+            'claim_start_date': (pd.Timestamp('2020-06-01') +
+                                 pd.to_timedelta(rng.integers(0, 540, n),
+                                                 unit='D')),
+            'drug_strength': '10 MG',
+            'drug_product_name': 'PRODUCT',
+            'claim_status': rng.choice(
+                np.array(['PAID', 'paid ', 'REVERSED'], dtype=object), n),
+            'refill_code': rng.integers(0, 3, n),
+            'days_supply': rng.choice([15, 30, 60, 90], n),
+            'generic_product_name': rng.choice(names, n),
+            'pharmacy_name': 'PHARMACY',
+            'pharmacy_phone_number': '5550000000',
+            'member_age_on_date_of_service': rng.integers(0, 18, n),
+        })
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        filepath_claim = os.path.join(directory, 'claims.parquet')
+        filepath_pharmacy = os.path.join(directory, 'pharmacy.parquet')
+        self.get_claims().to_parquet(filepath_claim, index=False)
+        self.get_pharmacy().to_parquet(filepath_pharmacy, index=False)
+        return filepath_claim, filepath_pharmacy
+
+
+class MemberLevelChecksums:
+
+    def __init__(self, key='member_medicaid_id', decimals=6):
+        self._key = key
+        self._decimals = decimals
+
+    def _get_column_checksum(self, members, values):
+        # nulls are hashed as an indicator next to a filled value, so that
+        # the checksum doesn't depend on the NaN bit pattern
+        is_null = values.isnull().to_numpy()
+        if pd.api.types.is_float_dtype(values):
+            values = values.round(self._decimals).fillna(0)
+        elif pd.api.types.is_object_dtype(values):
+            values = values.fillna('').astype(str)
+        frame = pd.DataFrame({'member': members, 'value': values.to_numpy(),
+                              'is_null': is_null})
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        # summing the (member, value) hashes makes the checksum independent
+        # of the row order
+        return '{:016x}'.format(int(hashes.sum(dtype=np.uint64)))
+
+    def get_checksums(self, df):
+        members = df[self._key].astype(str).str.strip().to_numpy()
+        return {
+            'num_rows': int(df.shape[0]),
+            'columns': {col: {'dtype': str(df[col].dtype),
+                              'checksum': self._get_column_checksum(
+                                  members, df[col].reset_index(drop=True))}
+                        for col in df.columns if col != self._key},
+        }
+
+    @staticmethod
+    def compare(golden, checksums):
+        golden_columns = golden['columns']
+        columns = checksums['columns']
+        return {
+            'num_rows_match': golden['num_rows'] == checksums['num_rows'],
+            'missing_columns': [c for c in golden_columns if c not in columns],
+            'extra_columns': [c for c in columns if c not in golden_columns],
+            'mismatched_columns': [c for c in golden_columns if c in columns
+                                   and golden_columns[c] != columns[c]],
+        }
+
+
+class BenchmarkHistory:
+
+    def __init__(self, history_path):
+        self._history_path = history_path
+
+    def _write_json(self, path, obj):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
+
+    def _append_history(self, record):
+        history = []
+        if os.path.exists(self._history_path):
+            with open(self._history_path) as f:
+                history = json.load(f)
+        history.append(record)
+        self._write_json(self._history_path, history)
+
+    @staticmethod
+    def _get_git_revision():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+class RegressionBenchmark(BenchmarkHistory):
+
+    def __init__(self, history_path, golden_path, views=None, repeat=3,
+                 measure_memory=True, verbose=False):
+        super().__init__(history_path)
+        self._golden_path = golden_path
+        self._views = views if views is not None else SyntheticViews()
+        self._repeat = repeat
+        self._measure_memory = measure_memory
+        self._verbose = verbose
+
+    def _run_pipeline(self, filepath_claim, filepath_pharmacy):
+        stdout = sys.stdout if self._verbose else io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            return GetCombinedMemberLevelData(
+                filepath_claim, filepath_pharmacy,
+                validate_schema=False).get_data()
+
+    def _time_pipeline(self, filepaths):
+        seconds = []
+        for i in range(self._repeat):
+            start = time.perf_counter()
+            df = self._run_pipeline(*filepaths)
+            seconds.append(time.perf_counter() - start)
+            print('   Run {:,} out of {:,}: {:.2f} seconds'
+                  .format(i + 1, self._repeat, seconds[-1]))
+        return df, seconds
+
+    def _get_peak_memory(self, filepaths):
+        # a separate traced run, so that tracing overhead doesn't leak into
+        # the timings
+        tracemalloc.start()
+        try:
+            self._run_pipeline(*filepaths)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 2 ** 20
+
+    def _read_golden(self):
+        if not os.path.exists(self._golden_path):
+            return None
+        with open(self._golden_path) as f:
+            golden = json.load(f)
+        if golden['inputs'] != self._views.get_params():
+            raise ValueError('Golden checksums were created from different '
+                             'synthetic inputs.')
+        return golden
+
+    def _check_output(self, df, update_golden):
+        checksums = MemberLevelChecksums().get_checksums(df)
+        golden = None if update_golden else self._read_golden()
+        if golden is None:
+            self._write_json(self._golden_path,
+                             {'inputs': self._views.get_params(), **checksums})
+            print('Golden checksums written to {}'.format(self._golden_path))
+            return {'status': 'created'}
+
+        result = MemberLevelChecksums.compare(golden, checksums)
+        match = (result['num_rows_match'] and
+                 not any(result[k] for k in ['missing_columns',
+                                             'extra_columns',
+                                             'mismatched_columns']))
+        return {'status': 'match' if match else 'mismatch', **result}
+
+    def run(self, update_golden=False):
+        with tempfile.TemporaryDirectory() as directory:
+            print('Writing synthetic views ...')
+            filepaths = self._views.write(directory)
+            print('Running the pipeline {:,} times ...'.format(self._repeat))
+            df, seconds = self._time_pipeline(filepaths)
+            peak_memory = None
+            if self._measure_memory:
+                print('Measuring peak memory ...')
+                peak_memory = self._get_peak_memory(filepaths)
+
+        num_input_rows = (self._views.num_claims +
+                          self._views.num_prescriptions)
+        best = min(seconds)
+        record = {
+            'run_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': self._get_git_revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'inputs': self._views.get_params(),
+            'seconds': seconds,
+            'best_seconds': best,
+            'input_rows_per_second': num_input_rows / best,
+            'members_per_second': df.shape[0] / best,
+            'peak_memory_mb': peak_memory,
+            'output_shape': list(df.shape),
+            'golden': self._check_output(df, update_golden),
+        }
+        self._append_history(record)
+
+        print('Best of {:,}: {:.2f} seconds ({:,.0f} input rows/second)'
+              .format(self._repeat, best, record['input_rows_per_second']))
+        if peak_memory is not None:
+            print('Peak traced memory: {:,.1f} MB'.format(peak_memory))
+        print('Golden checksums: {}'.format(record['golden']['status']))
+        if record['golden']['status'] == 'mismatch':
+            print('   Mismatched columns: {}'.format(
+                record['golden']['mismatched_columns']))
+        return record
+
+
+class ImportBenchmark(BenchmarkHistory):
+
+    # modules imported on their own, e.g. by validation jobs and pool
+    # workers, and the heavy dependencies the light ones must not load
+    _modules = ['asthma', 'asthma.codebook', 'asthma.compiled_codebook',
+                'asthma.validate_schema', 'asthma.data_validation',
+                'asthma.data_processing', 'asthma.batch']
+    _light_modules = ['asthma', 'asthma.codebook', 'asthma.compiled_codebook',
+                      'asthma.validate_schema']
+    _dependencies = ['numpy', 'pandas', 'pyarrow', 'fuzzywuzzy', 'dateutil',
+                     'duckdb']
+    _script = '''
+import sys, json, time, importlib
+start = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [
+    name for name in {dependencies!r} if name in sys.modules]}}))
+'''
+
+    def __init__(self, history_path, repeat=5):
+        super().__init__(history_path)
+        self._repeat = repeat
+
+    def _time_import(self, module):
+        # a fresh interpreter for every import, as in a job or a worker
+        script = self._script.format(module=module,
+                                     dependencies=self._dependencies)
+        package_dir = os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, '-c', script],
+                                capture_output=True, text=True, check=True,
+                                cwd=package_dir).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run(self):
+        print('Timing the imports of {:,} modules ({:,} runs each) ...'
+              .format(len(self._modules), self._repeat))
+        modules = {}
+        for module in self._modules:
+            runs = [self._time_import(module) for _ in range(self._repeat)]
+            modules[module] = {
+                'best_seconds': min(run['seconds'] for run in runs),
+                'loaded': runs[0]['loaded']}
+            print('   {:<26} {:>8.1f} ms   {}'.format(
+                module, modules[module]['best_seconds'] * 1_000,
+                ', '.join(modules[module]['loaded']) or '-'))
+
+        heavy = [module for module in self._light_modules
+                 if modules[module]['loaded']]
+        record = {
+            'run_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': self._get_git_revision(),
+            'python': platform.python_version(),
+            'modules': modules,
+            'status': 'heavy' if heavy else 'ok',
+            'heavy_modules': heavy,
+        }
+        self._append_history(record)
+        if heavy:
+            print('Heavy dependencies loaded by: {}'.format(heavy))
+        else:
+            print('Light modules load no heavy dependencies.')
+        return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the member-level pipeline on synthetic views '
+                    'and check its output against golden checksums.')
+    parser.add_argument('--history', default='benchmarks/history.json')
+    parser.add_argument('--golden', default='benchmarks/golden.json')
+    parser.add_argument('--members', type=int, default=1_000)
+    parser.add_argument('--claims', type=int, default=20_000)
+    parser.add_argument('--prescriptions', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--update-golden', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--imports', action='store_true',
+                        help='Time the package imports instead.')
+    parser.add_argument('--import-history',
+                        default='benchmarks/import_history.json')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        record = ImportBenchmark(args.import_history,
+                                 repeat=args.repeat).run()
+        return 1 if record['status'] == 'heavy' else 0
+
+    views = SyntheticViews(args.members, args.claims, args.prescriptions,
+                           args.seed)
+    record = RegressionBenchmark(
+        args.history, args.golden, views, repeat=args.repeat,
+        measure_memory=not args.no_memory,
+        verbose=args.verbose).run(update_golden=args.update_golden)
+    return 1 if record['golden']['status'] == 'mismatch' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+import datetime
+import pandas as pd
+from asthma.compiled_codebook import get_compiled_codebook
+
+
+__all__ = ['StageCheckpoints']
+
+
+class StageCheckpoints:
+
+    _manifest_name = 'manifest.json'
+
+    def __init__(self, directory, stages, resume=False):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._manifest_path = os.path.join(directory, self._manifest_name)
+        self.resume = resume
+        self.manifest = self._read_manifest()
+        self.fingerprints = self._get_stage_fingerprints(stages)
+
+    def _read_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {'stages': {}}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        # replaced in one step, so that a crash never leaves a half-written
+        # manifest behind
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path)
+
+    @staticmethod
+    def get_file_fingerprint(filepath):
+        # size and modification time instead of a hash of the contents,
+        # which would take as long as reading the file
+        stat = os.stat(filepath)
+        return {'path': os.path.abspath(filepath), 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns}
+
+    @staticmethod
+    def get_fingerprint(*inputs):
+        payload = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _get_stage_fingerprints(self, stages):
+        # stages are (name, inputs) in the order they run, and every stage
+        # is fingerprinted together with the one before it; the first one
+        # starts from the codebook version, as the flags and visit types
+        # depend on the codes
+        fingerprints = {}
+        previous = get_compiled_codebook().version
+        for stage, inputs in stages:
+            previous = self.get_fingerprint(previous, stage, *inputs)
+            fingerprints[stage] = previous
+        return fingerprints
+
+    def _get_path(self, stage):
+        entry = self.manifest['stages'].get(stage)
+        if not self.resume or entry is None or \
+                entry['fingerprint'] != self.fingerprints[stage]:
+            return None
+        path = os.path.join(self._directory, entry['filename'])
+        return path if os.path.exists(path) else None
+
+    def is_resumable(self, *stages):
+        return all(self._get_path(stage) is not None for stage in stages)
+
+    def _save(self, stage, df):
+        filename = f'{stage}.parquet'
+        path = os.path.join(self._directory, filename)
+        df.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        self.manifest['stages'][stage] = {
+            'fingerprint': self.fingerprints[stage], 'filename': filename,
+            'num_rows': int(df.shape[0]),
+            'completed_at': datetime.datetime.now().isoformat(
+                timespec='seconds')}
+        self._write_manifest()
+
+    def run(self, stage, func):
+        path = self._get_path(stage)
+        if path is not None:
+            print(f'Resuming from the "{stage}" checkpoint ...')
+            return pd.read_parquet(path)
+        df = func()
+        self._save(stage, df)
+        return df
@@ -1,44 +1,57 @@
 import re
 import numpy as np
 import pandas as pd
-from pandas.testing import assert_series_equal
-from asthma.codebook import *
+import pyarrow as pa
+import pyarrow.compute as pc
+from asthma.codebook import ASTHMA_ICD_9_MIN_THRESH, VISIT_TYPES
+from asthma.compiled_codebook import get_compiled_codebook
+from asthma.claim.claim_data_validation_cls import ParsePlaceOfServiceCodes
+from asthma.column_parallel import ColumnParallelExecutor
+
+
+__all__ = ['IdentifyAsthmaRelatedClaims', 'IdentifyVisitTypes',
+           'ProcessMemberMedicaidIDs']
 
 
 class IdentifyAsthmaRelatedClaims:
 
-    @staticmethod
-    def _process_diagnosis_code_column(df, col):
-        arr = df[col].str.strip().copy()
-        arr = arr.str.upper()
-        if arr.str.contains(' ').sum() > 0:
-            arr = arr.str.split().str.join('')
-
-        idx = (arr
-               .loc[lambda x: x.str.contains('\\.') == False]
-               .loc[lambda x: x.str.len() > 3]
-               .index)
-        if idx.shape[0]:
-            arr[idx] = arr[idx].map(lambda x: x[:3] + '.' + x[3:]).values
-
-        idx = arr.loc[lambda x: x.str.strip() == ''].index
-        if idx.shape[0]:
-            arr[idx] = np.nan
-        return arr
+    def __init__(self, max_workers=None):
+        self._executor = ColumnParallelExecutor(max_workers)
+        self._asthma_icd_10_codes = pa.array(
+            get_compiled_codebook().asthma_icd_10_code_array, type=pa.string())
 
     @staticmethod
-    def _identify_asthma_claims(df, code_col):
-        icd_col = f'{code_col}_icd_vers'
-        arr = np.where(df[code_col].isin(ASTHMA_ICD_10_CM_CODES), 1, 0)
-        arr = pd.Series(arr)
-        idx = (df
-               .loc[lambda x: x[icd_col] == 9]
-               .loc[lambda x: (x[code_col]
-                               .str.startswith(ASTHMA_ICD_9_MIN_THRESH))]
-               .index)
-        if idx.shape[0]:
-            arr[idx] = 1
-        return arr.values
+    def _process_diagnosis_codes(arr):
+        arr = pc.utf8_upper(pc.utf8_trim_whitespace(arr))
+        if pc.any(pc.match_substring(arr, ' ')).as_py():
+            arr = pc.replace_substring_regex(arr, r'\s+', '')
+
+        # codes without a period get one after their first three characters
+        idx = pc.and_(pc.invert(pc.match_substring(arr, '.')),
+                      pc.greater(pc.utf8_length(arr), 3))
+        arr = pc.if_else(idx, pc.binary_join_element_wise(
+            pc.utf8_slice_codeunits(arr, 0, 3),
+            pc.utf8_slice_codeunits(arr, 3), '.'), arr)
+        return pc.if_else(pc.equal(arr, ''), pa.scalar(None, pa.string()), arr)
+
+    def _identify_asthma_claims(self, codes, icd_vers):
+        is_icd_10 = pc.is_in(codes, value_set=self._asthma_icd_10_codes)
+        # Kleene logic, so that a missing ICD version doesn't hide an ICD-10
+        # match
+        is_icd_9 = pc.and_kleene(
+            pc.equal(icd_vers, 9),
+            pc.starts_with(codes, ASTHMA_ICD_9_MIN_THRESH))
+        return pc.fill_null(pc.or_kleene(is_icd_10, is_icd_9), False)
+
+    def _process_diagnosis_code_column(self, df, col):
+        codes = self._process_diagnosis_codes(
+            pa.array(df[col].values, type=pa.string(), from_pandas=True))
+        icd_vers = pa.array(df[f'{col}_icd_vers'].values, from_pandas=True)
+        flags = self._identify_asthma_claims(codes, icd_vers)
+
+        codes = codes.to_numpy(zero_copy_only=False)
+        codes = np.where(pd.isnull(codes), np.nan, codes)
+        return codes, flags.to_numpy(zero_copy_only=False)
 
     @staticmethod
     def _get_diagnosis_columns(df):
@@ -52,117 +65,100 @@ class IdentifyAsthmaRelatedClaims:
 
         diagnosis_cols = self._get_diagnosis_columns(df)
         print('Extracting asthma flags ...')
-        print('   Processing Diagnosis codes ...')
-        for col in diagnosis_cols:
-            df[col] = self._process_diagnosis_code_column(df, col)
-
-        print('   Identifying asthma-related claims ...')
-        df['prm_as'] = 0
-        df['prm_sec_as'] = 0
-        for col in diagnosis_cols:
-            arr = self._identify_asthma_claims(df, col)
-            idx = np.where(arr == 1)
+        print('   Processing Diagnosis codes and identifying asthma-related '
+              'claims ...')
+        # columns are processed in worker threads and only written back to
+        # the frame here
+        results = self._executor.map(
+            lambda col: self._process_diagnosis_code_column(df, col),
+            diagnosis_cols)
+
+        prm_as = np.zeros(df.shape[0], dtype=bool)
+        prm_sec_as = np.zeros(df.shape[0], dtype=bool)
+        for col, (codes, flags) in zip(diagnosis_cols, results):
+            df[col] = codes
             if 'primary' in col:
-                df['prm_as'].loc[idx] = 1
-            df['prm_sec_as'].loc[idx] = 1
+                prm_as |= flags
+            prm_sec_as |= flags
+        df['prm_as'] = prm_as.astype(int)
+        df['prm_sec_as'] = prm_sec_as.astype(int)
 
 
 class IdentifyVisitTypes:
 
-    @staticmethod
-    def _process_pos_codes(df):
-        arr = df.place_of_service.str.strip().copy()
-        arr = arr.str.replace('Not Applicable', '00')
-        arr = arr.astype(int)
-        idx_null = arr.loc[lambda x: x == 0].index
-        arr.loc[idx_null] = np.nan
-        return arr
-
-    @staticmethod
-    def _generate_visit_ids(df):
-        return (df[['member_medicaid_id', 'dos_from']]
-                .assign(MEMBER_ID=lambda x: x.member_medicaid_id.astype(str),
-                        dos=lambda x: x.dos_from.map(
-                            lambda row: row.strftime('%Y%m%d')))
-                [['MEMBER_ID', 'dos']]
-                .apply(lambda x: '-'.join(x.values), axis=1))
-
-    @staticmethod
-    def _identify_ed_rev_codes(df):
-        return np.where(df.revenue_code.isin(ED_REV_CODES), 1, 0)
+    def __init__(self, visit_types=None):
+        if visit_types is None:
+            # the default tables are built once per process
+            compiled = get_compiled_codebook()
+            self.visit_types = VISIT_TYPES
+            self.visit_type_bits = compiled.visit_type_bits
+            self._bit_dtype = compiled.visit_type_bit_dtype
+            self._rev_code_table = compiled.rev_code_table
+            self._pos_code_table = compiled.pos_code_table
+            return
+
+        self.visit_types = visit_types
+        self.visit_type_bits = {name: 1 << bit
+                                for bit, name in enumerate(visit_types)}
+        self._bit_dtype = np.min_scalar_type((1 << len(visit_types)) - 1)
+        # revenue codes are in 100-9999 and place of service codes in 0-99
+        self._rev_code_table = self._build_lookup_table('rev_codes', 10_000)
+        self._pos_code_table = self._build_lookup_table('pos_codes', 100)
+
+    def _build_lookup_table(self, key, size):
+        table = np.zeros(size, dtype=self._bit_dtype)
+        for name, spec in self.visit_types.items():
+            table[spec[key]] |= self.visit_type_bits[name]
+        return table
 
     @staticmethod
-    def _identify_inpt_rev_codes(df):
-        return np.where(df.revenue_code.isin(INPT_REV_CODES), 1, 0)
+    def _lookup_codes(table, codes):
+        values = codes.fillna(0).values
+        arr = values.astype(np.int64)
+        valid = (arr == values) & (arr >= 0) & (arr < table.shape[0])
+        return np.where(valid, table[np.where(valid, arr, 0)], 0)
 
     @staticmethod
-    def _identify_outpt_rev_codes(df):
-        return np.where(df.revenue_code.isin(OUTPT_REV_CODES), 1, 0)
+    def _process_pos_codes(df):
+        # validated data already carries the parsed codes
+        arr = ParsePlaceOfServiceCodes.parse(df.place_of_service)
+        return arr.where(arr != 0).astype(float)
 
     @staticmethod
-    def _identify_ed_pos_codes(df):
-        return np.where(df.place_of_service.isin(ED_POS_CODES), 1, 0)
+    def _generate_visit_ids(df):
+        idx, dates = pd.factorize(df.dos_from)
+        dates = np.append(dates.strftime('%Y%m%d').values.astype(object), '')
+        return df.member_medicaid_id.astype(str) + '-' + dates[idx]
 
-    @staticmethod
-    def _identify_inpt_pos_codes(df):
-        return np.where(df.place_of_service.isin(INPT_POS_CODES), 1, 0)
-
-    @staticmethod
-    def _identify_outpt_pos_codes(df):
-        return np.where(df.place_of_service.isin(OUTPT_POS_CODES), 1, 0)
-
-    def _identify_inpatient_visits(self, df):
-        arr_rev = self._identify_inpt_rev_codes(df)
-        arr_pos = self._identify_inpt_pos_codes(df)
-        arr_pos[np.where(arr_rev == 1)] = 1
-        return arr_pos
-
-    def _identify_ed_visits(self, df):
-        arr_rev = self._identify_ed_rev_codes(df)
-        arr_pos = self._identify_ed_pos_codes(df)
-        arr_pos[np.where(arr_rev == 1)] = 1
-        return arr_pos
-
-    def _identify_outpatient_visits(self, df):
-        arr_rev = self._identify_outpt_rev_codes(df)
-        arr_pos = self._identify_outpt_pos_codes(df)
-        arr_pos[np.where(arr_rev == 1)] = 1
-        return arr_pos
+    def _identify_visit_bits(self, df):
+        return (self._lookup_codes(self._rev_code_table, df.revenue_code) |
+                self._lookup_codes(self._pos_code_table, df.place_of_service))
 
     def extract_visit_types(self, df):
         print('Identifying visit types ...')
         df['place_of_service'] = self._process_pos_codes(df)
         df['visitID'] = self._generate_visit_ids(df)
 
-        # identify cases in the order of inpatient-ed-outpatient
-        df['inpt'] = self._identify_inpatient_visits(df)
-        inpt_visit_ids = df.loc[lambda x: x.inpt == 1].visitID.unique()
-        df.loc[lambda x: x.visitID.isin(inpt_visit_ids), 'inpt'] = 1
-        print('   Inpatient visits extracted...')
-
-        df['ED'] = 0
-        arr_ED = np.where(self._identify_ed_visits(df) == 1)
-        ed_visit_ids = df.loc[arr_ED].visitID.unique()
-        ed_visit_ids = list(set(ed_visit_ids).difference(set(inpt_visit_ids)))
-        df.loc[lambda x: x.visitID.isin(ed_visit_ids), 'ED'] = 1
-        print('   ED visits extracted...')
+        # a visit gets the bits of all of its lines; precedence between the
+        # visit types is then resolved on the visit-level bits
+        visit_idx, visit_ids = pd.factorize(df.visitID)
+        visit_bits = np.zeros(visit_ids.shape[0], dtype=self._bit_dtype)
+        np.bitwise_or.at(visit_bits, visit_idx, self._identify_visit_bits(df))
+        visit_bits = visit_bits[visit_idx]
 
-        df['outpt'] = 0
-        arr_outpt = np.where(self._identify_outpatient_visits(df) == 1)
-        outpt_visit_ids = df.loc[arr_outpt].visitID.unique()
-        outpt_visit_ids = set(outpt_visit_ids).difference(set(ed_visit_ids))
-        outpt_visit_ids = list(outpt_visit_ids.difference(set(inpt_visit_ids)))
-        df.loc[lambda x: x.visitID.isin(outpt_visit_ids), 'outpt'] = 1
-        print('   Outpatient visits extracted...')
-
-        assert set(inpt_visit_ids).intersection(set(ed_visit_ids)) == set()
-        assert set(inpt_visit_ids).intersection(set(outpt_visit_ids)) == set()
-        assert set(ed_visit_ids).intersection(set(outpt_visit_ids)) == set()
+        for name, spec in self.visit_types.items():
+            excluded = sum(self.visit_type_bits[x] for x in spec['excludes'])
+            df[name] = (((visit_bits & self.visit_type_bits[name]) > 0) &
+                        ((visit_bits & excluded) == 0)).astype(int)
+            print(f'   {name} visits extracted...')
 
 
 class ProcessMemberMedicaidIDs:
 
-    def __init__(self):
+    def __init__(self, check_ids=True):
+        # the ids are only stripped for a part of the file, e.g. a member
+        # bucket, as a claim may be split across the parts
+        self.check_ids = check_ids
         self._multiple_medicaid_ids = None
 
     @staticmethod
@@ -192,6 +188,9 @@ class ProcessMemberMedicaidIDs:
                  .member_medicaid_id
                  .value_counts())
 
+        # pandas.testing is only needed here, so it isn't loaded on import
+        from pandas.testing import assert_series_equal
+
         try:
             assert_series_equal(left, right)
         except AssertionError:
@@ -222,8 +221,11 @@ class ProcessMemberMedicaidIDs:
             self._multiple_medicaid_ids = pd.DataFrame(l)
 
     def process_medicaid_ids(self, df):
-        print('Checking Member Medicaid IDs ...')
+        if self.check_ids:
+            print('Checking Member Medicaid IDs ...')
         df['member_medicaid_id'] = self._process_member_medicaid_ids(df)
+        if not self.check_ids:
+            return
         self._identify_alphanumeric_ids(df)
         self._check_multiple_medicaid_ids(df)
 
@@ -1,10 +1,24 @@
 import re
-from pandas.testing import assert_index_equal
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from asthma.column_parallel import ColumnParallelExecutor
+
+
+__all__ = ['DiagnosisCodeValidation', 'ValidateRevenueCodes',
+           'ParsePlaceOfServiceCodes', 'ValidatePlaceOfServiceCodes']
 
 
 class DiagnosisCodeValidation:
 
-    def __init__(self):
+    _report_columns = ['code_column', 'icd_column', 'blank_codes',
+                       'missing_icds', 'mismatches', 'sample_rows']
+
+    def __init__(self, num_sample_rows=5, max_workers=None):
+        self.num_sample_rows = num_sample_rows
+        self._executor = ColumnParallelExecutor(max_workers)
+        self.report = None
         self._validated = False
 
     @staticmethod
@@ -25,21 +39,58 @@ class DiagnosisCodeValidation:
         self.code_icd_columns = d_cols
         return d_cols
 
-    def _validate_diagnosis_and_procedure_code_columns(self, df):
+    def _get_code_icd_pairs(self, df):
         d_cols = self._select_code_and_icd_columns(df)
-        for key, value in d_cols.items():
-            code_cols, icd_cols = value['code'], value['icd']
-            for code, icd in zip(code_cols, icd_cols):
-                code_null_idx = (df[code].loc[lambda x: x.str.strip() == '']
-                                 .index)
-                icd_null_idx = df[icd].loc[lambda x: x.isnull()].index
-
-                try:
-                    assert_index_equal(code_null_idx, icd_null_idx)
-                except AssertionError:
-                    if not set(icd_null_idx).issubset(set(code_null_idx)):
-                        msg = f'{code} needs manual missing values check!'
-                        raise ValueError(msg)
+        return [(code, icd) for value in d_cols.values()
+                for code, icd in zip(value['code'], value['icd'])]
+
+    @staticmethod
+    def _is_blank_code(codes):
+        try:
+            arr = pa.array(codes, type=pa.string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed types, e.g. numeric procedure codes
+            return (pd.Series(codes).str.strip() == '').values
+        arr = pc.equal(pc.utf8_trim_whitespace(arr), '')
+        return pc.fill_null(arr, False).to_numpy(zero_copy_only=False)
+
+    def _get_blank_code_mask(self, df, code_cols):
+        return np.vstack(self._executor.map(
+            lambda col: self._is_blank_code(df[col].values), code_cols))
+
+    def _get_null_consistency_report(self, df):
+        pairs = self._get_code_icd_pairs(df)
+        if not pairs:
+            return pd.DataFrame(columns=self._report_columns)
+
+        code_cols, icd_cols = [list(x) for x in zip(*pairs)]
+        code_blank = self._get_blank_code_mask(df, code_cols)
+        icd_null = df[icd_cols].isnull().values.T
+        # an ICD version may only be missing where the code is blank
+        mismatches = icd_null & ~code_blank
+        counts = mismatches.sum(axis=1)
+        samples = [df.index[row[:self.num_sample_rows]].tolist() for row in
+                   (np.flatnonzero(m) for m in mismatches)]
+        return pd.DataFrame({'code_column': code_cols,
+                             'icd_column': icd_cols,
+                             'blank_codes': code_blank.sum(axis=1),
+                             'missing_icds': icd_null.sum(axis=1),
+                             'mismatches': counts,
+                             'sample_rows': samples},
+                            columns=self._report_columns)
+
+    def _validate_diagnosis_and_procedure_code_columns(self, df):
+        self.report = self._get_null_consistency_report(df)
+        failed = self.report.loc[lambda x: x.mismatches > 0]
+        if failed.shape[0]:
+            for _, row in failed.iterrows():
+                print(f'\n      {row.code_column}: {row.mismatches:,} rows '
+                      f'with a code but no ICD version, e.g. rows '
+                      f'{row.sample_rows}', end='')
+            print()
+            msg = (f'{", ".join(failed.code_column)} needs manual missing '
+                   f'values check!')
+            raise ValueError(msg)
 
     def validate(self, df):
         print('   Validating Diagnosis and Procedure Codes ...', end=' ')
@@ -63,21 +114,49 @@ class ValidateRevenueCodes:
         print('Done!')
 
 
+class ParsePlaceOfServiceCodes:
+
+    @staticmethod
+    def _parse_distinct_codes(codes):
+        if pd.api.types.is_integer_dtype(codes):
+            return codes.values.astype(np.int64)
+        arr = pd.Series(codes).str.strip()
+        arr = arr.str.replace('Not Applicable', '00')
+        return arr.astype(int).values
+
+    @staticmethod
+    def parse(place_of_service_codes):
+        if place_of_service_codes.dtype == np.int8:
+            return place_of_service_codes
+
+        # there are only a few distinct codes, so only those are parsed and
+        # decoded back to the rows; 0 stands for 'Not Applicable'
+        idx, codes = pd.factorize(place_of_service_codes)
+        if (idx == -1).any():
+            raise ValueError('Place of service codes cannot be missing.')
+        codes = ParsePlaceOfServiceCodes._parse_distinct_codes(codes)
+        if codes.min() < 0 or codes.max() > 99:
+            raise ValueError('Place of service codes must be in 0-99.')
+        return pd.Series(codes.astype(np.int8)[idx],
+                         index=place_of_service_codes.index,
+                         name=place_of_service_codes.name)
+
+
 class ValidatePlaceOfServiceCodes:
 
     @staticmethod
     def _validate_place_of_service_codes(place_of_service_codes):
-        arr = place_of_service_codes.str.strip().copy()
-        arr = arr.str.replace('Not Applicable', '00')
-        arr = arr.astype(int)
+        arr = ParsePlaceOfServiceCodes.parse(place_of_service_codes)
         assert arr.loc[lambda x: x == 0].shape[0] < arr.shape[0]
         assert arr.max() < 100
         assert arr.min() >= 0
+        return arr
 
     def validate(self, place_of_service_codes):
         print('   Validating Place of Service Codes ...', end=' ')
-        self._validate_place_of_service_codes(place_of_service_codes)
+        arr = self._validate_place_of_service_codes(place_of_service_codes)
         print('Done!')
+        return arr
 
 
 
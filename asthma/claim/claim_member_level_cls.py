@@ -1,505 +1,702 @@
 import re
 import numpy as np
-from datetime import datetime
+import pandas as pd
 from dateutil.relativedelta import relativedelta
-from asthma.codebook import *
+from asthma.codebook import COMORBIDITY_CONDITIONS
+from asthma.assembly import MemberLevelAssembler
+from asthma.segments import MemberSegments
+
+
+__all__ = ['IdentifyComorbidities', 'PastVisitsData', 'PastVisitsBaseClass',
+           'IdentifyPastEDVisits', 'IdentifyPastInpatientVisits',
+           'IdentifyPastOutpatientVisits', 'ProviderAttribution',
+           'IdentifyPastVisitsSnapshots', 'IdentifyPastVisits']
 
 
 class IdentifyComorbidities:
 
+    def __init__(self, conditions=None):
+        if conditions is None:
+            conditions = COMORBIDITY_CONDITIONS
+        self.conditions = conditions
+        self._bit_dtype = np.min_scalar_type((1 << len(conditions)) - 1)
+
     def _get_diagnosis_columns(self, df):
         r = r'(?!.*admit)(?!.*desc)(?!.*icd)claim_(header|line)_diagnosis'
         pattern = re.compile(r)
         self.diag_columns = [col for col in df.columns if pattern.match(col)]
 
-    def identify_allergic_rhinitis_diagnoses(self, df):
+    def _build_condition_lookup(self, codes):
+        codes = pd.Series(codes, dtype=object)
+        icd_10_bits = np.zeros(codes.shape[0] + 1, dtype=self._bit_dtype)
+        icd_9_bits = np.zeros(codes.shape[0] + 1, dtype=self._bit_dtype)
+        for bit, spec in enumerate(self.conditions.values()):
+            flag = self._bit_dtype.type(1 << bit)
+            arr = codes.isin(spec.get('icd_10', [])).values
+            icd_10_bits[:-1][arr] |= flag
+
+            arr = codes.isin(spec.get('icd_9', [])).values
+            if 'icd_9_range' in spec:
+                low, high = spec['icd_9_range']
+                arr |= (codes.ge(low) & codes.le(high)).values
+            icd_9_bits[:-1][arr] |= flag
+
+        # the trailing zero entry is looked up by missing codes (index -1)
+        return icd_10_bits, icd_9_bits
+
+    def _identify_claim_conditions(self, df):
         if not hasattr(self, 'diag_columns'):
             self._get_diagnosis_columns(df)
-
-        temp = df[['member_medicaid_id']]
-        temp['allergic_co'] = 0
-        for code_col in self.diag_columns:
-            icd_col = f'{code_col}_icd_vers'
-            arr = np.where(df[code_col].isin(ALLERGIC_ICD_10_CODES), 1, 0)
-            idx = (df.loc[lambda x: x[icd_col] == 9]
-                   .loc[lambda x: (x[code_col].ge(ALLERGIC_ICD_9_MIN_THRESH) &
-                                   x[code_col].le(ALLERGIC_ICD_9_MAX_THRESH))]
-                   .index)
-            if idx.shape[0]:
-                arr[idx] = 1
-
-            idx_al = np.where(arr == 1)
-            temp['allergic_co'].loc[idx_al] = 1
-
-        df_ = temp.groupby('member_medicaid_id').sum().reset_index()
-        df_['allergic_co'] = (df_.allergic_co > 0).astype(int)
+        # without diagnosis columns no claim has a condition
+        if not self.diag_columns or not df.shape[0]:
+            return np.zeros(df.shape[0], dtype=self._bit_dtype)
+
+        codes = np.concatenate(
+            [df[col].values.astype(object) for col in self.diag_columns])
+        is_icd_9 = np.concatenate(
+            [(df[f'{col}_icd_vers'] == 9).values for col in self.diag_columns])
+        code_idx, unique_codes = pd.factorize(codes)
+        icd_10_bits, icd_9_bits = self._build_condition_lookup(unique_codes)
+
+        bits = icd_10_bits[code_idx]
+        bits[is_icd_9] |= icd_9_bits[code_idx[is_icd_9]]
+        return np.bitwise_or.reduce(
+            bits.reshape(len(self.diag_columns), df.shape[0]), axis=0)
+
+    def get_condition_matrix(self, df):
+        claim_bits = self._identify_claim_conditions(df)
+        segments = MemberSegments(df.member_medicaid_id)
+        return pd.Series(segments.bitwise_or(segments.take(claim_bits)),
+                         index=segments.members)
+
+    def _get_condition_flags(self, df, conditions):
+        member_bits = self.get_condition_matrix(df)
+        df_ = member_bits.index.to_frame(index=False)
+        for bit, name in enumerate(self.conditions):
+            if name in conditions:
+                df_[name] = ((member_bits.values >> bit) & 1).astype(int)
         return df_
 
-    def identify_obesity_diagnoses(self, df):
-        if not hasattr(self, 'diag_columns'):
-            self._get_diagnosis_columns(df)
+    def identify_allergic_rhinitis_diagnoses(self, df):
+        return self._get_condition_flags(df, ['allergic_co'])
 
-        temp = df[['member_medicaid_id']]
-        temp['obesity_co'] = 0
-        for code_col in self.diag_columns:
-            icd_col = f'{code_col}_icd_vers'
-            arr = np.where(df[code_col].isin(OBESITY_ICD_10_CODES), 1, 0)
-            idx = (df.loc[lambda x: x[icd_col] == 9]
-                   .loc[lambda x: (x[code_col].ge(OBESITY_ICD_9_MIN_THRESH) &
-                                   x[code_col].le(OBESITY_ICD_9_MAX_THRESH))]
-                   .index)
-            if idx.shape[0]:
-                arr[idx] = 1
-
-            idx_ob = np.where(arr == 1)
-            temp['obesity_co'].loc[idx_ob] = 1
-
-        df_ = temp.groupby('member_medicaid_id').sum().reset_index()
-        df_['obesity_co'] = (df_.obesity_co > 0).astype(int)
-        return df_
+    def identify_obesity_diagnoses(self, df):
+        return self._get_condition_flags(df, ['obesity_co'])
 
     def identify_obstructive_sleep_apnea_diagnoses(self, df):
-        if not hasattr(self, 'diag_columns'):
-            self._get_diagnosis_columns(df)
-
-        temp = df[['member_medicaid_id']]
-        temp['obs_sleep_co'] = 0
-        for code_col in self.diag_columns:
-            icd_col = f'{code_col}_icd_vers'
-            arr = np.where(df[code_col] == OBS_SLEEP_ICD_10_CODE, 1, 0)
-            idx = (df.loc[lambda x: x[icd_col] == 9]
-                   .loc[lambda x: x[code_col] == OBS_SLEEP_ICD_9_CODE].index)
-            if idx.shape[0]:
-                arr[idx] = 1
-
-            idx_obs = np.where(arr == 1)
-            temp['obs_sleep_co'].loc[idx_obs] = 1
-
-        df_ = temp.groupby('member_medicaid_id').sum().reset_index()
-        df_['obs_sleep_co'] = (df_.obs_sleep_co > 0).astype(int)
-        return df_
+        return self._get_condition_flags(df, ['obs_sleep_co'])
 
     def identify_gerd_diagnoses(self, df):
-        if not hasattr(self, 'diag_columns'):
-            self._get_diagnosis_columns(df)
+        return self._get_condition_flags(df, ['GERD_co'])
 
-        temp = df[['member_medicaid_id']]
-        temp['GERD_co'] = 0
-        for code_col in self.diag_columns:
-            icd_col = f'{code_col}_icd_vers'
-            arr = np.where(df[code_col].isin(GERD_ICD_10_CODES), 1, 0)
+    def identify_comorbidities(self, df):
+        return self._get_condition_flags(df, list(self.conditions))
 
-            idx = (df.loc[lambda x: x[icd_col] == 9]
-                   .loc[lambda x: x[code_col] == GERD_ICD_9_CODE].index)
-            if idx.shape[0]:
-                arr[idx] = 1
 
-            idx_gerd = np.where(arr == 1)
-            temp['GERD_co'].loc[idx_gerd] = 1
+class PastVisitsData:
 
-        df_ = temp.groupby('member_medicaid_id').sum().reset_index()
-        df_['GERD_co'] = (df_.GERD_co > 0).astype(int)
-        return df_
+    columns = ['member_medicaid_id', 'ED', 'inpt', 'outpt', 'virtual',
+               'dos_from', 'visitID', 'total_paid_amt', 'claimid', 'prm_as',
+               'prm_sec_as', 'attending_providerid']
 
-    def identify_comorbidities(self, df):
-        df_allergic = self.identify_allergic_rhinitis_diagnoses(df)
-        df_obesity = self.identify_obesity_diagnoses(df)
-        df_obs_sleep = self.identify_obstructive_sleep_apnea_diagnoses(df)
-        df_gerd = self.identify_gerd_diagnoses(df)
-        member_data = (df.member_medicaid_id.drop_duplicates()
-                       .sort_values(ignore_index=True).to_frame())
-        return (member_data.merge(df_allergic, how='left')
-                .merge(df_obesity, how='left').merge(df_obs_sleep, how='left')
-                .merge(df_gerd, how='left'))
+    def __init__(self, df):
+        for column in self.columns:
+            if column not in df.columns:
+                m = f'Past visits cannot be calculated without "{column}".'
+                raise KeyError(m)
+
+        data = df[self.columns + (['dos'] if 'dos' in df.columns else [])]
+        if 'dos' not in data.columns:
+            data = data.assign(dos=df.dos_from.dt.normalize())
+        data = self._drop_duplicates(data.drop('dos_from', axis=1))
+        # sorted once by member and date of service; every past visit
+        # feature is a reduction over the member segments
+        self.segments = MemberSegments(data.member_medicaid_id, data.dos)
+        self.data = self.segments.sort(data)
 
+    @staticmethod
+    def _drop_duplicates(df):
+        # rows are deduplicated on a uint64 fingerprint of all columns, which
+        # avoids the object column comparisons of drop_duplicates
+        hashes = pd.util.hash_pandas_object(df, index=False).values
+        return df.loc[~pd.Series(hashes).duplicated().values]
 
-class PastVisitsBaseClass:
 
-    def __init__(self, df):
-        columns = ['member_medicaid_id', 'ED', 'inpt', 'outpt', 'dos_from',
-                   'visitID', 'total_paid_amt', 'claimid', 'prm_as',
-                   'prm_sec_as', 'attending_providerid']
+class PastVisitsBaseClass:
 
-        no_dos_column = False
-        for column in columns + ['dos']:
-            if column not in df.columns:
-                if column == 'dos':
-                    dos = df.dos_from.map(lambda x: datetime.strptime(
-                        x.strftime('%Y-%m-%d'), '%Y-%m-%d'))
-                    no_dos_column = True
-                else:
-                    m = f'Past visits cannot be calculated without "{column}".'
-                    raise KeyError(m)
-
-        self.data = df[columns].copy()
-        if no_dos_column:
-            self.data['dos'] = dos
-        self.data.drop('dos_from', axis=1, inplace=True)
-        self.data.drop_duplicates(inplace=True)
-        self.period = self.data.dos.max()
-        self.member_data = (self.data.member_medicaid_id.drop_duplicates()
-                            .sort_values(ignore_index=True).to_frame())
+    def __init__(self, df, period=None):
+        # the deduplicated data can be built once and shared by the ED,
+        # inpatient and outpatient classes
+        if not isinstance(df, PastVisitsData):
+            df = PastVisitsData(df)
+        self.past_visits_data = df
+        self.data = df.data
+        self.segments = df.segments
+        # windows end at the last date of service unless a period is given,
+        # e.g. the last date of the whole file when members are processed in
+        # buckets
+        if period is None:
+            self.period = self.data.dos.max()
+        else:
+            self.period = pd.Timestamp(period).normalize()
+        self.member_data = self.segments.members.to_frame(index=False)
+
+    def _assemble(self, blocks):
+        assembler = MemberLevelAssembler(self.member_data.member_medicaid_id)
+        for block, fill_values in blocks:
+            assembler.add(block, fill_values)
+        return assembler.assemble()
+
+    def _get_window(self, months_back):
+        return self.segments.in_window(
+            self.period - relativedelta(months=months_back), self.period)
+
+    def _get_visit_block(self, visit_type, months_back, is_asthma=False,
+                         last_date=False, paid_amount=False):
+        name = f'{visit_type}_as' if is_asthma else visit_type
+        visits = self.data[visit_type].values
+        if is_asthma:
+            visits = visits * self.data.prm_sec_as.values
+        mask = (visits > 0) & self._get_window(months_back)
+
+        count = self.segments.count_distinct_dates(mask)
+        block = {f'{name}_n{months_back}': count}
+        if last_date:
+            block[f'{name}_d'] = self.segments.max(self.segments.dates, mask)
+        if paid_amount:
+            block[f'{name}_pd_{months_back}'] = self.segments.sum(
+                visits * self.data.total_paid_amt.values, mask)
+        # only members with a visit in the window, which the fill values
+        # tell apart from the others
+        return pd.DataFrame(block, index=self.segments.members).loc[count > 0]
+
+    def _get_window_blocks(self, visit_type, months_back):
+        # the 12 months windows also have the last date and paid amounts
+        blocks = []
+        for is_asthma in [False, True]:
+            block = self._get_visit_block(
+                visit_type, months_back, is_asthma,
+                last_date=months_back == 12, paid_amount=months_back == 12)
+            blocks.append((block, {col: 0 for col in block.columns
+                                   if not col.endswith('_d')}))
+        return blocks
 
 
 class IdentifyPastEDVisits(PastVisitsBaseClass):
 
-    def __init__(self, df):
-        super().__init__(df)
-
-    def _calculate_all_cause_past_ed_visits(self, months_back):
-        temp = self.data[['member_medicaid_id', 'ED', 'total_paid_amt', 'dos']]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['ED_amt'] = temp.ED.mul(temp.total_paid_amt)
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_ED=('ED', 'sum'), ED_paid_amt=('ED_amt', 'sum'))
-        df['is_ED'] = (df.is_ED > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
-
-    def _calculate_asthma_past_ed_visits(self, months_back):
-        temp = self.data[
-            ['member_medicaid_id', 'ED', 'total_paid_amt', 'dos', 'prm_sec_as']]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['ED_as'] = temp.ED.mul(temp.prm_sec_as)
-        temp['ED_as_amt'] = (temp.ED.mul(temp.total_paid_amt)
-                             .mul(temp.prm_sec_as))
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_as_ED=('ED_as', 'sum'), ED_as_paid_amt=('ED_as_amt', 'sum'))
-        df['is_as_ED'] = (df.is_as_ED > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
+    def __init__(self, df, period=None):
+        super().__init__(df, period)
 
     def get_past_12_months_ed_visits(self):
-        df = self._calculate_all_cause_past_ed_visits(12)
-        df12 = df.loc[lambda x: x.is_ED == 1].groupby('member_medicaid_id').agg(
-            ED_n12=('is_ED', 'sum'),
-            ED_d=('dos', 'max'),
-            ED_pd_12=('ED_paid_amt', 'sum')).reset_index()
-        df_as = self._calculate_asthma_past_ed_visits(12)
-        df12_as = (df_as.loc[lambda x: x.is_as_ED == 1]
-                   .groupby('member_medicaid_id')
-                   .agg(ED_as_n12=('is_as_ED', 'sum'),
-                        ED_as_d=('dos', 'max'),
-                        ED_as_pd_12=('ED_as_paid_amt', 'sum'))
-                   .reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df12, how=how).merge(df12_as, how=how)
-        for c in ['ED_n12', 'ED_pd_12', 'ED_as_n12', 'ED_as_pd_12']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('ED', 12))
 
     def get_past_6_months_ed_visits(self):
-        df = self._calculate_all_cause_past_ed_visits(6)
-        df6 = df.loc[lambda x: x.is_ED == 1].groupby('member_medicaid_id').agg(
-            ED_n6=('is_ED', 'sum')).reset_index()
-        df_as = self._calculate_asthma_past_ed_visits(6)
-        df6_as = (df_as.loc[lambda x: x.is_as_ED == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(ED_as_n6=('is_as_ED', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df6, how=how).merge(df6_as, how=how)
-        for c in ['ED_n6', 'ED_as_n6']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('ED', 6))
 
     def get_past_3_months_ed_visits(self):
-        df = self._calculate_all_cause_past_ed_visits(3)
-        df3 = df.loc[lambda x: x.is_ED == 1].groupby('member_medicaid_id').agg(
-            ED_n3=('is_ED', 'sum')).reset_index()
-        df_as = self._calculate_asthma_past_ed_visits(3)
-        df3_as = (df_as.loc[lambda x: x.is_as_ED == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(ED_as_n3=('is_as_ED', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df3, how=how).merge(df3_as, how=how)
-        for c in ['ED_n3', 'ED_as_n3']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('ED', 3))
 
     def get_past_ed_visits(self):
-        df12 = self.get_past_12_months_ed_visits()
-        df6 = self.get_past_6_months_ed_visits()
-        df3 = self.get_past_3_months_ed_visits()
-        return (self.member_data.merge(df12, how='left')
-                .merge(df6, how='left').merge(df3, how='left'))
+        return self._assemble(self._get_window_blocks('ED', 12) +
+                              self._get_window_blocks('ED', 6) +
+                              self._get_window_blocks('ED', 3))
 
 
 class IdentifyPastInpatientVisits(PastVisitsBaseClass):
 
-    def __init__(self, df):
-        super().__init__(df)
-
-    def _calculate_all_cause_past_inpt_visits(self, months_back):
-        columns = ['member_medicaid_id', 'inpt', 'total_paid_amt', 'dos']
-        temp = self.data[columns]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['inpt_amt'] = temp.inpt.mul(temp.total_paid_amt)
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_inpt=('inpt', 'sum'), inpt_paid_amt=('inpt_amt', 'sum'))
-        df['is_inpt'] = (df.is_inpt > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
-
-    def _calculate_asthma_past_inpt_visits(self, months_back):
-        columns = ['member_medicaid_id', 'total_paid_amt', 'prm_sec_as', 'inpt',
-                   'dos']
-        temp = self.data[columns]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['inpt_as'] = temp.inpt.mul(temp.prm_sec_as)
-        temp['inpt_as_amt'] = (temp.inpt.mul(temp.total_paid_amt)
-                               .mul(temp.prm_sec_as))
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_as_inpt=('inpt_as', 'sum'),
-            inpt_as_paid_amt=('inpt_as_amt', 'sum'))
-        df['is_as_inpt'] = (df.is_as_inpt > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
+    def __init__(self, df, period=None, stay_gap_days=1):
+        super().__init__(df, period)
+        # consecutive inpatient days at most this many days apart are
+        # collapsed into a single stay episode
+        self.stay_gap_days = stay_gap_days
+        self._stay_ids = {}
 
     def get_past_12_months_inpt_visits(self):
-        df = self._calculate_all_cause_past_inpt_visits(12)
-        df12 = (df.loc[lambda x: x.is_inpt == 1].groupby('member_medicaid_id')
-                .agg(inpt_n12=('is_inpt', 'sum'),
-                     inpt_d=('dos', 'max'),
-                     inpt_pd_12=('inpt_paid_amt', 'sum')).reset_index())
-        df_as = self._calculate_asthma_past_inpt_visits(12)
-        df12_as = (df_as.loc[lambda x: x.is_as_inpt == 1]
-                   .groupby('member_medicaid_id')
-                   .agg(inpt_as_n12=('is_as_inpt', 'sum'),
-                        inpt_as_d=('dos', 'max'),
-                        inpt_as_pd_12=('inpt_as_paid_amt', 'sum'))
-                   .reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df12, how=how).merge(df12_as, how=how)
-        for c in ['inpt_n12', 'inpt_pd_12', 'inpt_as_n12', 'inpt_as_pd_12']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('inpt', 12))
 
     def get_past_6_months_inpt_visits(self):
-        df = self._calculate_all_cause_past_inpt_visits(6)
-        df6 = (df.loc[lambda x: x.is_inpt == 1].groupby('member_medicaid_id')
-               .agg(inpt_n6=('is_inpt', 'sum')).reset_index())
-        df_as = self._calculate_asthma_past_inpt_visits(6)
-        df6_as = (df_as.loc[lambda x: x.is_as_inpt == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(inpt_as_n6=('is_as_inpt', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df6, how=how).merge(df6_as, how=how)
-        for c in ['inpt_n6', 'inpt_as_n6']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('inpt', 6))
 
     def get_past_3_months_inpt_visits(self):
-        df = self._calculate_all_cause_past_inpt_visits(3)
-        df3 = (df.loc[lambda x: x.is_inpt == 1].groupby('member_medicaid_id')
-               .agg(inpt_n3=('is_inpt', 'sum')).reset_index())
-        df_as = self._calculate_asthma_past_inpt_visits(3)
-        df3_as = (df_as.loc[lambda x: x.is_as_inpt == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(inpt_as_n3=('is_as_inpt', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df3, how=how).merge(df3_as, how=how)
-        for c in ['inpt_n3', 'inpt_as_n3']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_window_blocks('inpt', 3))
 
-    @staticmethod
-    def _extract_unique_inpt_visits(df, is_asthma=False):
+    def _get_inpt_flags(self, is_asthma=False):
+        flags = self.data.inpt.values == 1
         if is_asthma:
-            columns = ['member_medicaid_id', 'dos', 'is_as_inpt']
-            new_df = df.loc[lambda x: x.is_as_inpt == 1][columns]
-        else:
-            columns = ['member_medicaid_id', 'dos', 'is_inpt']
-            new_df = df.loc[lambda x: x.is_inpt == 1][columns]
-
-        new_df['same_guy'] = (
-            new_df.member_medicaid_id == (new_df.member_medicaid_id.shift(1)
-                                          .fillna(method='bfill')))
-        new_df['too_close'] = (
-            new_df.dos.subtract(new_df.dos.shift(1).fillna(method='bfill')).map(
-                lambda x: x.days) == 1)
-        new_df = new_df.loc[~(new_df.same_guy & new_df.too_close)]
-        new_df.drop(['same_guy', 'too_close'], axis=1, inplace=True)
-        return new_df
+            flags &= self.data.prm_sec_as.values == 1
+        return flags
+
+    def _get_stay_ids(self, is_asthma=False):
+        # stay number of every inpatient row, 0 for the other rows; rows are
+        # sorted by member and day, so stays are numbered in order
+        key = 'asthma' if is_asthma else 'all_cause'
+        if key not in self._stay_ids:
+            idx = np.flatnonzero(self._get_inpt_flags(is_asthma))
+            members = self.segments.member_idx[idx]
+            days = (self.segments.dates[idx].astype('datetime64[D]')
+                    .astype(np.int64))
+            new_stay = np.ones(idx.shape[0], dtype=bool)
+            new_stay[1:] = ((members[1:] != members[:-1]) |
+                            (np.diff(days) > self.stay_gap_days))
+            stay_ids = np.zeros(self.data.shape[0], dtype=np.int64)
+            stay_ids[idx] = np.cumsum(new_stay)
+            self._stay_ids[key] = stay_ids
+        return self._stay_ids[key]
+
+    def get_inpt_stay_episodes(self, is_asthma=False):
+        flags = self._get_inpt_flags(is_asthma)
+        return (self.data.loc[flags, ['member_medicaid_id', 'dos']]
+                .assign(stay_id=self._get_stay_ids(is_asthma)[flags])
+                .drop_duplicates(['member_medicaid_id', 'dos'])
+                .reset_index(drop=True))
+
+    def _count_unique_inpt_visits(self, months_back, column, is_asthma=False):
+        # a stay that started before the window still counts once
+        mask = (self._get_inpt_flags(is_asthma) &
+                self._get_window(months_back))
+        count = self.segments.count_distinct(self._get_stay_ids(is_asthma),
+                                             mask)
+        return pd.DataFrame({column: count},
+                            index=self.segments.members).loc[count > 0]
+
+    def _get_all_cause_unique_inpt_blocks(self):
+        df12u = self._count_unique_inpt_visits(12, 'inpt_u_n12')
+        df3u = self._count_unique_inpt_visits(3, 'inpt_u_n3')
+        return [(df12u, 0), (df3u, 0)]
 
     def get_all_cause_unique_inpt_visits(self):
-        df12u = self._calculate_all_cause_past_inpt_visits(12)
-        df12u = self._extract_unique_inpt_visits(df12u)
-        df12u = (df12u.groupby('member_medicaid_id')
-                 .agg(inpt_u_n12=('is_inpt', 'sum'))
-                 .reset_index())
-        df3u = self._calculate_all_cause_past_inpt_visits(3)
-        df3u = self._extract_unique_inpt_visits(df3u)
-        df3u = (df3u.groupby('member_medicaid_id')
-                .agg(inpt_u_n3=('is_inpt', 'sum'))
-                .reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df12u, how=how).merge(df3u, how=how)
-        for c in ['inpt_u_n12', 'inpt_u_n3']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_all_cause_unique_inpt_blocks())
+
+    def _get_asthma_unique_inpt_blocks(self):
+        df12u_as = self._count_unique_inpt_visits(12, 'inpt_as_u_n12',
+                                                  is_asthma=True)
+        df3u_as = self._count_unique_inpt_visits(3, 'inpt_as_u_n3',
+                                                 is_asthma=True)
+        return [(df12u_as, 0), (df3u_as, 0)]
 
     def get_asthma_unique_inpt_visits(self):
-        df12u_as = self._calculate_asthma_past_inpt_visits(12)
-        df12u_as = self._extract_unique_inpt_visits(df12u_as, is_asthma=True)
-        df12u_as = (df12u_as.groupby('member_medicaid_id')
-                    .agg(inpt_as_u_n12=('is_as_inpt', 'sum'))
-                    .reset_index())
-        df3u_as = self._calculate_asthma_past_inpt_visits(3)
-        df3u_as = self._extract_unique_inpt_visits(df3u_as, is_asthma=True)
-        df3u_as = (df3u_as.groupby('member_medicaid_id')
-                   .agg(inpt_as_u_n3=('is_as_inpt', 'sum'))
-                   .reset_index())
-        df_final = (self.member_data.merge(df12u_as, how='left')
-                    .merge(df3u_as, how='left'))
-        for c in ['inpt_as_u_n12', 'inpt_as_u_n3']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_asthma_unique_inpt_blocks())
 
     def get_past_inpt_visits(self):
-        df12 = self.get_past_12_months_inpt_visits()
-        df6 = self.get_past_6_months_inpt_visits()
-        df3 = self.get_past_3_months_inpt_visits()
-        dfu = self.get_all_cause_unique_inpt_visits()
-        dfu_as = self.get_asthma_unique_inpt_visits()
-        return (self.member_data
-                .merge(df12, how='left')
-                .merge(df6, how='left')
-                .merge(df3, how='left')
-                .merge(dfu, how='left')
-                .merge(dfu_as, how='left'))
+        return self._assemble(self._get_window_blocks('inpt', 12) +
+                              self._get_window_blocks('inpt', 6) +
+                              self._get_window_blocks('inpt', 3) +
+                              self._get_all_cause_unique_inpt_blocks() +
+                              self._get_asthma_unique_inpt_blocks())
 
 
 class IdentifyPastOutpatientVisits(PastVisitsBaseClass):
 
-    def __init__(self, df):
-        super().__init__(df)
-
-    def _calculate_all_cause_past_outpatient_visits(self, months_back):
-        temp = self.data[
-            ['member_medicaid_id', 'outpt', 'total_paid_amt', 'dos',
-             'attending_providerid']]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['outpt_amt'] = temp.outpt.mul(temp.total_paid_amt)
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_outpt=('outpt', 'sum'), outpt_paid_amt=('outpt_amt', 'sum'),
-            attending_providerid=('attending_providerid', 'first'))
-        df['is_outpt'] = (df.is_outpt > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
-
-    def _calculate_asthma_past_outpatient_visits(self, months_back):
-        temp = self.data[
-            ['member_medicaid_id', 'outpt', 'total_paid_amt', 'dos',
-             'prm_sec_as']]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=months_back))))]
-        temp['outpt_as'] = temp.outpt.mul(temp.prm_sec_as)
-        temp['outpt_as_amt'] = (temp.outpt.mul(temp.total_paid_amt)
-                                .mul(temp.prm_sec_as))
-        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
-            is_as_outpt=('outpt_as', 'sum'),
-            outpt_as_paid_amt=('outpt_as_amt', 'sum'))
-        df['is_as_outpt'] = (df.is_as_outpt > 0).astype(int)
-        df.reset_index(inplace=True)
-        return df
+    def __init__(self, df, period=None):
+        super().__init__(df, period)
+
+    def _get_first_provider(self):
+        # first provider of the first outpatient day in the last 12 months,
+        # the provider of a day being its first one in the rows
+        window = self._get_window(12)
+        providers = self.data.attending_providerid
+        is_outpt_day = self.segments.date_any(
+            (self.data.outpt.values > 0) & window)
+        idx = self.segments.first_index(is_outpt_day & window &
+                                        providers.notnull().values)
+        return self.segments.take_index(providers.values, idx)
+
+    def _get_outpt_window_blocks(self, months_back):
+        blocks = self._get_window_blocks('outpt', months_back)
+        if months_back == 12:
+            block, fill_values = blocks[0]
+            providers = pd.Series(self._get_first_provider(),
+                                  index=self.segments.members)
+            blocks[0] = (block.assign(attending_providerid=providers),
+                         fill_values)
+        for is_asthma in [False, True]:
+            blocks.append((self._get_visit_block(
+                'virtual', months_back, is_asthma, paid_amount=True), 0))
+        return blocks
 
     def get_past_12_months_outpt_visits(self):
-        df = self._calculate_all_cause_past_outpatient_visits(12)
-        df12 = (df.loc[lambda x: x.is_outpt == 1].groupby('member_medicaid_id')
-                .agg(outpt_n12=('is_outpt', 'sum'),
-                     outpt_d=('dos', 'max'),
-                     outpt_pd_12=('outpt_paid_amt', 'sum'),
-                     attending_providerid=('attending_providerid', 'first'))
-                .reset_index())
-        df_as = self._calculate_asthma_past_outpatient_visits(12)
-        df12_as = (df_as.loc[lambda x: x.is_as_outpt == 1]
-                   .groupby('member_medicaid_id')
-                   .agg(outpt_as_n12=('is_as_outpt', 'sum'),
-                        outpt_as_d=('dos', 'max'),
-                        outpt_as_pd_12=('outpt_as_paid_amt', 'sum'))
-                   .reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df12, how=how).merge(df12_as, how=how)
-        for c in ['outpt_n12', 'outpt_pd_12', 'outpt_as_n12', 'outpt_as_pd_12']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_outpt_window_blocks(12))
 
     def get_past_6_months_outpt_visits(self):
-        df = self._calculate_all_cause_past_outpatient_visits(6)
-        df6 = (df.loc[lambda x: x.is_outpt == 1].groupby('member_medicaid_id')
-               .agg(outpt_n6=('is_outpt', 'sum')).reset_index())
-        df_as = self._calculate_asthma_past_outpatient_visits(6)
-        df6_as = (df_as.loc[lambda x: x.is_as_outpt == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(outpt_as_n6=('is_as_outpt', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df6, how=how).merge(df6_as, how=how)
-        for c in ['outpt_n6', 'outpt_as_n6']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_outpt_window_blocks(6))
 
     def get_past_3_months_outpt_visits(self):
-        df = self._calculate_all_cause_past_outpatient_visits(3)
-        df3 = (df.loc[lambda x: x.is_outpt == 1].groupby('member_medicaid_id')
-               .agg(outpt_n3=('is_outpt', 'sum')).reset_index())
-        df_as = self._calculate_asthma_past_outpatient_visits(3)
-        df3_as = (df_as.loc[lambda x: x.is_as_outpt == 1]
-                  .groupby('member_medicaid_id')
-                  .agg(outpt_as_n3=('is_as_outpt', 'sum')).reset_index())
-        how = 'left'
-        df_final = self.member_data.merge(df3, how=how).merge(df3_as, how=how)
-        for c in ['outpt_n3', 'outpt_as_n3']:
-            df_final[c].fillna(0, inplace=True)
-        return df_final
+        return self._assemble(self._get_outpt_window_blocks(3))
 
     def _get_max_doc_by_member(self):
-        temp = self.data[
-            ['member_medicaid_id', 'outpt', 'dos', 'attending_providerid']]
-        temp = temp.loc[lambda x: (
-                (x.dos <= self.period) &
-                (x.dos >= (self.period - relativedelta(months=24))))]
-        df = temp.groupby(
-            ['member_medicaid_id', 'dos', 'attending_providerid']).agg(
-            is_outpt=('outpt', 'sum'))
+        # the provider on the most outpatient days of the last 24 months,
+        # ties going to the first provider in order
+        df = ProviderAttribution(self.past_visits_data, self.period,
+                                 windows=[24],
+                                 tie_breaker='provider').get_attributions()
+        return (df.set_index('member_medicaid_id')
+                [['attributed_provider_24']]
+                .rename(columns={'attributed_provider_24': 'max_doc'})
+                .dropna())
+
+    def get_past_outpt_visits(self):
+        return self._assemble(self._get_outpt_window_blocks(12) +
+                              self._get_outpt_window_blocks(6) +
+                              self._get_outpt_window_blocks(3) +
+                              [(self._get_max_doc_by_member(), None)])
+
+
+class ProviderAttribution:
+
+    def __init__(self, df, period=None, windows=(24, 12, 6, 3),
+                 tie_breaker='recent'):
+        if tie_breaker not in ['recent', 'provider']:
+            raise ValueError('The tie breaker has to be "recent" or '
+                             '"provider".')
+        if not isinstance(df, PastVisitsData):
+            df = PastVisitsData(df)
+        self.data = df.data
+        self.segments = df.segments
+        if period is None:
+            self.period = self.data.dos.max()
+        else:
+            self.period = pd.Timestamp(period).normalize()
+        self.windows = sorted(set(windows), reverse=True)
+        # ties on visits go to the most recent visit (then provider order),
+        # or straight to provider order
+        self.tie_breaker = tie_breaker
+        self._visit_table = None
+        self._attributed_codes = None
+
+    def _build_visit_table(self):
+        # one pass over the outpatient rows of the longest window, counting
+        # the distinct visit days of every member and provider pair
+        codes, providers = pd.factorize(self.data.attending_providerid,
+                                        sort=True)
+        start = self.period - relativedelta(months=self.windows[0])
+        idx = np.flatnonzero((self.data.outpt.values > 0) & (codes >= 0) &
+                             self.segments.in_window(start, self.period))
+        member_idx = self.segments.member_idx[idx]
+        codes, dates = codes[idx], self.segments.dates[idx]
+        order = np.lexsort((dates, codes, member_idx))
+        member_idx, codes, dates = (member_idx[order], codes[order],
+                                    dates[order])
+
+        is_new_pair = np.ones(order.shape[0], dtype=bool)
+        is_new_pair[1:] = ((member_idx[1:] != member_idx[:-1]) |
+                           (codes[1:] != codes[:-1]))
+        is_new_day = is_new_pair.copy()
+        is_new_day[1:] |= dates[1:] != dates[:-1]
+        pair_idx = np.cumsum(is_new_pair) - 1
+        num_pairs = int(is_new_pair.sum())
+        is_last = np.append(is_new_pair[1:], True) if num_pairs else is_new_pair
+
+        self._pair_members = member_idx[is_new_pair]
+        self._pair_codes = codes[is_new_pair]
+        self._providers = providers
+        df = pd.DataFrame({
+            'member_medicaid_id': self.segments.members.values[
+                self._pair_members],
+            'attending_providerid': providers.values[self._pair_codes],
+            'last_visit': dates[is_last]})
+        for months_back in self.windows:
+            in_window = is_new_day & (dates >= np.datetime64(
+                self.period - relativedelta(months=months_back)))
+            df[f'outpt_visits_{months_back}'] = np.bincount(
+                pair_idx, weights=in_window, minlength=num_pairs
+            ).astype(np.int64)
+        return df
+
+    def get_visit_table(self):
+        if self._visit_table is None:
+            self._visit_table = self._build_visit_table()
+        return self._visit_table
+
+    def _attribute(self, months_back):
+        # provider code of every member, -1 without visits in the window
+        table = self.get_visit_table()
+        visits = table[f'outpt_visits_{months_back}'].values
+        keys = [self._pair_codes]
+        if self.tie_breaker == 'recent':
+            keys.append(-table.last_visit.values.view(np.int64))
+        order = np.lexsort(keys + [-visits, self._pair_members])
+        order = order[visits[order] > 0]
+        is_first = np.ones(order.shape[0], dtype=bool)
+        is_first[1:] = (self._pair_members[order][1:] !=
+                        self._pair_members[order][:-1])
+
+        attributed = np.full(self.segments.members.shape[0], -1, np.int64)
+        num_visits = np.zeros(self.segments.members.shape[0], np.int64)
+        attributed[self._pair_members[order[is_first]]] = (
+            self._pair_codes[order[is_first]])
+        num_visits[self._pair_members[order[is_first]]] = (
+            visits[order[is_first]])
+        return attributed, num_visits
+
+    def _get_attributed_codes(self):
+        if self._attributed_codes is None:
+            self._attributed_codes = {m: self._attribute(m)
+                                      for m in self.windows}
+        return self._attributed_codes
+
+    def get_attributions(self):
+        df = self.segments.members.to_frame(index=False)
+        for months_back, (codes, num_visits) in (
+                self._get_attributed_codes().items()):
+            df[f'attributed_provider_{months_back}'] = (
+                self.segments.take_index(self._providers, codes))
+            df[f'attributed_visits_{months_back}'] = num_visits
+        return df
+
+    def get_panel_sizes(self):
+        # number of members attributed to every provider
+        self.get_visit_table()
+        df = pd.DataFrame({'attending_providerid': self._providers})
+        for months_back, (codes, _) in self._get_attributed_codes().items():
+            df[f'panel_size_{months_back}'] = np.bincount(
+                codes[codes >= 0], minlength=self._providers.shape[0])
+        return df
+
+
+class IdentifyPastVisitsSnapshots(PastVisitsBaseClass):
+
+    visit_types = ['ED', 'inpt', 'outpt', 'virtual']
+
+    def __init__(self, df, index_dates, stay_gap_days=1):
+        super().__init__(df)
+        self.index_dates = (pd.DatetimeIndex(index_dates).normalize()
+                            .unique().sort_values())
+        self.stay_gap_days = stay_gap_days
+
+    @staticmethod
+    def _to_days(dates):
+        return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+    @staticmethod
+    def _prefix_sum(values):
+        return np.concatenate([[0], np.cumsum(values)])
+
+    @staticmethod
+    def _last_flagged(flags):
+        # index of the last flagged row at or before every row, -1 if none
+        idx = np.where(flags, np.arange(flags.shape[0]), -1)
+        return np.maximum.accumulate(idx)
+
+    @staticmethod
+    def _next_flagged(flags):
+        # index of the first flagged row at or after every row (and after
+        # the last row), the number of rows if none
+        n = flags.shape[0]
+        idx = np.where(flags, np.arange(n), n)
+        return np.append(np.minimum.accumulate(idx[::-1])[::-1], n)
+
+    def _aggregate_member_days(self):
+        temp = self.data[['member_medicaid_id', 'dos', 'total_paid_amt',
+                          'prm_sec_as', 'attending_providerid'] +
+                         self.visit_types].copy()
+        agg = {}
+        for t in self.visit_types:
+            temp[f'{t}_amt'] = temp[t].mul(temp.total_paid_amt)
+            temp[f'{t}_as'] = temp[t].mul(temp.prm_sec_as)
+            temp[f'{t}_as_amt'] = (temp[t].mul(temp.total_paid_amt)
+                                   .mul(temp.prm_sec_as))
+            agg.update({f'is_{t}': (t, 'sum'),
+                        f'{t}_paid_amt': (f'{t}_amt', 'sum'),
+                        f'is_as_{t}': (f'{t}_as', 'sum'),
+                        f'{t}_as_paid_amt': (f'{t}_as_amt', 'sum')})
+        df = temp.groupby(['member_medicaid_id', 'dos']).agg(
+            attending_providerid=('attending_providerid', 'first'), **agg)
+        for t in self.visit_types:
+            df[f'is_{t}'] = (df[f'is_{t}'] > 0).astype(int)
+            df[f'is_as_{t}'] = (df[f'is_as_{t}'] > 0).astype(int)
         df.reset_index(inplace=True)
-        df['is_outpt'] = (df.is_outpt > 0).astype(int)
-        df = (df.loc[lambda x: x.is_outpt == 1]
-              .groupby(['member_medicaid_id', 'attending_providerid'])
-              .agg(outpt_freq=('is_outpt', 'sum'),
-                   max_doc=('attending_providerid', 'first'))
-              .reset_index()
-              .sort_values(['member_medicaid_id', 'outpt_freq'],
-                           ascending=[True, False])
-              .drop_duplicates('member_medicaid_id', keep='first')
-              [['member_medicaid_id', 'max_doc']])
         return df
 
-    def get_past_outpt_visits(self):
-        df12 = self.get_past_12_months_outpt_visits()
-        df6 = self.get_past_6_months_outpt_visits()
-        df3 = self.get_past_3_months_outpt_visits()
-        df_max_doc = self._get_max_doc_by_member()
-        return (self.member_data.merge(df12, how='left')
-                .merge(df6, how='left').merge(df3, how='left')
-                .merge(df_max_doc, how='left'))
+    def _get_stay_starts(self, member_idx, days, flags):
+        # a flagged day starts a new stay unless the member's previous
+        # flagged day is at most stay_gap_days before it
+        idx = np.flatnonzero(flags)
+        starts = np.zeros(flags.shape[0], dtype=bool)
+        new_stay = np.ones(idx.shape[0], dtype=bool)
+        new_stay[1:] = ((member_idx[idx][1:] != member_idx[idx][:-1]) |
+                        (np.diff(days[idx]) > self.stay_gap_days))
+        starts[idx] = new_stay
+        return starts
+
+    def _get_window_bounds(self, keys, n_groups, months_back):
+        # row ranges [lo, hi) of every (index date, group) pair in a table
+        # sorted by group and day, index dates varying slowest
+        start = self._to_days([d - relativedelta(months=months_back)
+                               for d in self.index_dates])
+        end = self._to_days(self.index_dates)
+        codes = np.arange(n_groups, dtype=np.int64)
+        lo = np.searchsorted(keys, ((codes[None, :] << 32) +
+                                    (start[:, None] - self._min_day)).ravel())
+        hi = np.searchsorted(keys, ((codes[None, :] << 32) +
+                                    (end[:, None] - self._min_day)).ravel(),
+                             side='right')
+        return lo, hi
+
+    def _get_max_doc(self, members):
+        temp = (self.data
+                .loc[lambda x: (x.outpt == 1) &
+                     (x.attending_providerid.notnull())]
+                [['member_medicaid_id', 'attending_providerid', 'dos']]
+                .drop_duplicates()
+                .sort_values(['member_medicaid_id', 'attending_providerid',
+                              'dos']))
+        pair_idx = (temp.groupby(['member_medicaid_id',
+                                  'attending_providerid'], sort=False)
+                    .ngroup().values.astype(np.int64))
+        pairs = (temp[['member_medicaid_id', 'attending_providerid']]
+                 .drop_duplicates().reset_index(drop=True))
+        keys = (pair_idx << 32) + (self._to_days(temp.dos) - self._min_day)
+        lo, hi = self._get_window_bounds(keys, pairs.shape[0], 24)
+        n_anchors = self.index_dates.shape[0]
+        codes = np.arange(pairs.shape[0], dtype=np.int64)
+        freq = hi - lo
+
+        # the most frequent provider of every (anchor, member) pair, ties
+        # resolved by provider order
+        anchor_idx = np.repeat(np.arange(n_anchors), pairs.shape[0])
+        pair_member = np.tile(
+            members.get_indexer(pairs.member_medicaid_id), n_anchors)
+        order = np.lexsort((np.tile(codes, n_anchors), -freq, pair_member,
+                            anchor_idx))
+        order = order[freq[order] > 0]
+        group = anchor_idx[order] * members.shape[0] + pair_member[order]
+        first = np.ones(order.shape[0], dtype=bool)
+        first[1:] = group[1:] != group[:-1]
+
+        max_doc = np.full(n_anchors * members.shape[0], np.nan, dtype=object)
+        max_doc[group[first]] = (pairs.attending_providerid
+                                 .values[order[first] % pairs.shape[0]])
+        return max_doc
+
+    def get_past_visits(self):
+        df = self._aggregate_member_days()
+        member_idx, members = pd.factorize(df.member_medicaid_id, sort=True)
+        member_idx = member_idx.astype(np.int64)
+        days = self._to_days(df.dos)
+        self._min_day = days.min()
+        keys = (member_idx << 32) + (days - self._min_day)
+        dos = df.dos.values
+
+        bounds = {m: self._get_window_bounds(keys, members.shape[0], m)
+                  for m in [3, 6, 12]}
+        columns = self._get_feature_columns()
+        features = {}
+
+        def add_count(name, flags, months_back):
+            if name not in columns:
+                return
+            cs = self._prefix_sum(flags)
+            lo, hi = bounds[months_back]
+            features[name] = (cs[hi] - cs[lo]).astype(float)
+
+        def add_amount(name, values, months_back):
+            if name not in columns:
+                return
+            cs = self._prefix_sum(values)
+            lo, hi = bounds[months_back]
+            features[name] = cs[hi] - cs[lo]
+
+        def add_last_date(name, flags):
+            if name not in columns:
+                return
+            lo, hi = bounds[12]
+            last = self._last_flagged(flags)[np.maximum(hi - 1, 0)]
+            valid = (hi > lo) & (last >= lo)
+            features[name] = np.where(valid, dos[np.maximum(last, 0)],
+                                      np.datetime64('NaT'))
+
+        def add_unique_stays(name, flags, months_back):
+            starts = self._get_stay_starts(member_idx, days, flags)
+            cs = self._prefix_sum(starts)
+            lo, hi = bounds[months_back]
+            # a stay that started before the window still counts once
+            first = self._next_flagged(flags)[lo]
+            in_window = first < hi
+            straddles = in_window & ~starts[np.minimum(first, len(starts) - 1)]
+            features[name] = (cs[hi] - cs[lo] + straddles).astype(float)
+
+        for t in self.visit_types:
+            is_t, is_as_t = df[f'is_{t}'].values, df[f'is_as_{t}'].values
+            for m in [12, 6, 3]:
+                add_count(f'{t}_n{m}', is_t, m)
+                add_count(f'{t}_as_n{m}', is_as_t, m)
+                add_amount(f'{t}_pd_{m}', df[f'{t}_paid_amt'].values, m)
+                add_amount(f'{t}_as_pd_{m}', df[f'{t}_as_paid_amt'].values, m)
+            add_last_date(f'{t}_d', is_t)
+            add_last_date(f'{t}_as_d', is_as_t)
+
+        for m in [12, 3]:
+            add_unique_stays(f'inpt_u_n{m}', df.is_inpt.values, m)
+            add_unique_stays(f'inpt_as_u_n{m}', df.is_as_inpt.values, m)
+
+        lo, hi = bounds[12]
+        flags = (df.is_outpt.values == 1) & df.attending_providerid.notnull()
+        first = self._next_flagged(flags.values)[lo]
+        features['attending_providerid'] = np.where(
+            first < hi, df.attending_providerid.values[
+                np.minimum(first, df.shape[0] - 1)], np.nan)
+        features['max_doc'] = self._get_max_doc(members)
+
+        n_anchors = self.index_dates.shape[0]
+        result = pd.DataFrame({
+            'member_medicaid_id': np.tile(members.values, n_anchors),
+            'index_date': np.repeat(self.index_dates.values, len(members))})
+        for column in columns:
+            result[column] = features[column]
+
+        # a member is part of a snapshot once it has a claim on or before
+        # the index date
+        first_day = np.full(len(members), np.iinfo(np.int64).max)
+        np.minimum.at(first_day, member_idx, days)
+        in_snapshot = (np.tile(first_day, n_anchors) <=
+                       np.repeat(self._to_days(self.index_dates),
+                                 len(members)))
+        return result.loc[in_snapshot].reset_index(drop=True)
+
+    @staticmethod
+    def _get_feature_columns():
+        # same columns and order as IdentifyPastVisits.get_past_visits
+        columns = []
+        for t in ['ED', 'inpt', 'outpt']:
+            columns += [f'{t}_n12', f'{t}_d', f'{t}_pd_12']
+            if t == 'outpt':
+                columns += ['attending_providerid']
+            columns += [f'{t}_as_n12', f'{t}_as_d', f'{t}_as_pd_12']
+            for m in [12, 6, 3]:
+                if m != 12:
+                    columns += [f'{t}_n{m}', f'{t}_as_n{m}']
+                if t == 'outpt':
+                    columns += [f'virtual_n{m}', f'virtual_pd_{m}',
+                                f'virtual_as_n{m}', f'virtual_as_pd_{m}']
+            if t == 'inpt':
+                columns += ['inpt_u_n12', 'inpt_u_n3', 'inpt_as_u_n12',
+                            'inpt_as_u_n3']
+            if t == 'outpt':
+                columns += ['max_doc']
+        return columns
 
 
 class IdentifyPastVisits:
 
     @staticmethod
-    def get_past_visits(df):
-        df_ed = IdentifyPastEDVisits(df).get_past_ed_visits()
-        df_inpt = IdentifyPastInpatientVisits(df).get_past_inpt_visits()
-        df_outpt = IdentifyPastOutpatientVisits(df).get_past_outpt_visits()
-        return df_ed.merge(df_inpt).merge(df_outpt)
+    def get_past_visits(df, period=None, backend='pandas'):
+        if backend == 'duckdb':
+            # imported here, as the DuckDB backend depends on this module
+            from asthma.claim.claim_member_level_duckdb import (
+                IdentifyPastVisitsDuckDB)
+            return IdentifyPastVisitsDuckDB(df, period).get_past_visits()
+        elif backend != 'pandas':
+            raise ValueError(f'Unknown backend "{backend}".')
+
+        df = PastVisitsData(df)
+        df_ed = IdentifyPastEDVisits(df, period).get_past_ed_visits()
+        df_inpt = (IdentifyPastInpatientVisits(df, period)
+                   .get_past_inpt_visits())
+        df_outpt = (IdentifyPastOutpatientVisits(df, period)
+                    .get_past_outpt_visits())
+        return (MemberLevelAssembler()
+                .add(df_ed).add(df_inpt).add(df_outpt).assemble())
+
+    @staticmethod
+    def get_past_visits_snapshots(df, index_dates):
+        return IdentifyPastVisitsSnapshots(df, index_dates).get_past_visits()
@@ -0,0 +1,209 @@
+import os
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from asthma.claim.claim_member_level_cls import (PastVisitsData,
+                                                 IdentifyPastVisitsSnapshots)
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+__all__ = ['IdentifyPastVisitsDuckDB']
+
+
+class IdentifyPastVisitsDuckDB:
+
+    visit_types = ['ED', 'inpt', 'outpt', 'virtual']
+
+    def __init__(self, source, period=None, stay_gap_days=1, threads=None,
+                 memory_limit=None, temp_directory=None):
+        if duckdb is None:
+            raise ImportError('The DuckDB backend needs the duckdb package.')
+
+        # the source is either the processed claims or a parquet file of
+        # them, with the visit type and asthma flags already extracted
+        if isinstance(source, pd.DataFrame):
+            for column in PastVisitsData.columns:
+                if column not in source.columns:
+                    m = f'Past visits cannot be calculated without "{column}".'
+                    raise KeyError(m)
+        elif not os.path.exists(source):
+            raise FileNotFoundError('No such file found in the given path.')
+        self._source = source
+        self._period = period
+        self.stay_gap_days = stay_gap_days
+        # DuckDB spills to the temporary directory once the memory limit
+        # is reached
+        self._config = {key: value for key, value in
+                        [('threads', threads), ('memory_limit', memory_limit),
+                         ('temp_directory', temp_directory)]
+                        if value is not None}
+
+    def _register_source(self, conn):
+        columns = [col for col in PastVisitsData.columns if col != 'dos_from']
+        if isinstance(self._source, pd.DataFrame):
+            has_dos = 'dos' in self._source.columns
+            data = self._source[PastVisitsData.columns +
+                                (['dos'] if has_dos else [])]
+            # the row order decides the "first" provider of a day
+            conn.register('source', data.assign(row_idx=np.arange(len(data))))
+            row_idx = 'row_idx'
+        else:
+            source = conn.read_parquet(self._source, file_row_number=True)
+            has_dos = 'dos' in source.columns
+            source.create_view('source')
+            row_idx = 'file_row_number'
+
+        # same deduplication as PastVisitsData, keeping the first row
+        dos = 'CAST(dos AS DATE)' if has_dos else 'CAST(dos_from AS DATE)'
+        conn.execute(f"""
+            CREATE TEMP TABLE visits AS
+            SELECT {', '.join(columns)}, {dos} AS dos,
+                   MIN({row_idx}) AS row_idx
+            FROM source
+            GROUP BY ALL
+            """)
+
+    def _get_period(self, conn):
+        if self._period is None:
+            return pd.Timestamp(
+                conn.execute('SELECT MAX(dos) FROM visits').fetchone()[0])
+        return pd.Timestamp(self._period).normalize()
+
+    def _get_member_days_query(self):
+        # one row per member and day, with the flags and paid amounts of
+        # every visit type, all causes and asthma only
+        columns = []
+        for t in self.visit_types:
+            columns += [
+                f'SUM({t}) > 0 AS is_{t}',
+                f'FSUM({t} * total_paid_amt) AS {t}_paid_amt',
+                f'SUM({t} * prm_sec_as) > 0 AS is_as_{t}',
+                f'FSUM({t} * total_paid_amt * prm_sec_as) AS {t}_as_paid_amt']
+        return f"""
+            SELECT member_medicaid_id, dos, {', '.join(columns)},
+                   ARG_MIN(attending_providerid, row_idx)
+                       FILTER (WHERE attending_providerid IS NOT NULL)
+                       AS attending_providerid
+            FROM visits
+            WHERE dos <= $period
+            GROUP BY member_medicaid_id, dos
+            """
+
+    def _get_stays_query(self):
+        # inpatient days at most stay_gap_days apart are one stay; stays are
+        # numbered per member over every day, so that a stay starting before
+        # a window counts once
+        previous, starts = [], []
+        for flag in ['is_inpt', 'is_as_inpt']:
+            previous.append(
+                f'LAST_VALUE(CASE WHEN {flag} THEN dos END IGNORE NULLS) '
+                f'OVER (PARTITION BY member_medicaid_id ORDER BY dos ROWS '
+                f'BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS {flag}_prev')
+            starts.append(
+                f'SUM(CASE WHEN {flag} AND ({flag}_prev IS NULL OR '
+                f'dos - {flag}_prev > {int(self.stay_gap_days)}) '
+                f'THEN 1 ELSE 0 END) OVER (PARTITION BY member_medicaid_id '
+                f'ORDER BY dos ROWS UNBOUNDED PRECEDING) AS {flag}_stay')
+        return f"""
+            SELECT *, {', '.join(starts)}
+            FROM (SELECT *, {', '.join(previous)} FROM member_days)
+            """
+
+    def _get_feature_expressions(self):
+        def window(m):
+            return f'dos >= $start_{m}'
+
+        features = {}
+        for t in self.visit_types:
+            for m in [12, 6, 3]:
+                for kind, flag in [('', f'is_{t}'), ('_as', f'is_as_{t}')]:
+                    paid = f'{t}{kind}_paid_amt'
+                    features[f'{t}{kind}_n{m}'] = (
+                        f'COUNT(*) FILTER (WHERE {flag} AND {window(m)})')
+                    features[f'{t}{kind}_pd_{m}'] = (
+                        f'COALESCE(FSUM({paid}) FILTER '
+                        f'(WHERE {flag} AND {window(m)}), 0)')
+            for kind, flag in [('', f'is_{t}'), ('_as', f'is_as_{t}')]:
+                features[f'{t}{kind}_d'] = (
+                    f'MAX(dos) FILTER (WHERE {flag} AND {window(12)})')
+
+        for kind, flag in [('', 'is_inpt'), ('_as', 'is_as_inpt')]:
+            for m in [12, 3]:
+                features[f'inpt{kind}_u_n{m}'] = (
+                    f'COUNT(DISTINCT {flag}_stay) '
+                    f'FILTER (WHERE {flag} AND {window(m)})')
+
+        features['attending_providerid'] = (
+            f'ARG_MIN(attending_providerid, dos) FILTER (WHERE is_outpt AND '
+            f'attending_providerid IS NOT NULL AND {window(12)})')
+        return features
+
+    def _get_query(self, columns):
+        features = self._get_feature_expressions()
+        selected = [f'{features[col]} AS "{col}"' for col in columns
+                    if col != 'max_doc']
+        # the most frequent outpatient provider of the last 24 months, ties
+        # resolved by provider order
+        return f"""
+            WITH member_days AS ({self._get_member_days_query()}),
+            stays AS ({self._get_stays_query()}),
+            provider_days AS (
+                SELECT member_medicaid_id, attending_providerid, dos
+                FROM visits
+                WHERE dos <= $period AND dos >= $start_24 AND
+                      attending_providerid IS NOT NULL
+                GROUP BY ALL
+                HAVING SUM(outpt) > 0),
+            max_doc AS (
+                SELECT member_medicaid_id, attending_providerid AS max_doc
+                FROM provider_days
+                GROUP BY member_medicaid_id, attending_providerid
+                QUALIFY ROW_NUMBER() OVER (
+                    PARTITION BY member_medicaid_id
+                    ORDER BY COUNT(*) DESC, attending_providerid) = 1),
+            features AS (
+                SELECT member_medicaid_id, {', '.join(selected)}
+                FROM stays
+                GROUP BY member_medicaid_id)
+            SELECT m.member_medicaid_id, f.* EXCLUDE (member_medicaid_id),
+                   d.max_doc
+            FROM (SELECT DISTINCT member_medicaid_id FROM visits) m
+            LEFT JOIN features f USING (member_medicaid_id)
+            LEFT JOIN max_doc d USING (member_medicaid_id)
+            """
+
+    def _format_result(self, df, columns):
+        df = df.sort_values('member_medicaid_id', ignore_index=True)
+        for col in columns:
+            if col.endswith('_d'):
+                df[col] = df[col].astype('datetime64[ns]')
+            elif col in ['attending_providerid', 'max_doc']:
+                df[col] = df[col].astype(object).where(df[col].notnull(),
+                                                       np.nan)
+            elif '_n' in col and df.shape[0] and (df[col] > 0).all():
+                # as with pandas, counts stay integers only when no member
+                # has to be filled in
+                df[col] = df[col].astype(np.int64)
+            else:
+                df[col] = df[col].fillna(0).astype(float)
+        return df[['member_medicaid_id'] + columns]
+
+    def get_past_visits(self):
+        columns = IdentifyPastVisitsSnapshots._get_feature_columns()
+        print('Calculating past visits with DuckDB ...')
+        conn = duckdb.connect(config=self._config)
+        try:
+            self._register_source(conn)
+            period = self._get_period(conn)
+            params = {'period': period.date()}
+            for m in [24, 12, 6, 3]:
+                params[f'start_{m}'] = (period -
+                                        relativedelta(months=m)).date()
+            df = conn.execute(self._get_query(columns), params).df()
+        finally:
+            conn.close()
+        return self._format_result(df, columns)
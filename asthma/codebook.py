@@ -14,6 +14,18 @@ The history:
 ['J82.33']
 """
 
+__all__ = [
+    'ASTHMA_ICD_9_MIN_THRESH', 'ASTHMA_ICD_9_MAX_THRESH',
+    'ASTHMA_ICD_10_CM_CODES', 'ALLERGIC_ICD_9_MIN_THRESH',
+    'ALLERGIC_ICD_9_MAX_THRESH', 'ALLERGIC_ICD_10_CODES',
+    'OBESITY_ICD_9_MIN_THRESH', 'OBESITY_ICD_9_MAX_THRESH',
+    'OBESITY_ICD_10_CODES', 'OBS_SLEEP_ICD_9_CODE', 'OBS_SLEEP_ICD_10_CODE',
+    'GERD_ICD_9_CODE', 'GERD_ICD_10_CODES', 'COMORBIDITY_CONDITIONS',
+    'ED_REV_CODES', 'ED_POS_CODES', 'INPT_REV_CODES', 'INPT_POS_CODES',
+    'OUTPT_REV_CODES', 'OUTPT_POS_CODES', 'VIRTUAL_POS_CODES',
+    'PLACE_OF_SERCVICE_NAMES', 'VISIT_TYPES', 'CONTROLLERS',
+    'CONTROLLER_FORM_TOKENS']
+
 
 # codes used for identifying asthma-related claims
 ASTHMA_ICD_9_MIN_THRESH = '493'
@@ -49,6 +61,31 @@ OUTPT_POS_CODES = [2, 3, 4, 5, 6, 7, 8, 9, 10,
 VIRTUAL_POS_CODES = [2, 10]
 
 
+# visit types classified per visit (member and date of service); a visit is
+# flagged with a type if any of its lines has one of the type's revenue or
+# place of service codes, unless the visit is already flagged with one of the
+# types it excludes (inpatient takes precedence over ED over outpatient);
+# virtual visits are flagged alongside outpatient visits, not instead of them
+VISIT_TYPES = {
+    'inpt': {
+        'rev_codes': INPT_REV_CODES,
+        'pos_codes': INPT_POS_CODES,
+        'excludes': []},
+    'ED': {
+        'rev_codes': ED_REV_CODES,
+        'pos_codes': ED_POS_CODES,
+        'excludes': ['inpt']},
+    'outpt': {
+        'rev_codes': OUTPT_REV_CODES,
+        'pos_codes': OUTPT_POS_CODES,
+        'excludes': ['inpt', 'ED']},
+    'virtual': {
+        'rev_codes': [],
+        'pos_codes': VIRTUAL_POS_CODES,
+        'excludes': ['inpt', 'ED']},
+}
+
+
 ALLERGIC_ICD_9_MIN_THRESH = '477.0'
 ALLERGIC_ICD_9_MAX_THRESH = '477.9'
 ALLERGIC_ICD_10_CODES = ['J30', 'J30.1', 'J30.2', 'J30.81', 'J30.89', 'J30.9']
@@ -68,6 +105,25 @@ GERD_ICD_9_CODE = '530.81'
 GERD_ICD_10_CODES = ['K21.0', 'K21.9']
 
 
+# conditions used for identifying comorbidities; every condition matches its
+# ICD-10 codes regardless of the ICD version column, and its ICD-9 codes
+# (an inclusive range and/or exact codes) only on ICD-9 claims
+COMORBIDITY_CONDITIONS = {
+    'allergic_co': {
+        'icd_10': ALLERGIC_ICD_10_CODES,
+        'icd_9_range': (ALLERGIC_ICD_9_MIN_THRESH, ALLERGIC_ICD_9_MAX_THRESH)},
+    'obesity_co': {
+        'icd_10': OBESITY_ICD_10_CODES,
+        'icd_9_range': (OBESITY_ICD_9_MIN_THRESH, OBESITY_ICD_9_MAX_THRESH)},
+    'obs_sleep_co': {
+        'icd_10': [OBS_SLEEP_ICD_10_CODE],
+        'icd_9': [OBS_SLEEP_ICD_9_CODE]},
+    'GERD_co': {
+        'icd_10': GERD_ICD_10_CODES,
+        'icd_9': [GERD_ICD_9_CODE]},
+}
+
+
 PLACE_OF_SERCVICE_NAMES = {
     1: 'Pharmacy',
     2: 'Telehealth (Provided Other Than Patient\'s Home)',
@@ -273,3 +329,16 @@ CONTROLLERS = [
     'ZILEUTON 600 MG ORAL TABLET',
     'ZILEUTON 600 MG ORAL TABLET, EXTENDED RELEASE']
     
+
+
+# dosage form, unit and packaging tokens of the controller names; the
+# remaining tokens (ingredients and strengths) are used for finding candidate
+# controllers for near matches
+CONTROLLER_FORM_TOKENS = [
+    '2ml', 'act', 'activated', 'adapter', 'aer', 'aero', 'aerosol', 'ba',
+    'base', 'blister', 'breath', 'capsule', 'cfc', 'chew', 'chewable', 'dose',
+    'elixir', 'equiv', 'extended', 'free', 'granule', 'granules', 'hfa',
+    'hours', 'inh', 'inhal', 'inhalation', 'injection', 'liquid', 'mcg', 'mg',
+    'ml', 'oral', 'packet', 'pow', 'powd', 'powder', 'release', 'soln',
+    'solution', 'subcutaneous', 'susp', 'suspension', 'syrup', 'tab',
+    'tablet', 'valve', 'with']
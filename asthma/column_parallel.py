@@ -0,0 +1,26 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+__all__ = ['ColumnParallelExecutor']
+
+
+class ColumnParallelExecutor:
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = min(32, os.cpu_count() or 1)
+        if max_workers < 1:
+            raise ValueError('At least one worker is needed.')
+        self.max_workers = max_workers
+
+    def map(self, func, columns):
+        # columns are independent; the work is expected to be mostly Arrow
+        # compute kernels, which release the GIL, so threads are enough
+        columns = list(columns)
+        if self.max_workers == 1 or len(columns) < 2:
+            return [func(col) for col in columns]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers,
+                                                len(columns))) as executor:
+            return list(executor.map(func, columns))
@@ -0,0 +1,132 @@
+import json
+import hashlib
+from functools import lru_cache, cached_property
+from asthma import codebook
+
+
+__all__ = ['CompiledCodebook', 'get_compiled_codebook']
+
+
+class CompiledCodebook:
+
+    # revenue codes are in 100-9999 and place of service codes in 0-99
+    _rev_code_table_size = 10_000
+    _pos_code_table_size = 100
+
+    @cached_property
+    def version(self):
+        # hash of every codebook constant, so that cached features can be
+        # invalidated when the codes change
+        constants = {name: getattr(codebook, name) for name in dir(codebook)
+                     if name.isupper()}
+        payload = json.dumps(constants, sort_keys=True, default=list)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    @cached_property
+    def asthma_icd_10_codes(self):
+        return frozenset(codebook.ASTHMA_ICD_10_CM_CODES)
+
+    @cached_property
+    def asthma_icd_10_code_array(self):
+        # numpy is imported where it's needed, so that the version and the
+        # controller lookups don't load it
+        import numpy as np
+        return np.array(sorted(self.asthma_icd_10_codes), dtype=object)
+
+    @cached_property
+    def visit_type_bits(self):
+        return {name: 1 << bit
+                for bit, name in enumerate(codebook.VISIT_TYPES)}
+
+    @cached_property
+    def visit_type_bit_dtype(self):
+        import numpy as np
+        return np.min_scalar_type((1 << len(codebook.VISIT_TYPES)) - 1)
+
+    @cached_property
+    def visit_type_codes(self):
+        import numpy as np
+        return {name: {key: np.unique(np.array(spec[key], dtype=np.int64))
+                       for key in ['rev_codes', 'pos_codes']}
+                for name, spec in codebook.VISIT_TYPES.items()}
+
+    def _build_visit_type_table(self, key, size):
+        import numpy as np
+        table = np.zeros(size, dtype=self.visit_type_bit_dtype)
+        for name, codes in self.visit_type_codes.items():
+            table[codes[key]] |= self.visit_type_bits[name]
+        table.setflags(write=False)
+        return table
+
+    @cached_property
+    def rev_code_table(self):
+        return self._build_visit_type_table('rev_codes',
+                                            self._rev_code_table_size)
+
+    @cached_property
+    def pos_code_table(self):
+        return self._build_visit_type_table('pos_codes',
+                                            self._pos_code_table_size)
+
+    @cached_property
+    def controllers(self):
+        return frozenset(codebook.CONTROLLERS)
+
+    @staticmethod
+    def normalize_controller_name(name):
+        from fuzzywuzzy import utils
+
+        # the same processing fuzzywuzzy applies before token_sort_ratio
+        processed = utils.full_process(utils.full_process(name),
+                                       force_ascii=True)
+        return ' '.join(sorted(processed.split()))
+
+    @cached_property
+    def controller_positions(self):
+        return {name: i for i, name in enumerate(codebook.CONTROLLERS)}
+
+    @cached_property
+    def controller_form_tokens(self):
+        return frozenset(codebook.CONTROLLER_FORM_TOKENS)
+
+    def get_controller_key_tokens(self, name):
+        return {token for token in self.normalize_controller_name(name).split()
+                if token not in self.controller_form_tokens}
+
+    @cached_property
+    def controller_candidate_index(self):
+        # blocking index from ingredient and strength tokens to the
+        # controllers having them
+        index = {}
+        for name in codebook.CONTROLLERS:
+            for token in self.get_controller_key_tokens(name):
+                index.setdefault(token, []).append(name)
+        return {token: tuple(names) for token, names in index.items()}
+
+    def get_controller_candidates(self, name):
+        candidates = set()
+        for token in self.get_controller_key_tokens(name):
+            candidates.update(self.controller_candidate_index.get(token, ()))
+        # codebook order, so that ties resolve as in a search over the list
+        return sorted(candidates, key=self.controller_positions.get)
+
+    @cached_property
+    def controller_tokens(self):
+        # normalized tokens to the first controller with those tokens, the
+        # one process.extractOne returns on ties
+        tokens = {}
+        for name in codebook.CONTROLLERS:
+            tokens.setdefault(self.normalize_controller_name(name), name)
+        return tokens
+
+    def compile(self):
+        # builds every artifact up front, e.g. before forking workers
+        for name in dir(type(self)):
+            if isinstance(getattr(type(self), name), cached_property):
+                getattr(self, name)
+        return self
+
+
+@lru_cache(maxsize=None)
+def get_compiled_codebook():
+    return CompiledCodebook()
@@ -1,54 +1,290 @@
-from asthma.data_validation import *
-from asthma.claim.claim_data_processing_cls import *
-from asthma.claim.claim_member_level_cls import *
-from asthma.pharmacy.pharmacy_data_processing_cls import *
+import os
+import tempfile
+from abc import ABC, abstractmethod
+import pandas as pd
+from asthma.data_validation import (ClaimViewDataValidation,
+                                    PharmacyViewDataValidation,
+                                    ClaimViewFileValidation,
+                                    PharmacyViewFileValidation)
+from asthma.validate_schema import ValidateSchema
+from asthma.partitioning import PartitionByMember
+from asthma.async_loading import AsyncViewLoader
+from asthma.assembly import MemberLevelAssembler
+from asthma.checkpoint import StageCheckpoints
+from asthma.claim.claim_data_processing_cls import (IdentifyAsthmaRelatedClaims,
+                                                    IdentifyVisitTypes,
+                                                    ProcessMemberMedicaidIDs)
+from asthma.claim.claim_member_level_cls import (IdentifyComorbidities,
+                                                 IdentifyPastVisits)
+from asthma.pharmacy.pharmacy_data_processing_cls import (
+    IdentifyControllersRelievers, CalculateAMRScore, GetLastThreeControllers)
 
 
-class ClaimViewDataProcessing:
+# the pipeline steps are exported too, as they used to be through the
+# star imports
+__all__ = ['ClaimViewDataProcessing', 'ClaimViewChunkedDataProcessing',
+           'PharmacyViewDataProcessing', 'PharmacyViewChunkedDataProcessing',
+           'GetCombinedMemberLevelData', 'ClaimViewDataValidation',
+           'PharmacyViewDataValidation', 'IdentifyAsthmaRelatedClaims',
+           'IdentifyVisitTypes', 'ProcessMemberMedicaidIDs',
+           'IdentifyComorbidities', 'IdentifyPastVisits',
+           'IdentifyControllersRelievers', 'CalculateAMRScore',
+           'GetLastThreeControllers']
 
-    def __init__(self, filepath):
-        self._df = ClaimViewDataValidation(filepath).get_validated_data()
+
+class StagedDataProcessing:
+
+    def _run_stage(self, stage, func):
+        if self._checkpoints is None:
+            return func()
+        return self._checkpoints.run(stage, func)
+
+    def _is_resumable(self, *stages):
+        return (self._checkpoints is not None and
+                self._checkpoints.is_resumable(*stages))
+
+    def _run_stages(self, stages):
+        # every stage works on the data of the one before it, so only the
+        # last completed one is read back on resume
+        completed = [i for i, (stage, _) in enumerate(stages)
+                     if self._is_resumable(stage)]
+        for stage, func in stages[max(completed, default=0):]:
+            self._df = self._run_stage(stage, func)
+        return self._df
+
+
+class ClaimViewDataProcessing(StagedDataProcessing):
+
+    def __init__(self, filepath, validate_schema=True, period=None, data=None,
+                 fast_validation=False, backend='pandas', checkpoint_dir=None,
+                 resume=False, validate_file=True):
+        self._validation = ClaimViewDataValidation(
+            filepath, validate_schema, data, fast_validation, validate_file)
+        self._validate_file = validate_file
+        # completed stages are written to the checkpoint directory, and
+        # skipped on resume when their inputs haven't changed
+        self._checkpoints = None
+        if checkpoint_dir is not None:
+            stages = [('validated',
+                       [StageCheckpoints.get_file_fingerprint(filepath),
+                        validate_schema, fast_validation, validate_file]),
+                      ('member_ids', []), ('asthma_flags', []),
+                      ('visit_types', []), ('comorbidities', []),
+                      ('past_visits', [period, backend])]
+            self._checkpoints = StageCheckpoints(checkpoint_dir, stages,
+                                                 resume)
+        # with checkpoints the data is only validated when a stage needs it,
+        # as a resumed run may not read it at all
+        self._df = (None if self._checkpoints is not None
+                    else self._validation.get_validated_data())
+        self._period = period
+        # 'pandas' or 'duckdb' for the past visit features
+        self._backend = backend
         self._processed = False
 
+    def _process(self, func):
+        # the row-level steps add their columns in place
+        func(self._df)
+        return self._df
+
     def get_processed_data(self):
-        ProcessMemberMedicaidIDs().process_medicaid_ids(self._df)
-        IdentifyAsthmaRelatedClaims().extract_asthma_flags(self._df)
-        IdentifyVisitTypes().extract_visit_types(self._df)
+        self._run_stages([
+            ('validated', self._validation.get_validated_data),
+            ('member_ids', lambda: self._process(
+                ProcessMemberMedicaidIDs(
+                    self._validate_file).process_medicaid_ids)),
+            ('asthma_flags', lambda: self._process(
+                IdentifyAsthmaRelatedClaims().extract_asthma_flags)),
+            ('visit_types', lambda: self._process(
+                IdentifyVisitTypes().extract_visit_types))])
         self._processed = True
         return self._df
 
     def get_member_level_data(self):
-        if not self._processed:
+        # the claims aren't needed once both member-level stages are done
+        if not self._processed and \
+                not self._is_resumable('comorbidities', 'past_visits'):
             self._df = self.get_processed_data()
 
-        comorbidities = IdentifyComorbidities().identify_comorbidities(self._df)
-        visits = IdentifyPastVisits().get_past_visits(self._df)
-        return visits.merge(comorbidities, how='outer')
+        comorbidities = self._run_stage(
+            'comorbidities',
+            lambda: IdentifyComorbidities().identify_comorbidities(self._df))
+        visits = self._run_stage(
+            'past_visits',
+            lambda: IdentifyPastVisits().get_past_visits(
+                self._df, self._period, self._backend))
+        return MemberLevelAssembler().add(visits).add(comorbidities).assemble()
+
+
+class ViewChunkedDataProcessing(ABC):
 
+    def __init__(self, filepath, file_validation, num_buckets=16,
+                 batch_size=500_000, validate_schema=True, tmp_dir=None,
+                 date_column=None):
+        self._filepath = filepath
+        self._partitioner = PartitionByMember(
+            filepath, num_buckets=num_buckets, batch_size=batch_size,
+            date_column=date_column)
+        # the whole file is validated once while it is partitioned, so the
+        # buckets are processed with validate_file=False
+        self._file_validation = file_validation
+        self._validate_schema = validate_schema
+        self._tmp_dir = tmp_dir
 
-class PharmacyViewDataProcessing:
+    @abstractmethod
+    def _get_bucket_member_level_data(self, path):
+        pass
 
-    def __init__(self, filepath):
-        self._df = PharmacyViewDataValidation(filepath).get_validated_data()
+    def _iter_member_level_data(self):
+        if self._validate_schema:
+            print('Validating schema ...')
+            ValidateSchema(self._filepath).validate_schemas()
+
+        with tempfile.TemporaryDirectory(dir=self._tmp_dir) as directory:
+            paths = self._partitioner.partition(
+                directory, self._file_validation.update)
+            self._file_validation.validate()
+            for i, path in enumerate(paths):
+                print('Processing member bucket {:,} out of {:,} ...'
+                      .format(i + 1, len(paths)))
+                yield self._get_bucket_member_level_data(path)
+                os.remove(path)
 
     def get_member_level_data(self):
-        IdentifyControllersRelievers().get_controllers_and_relievers(self._df)
+        df = pd.concat(list(self._iter_member_level_data()), ignore_index=True)
+        return df.sort_values('member_medicaid_id', ignore_index=True)
+
+    def write_member_level_data(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for i, df in enumerate(self._iter_member_level_data()):
+            path = os.path.join(output_dir, f'part-{i:05d}.parquet')
+            df.to_parquet(path, index=False)
+            paths.append(path)
+        return paths
+
+
+class ClaimViewChunkedDataProcessing(ViewChunkedDataProcessing):
+
+    def __init__(self, filepath, num_buckets=16, batch_size=500_000,
+                 validate_schema=True, tmp_dir=None):
+        super().__init__(filepath, ClaimViewFileValidation(filepath),
+                         num_buckets, batch_size, validate_schema, tmp_dir,
+                         date_column='dos_from')
+
+    def _get_bucket_member_level_data(self, path):
+        # every bucket uses the last date of service of the whole file
+        return ClaimViewDataProcessing(
+            path, validate_schema=False, period=self._partitioner.max_date,
+            validate_file=False).get_member_level_data()
+
+
+class PharmacyViewDataProcessing(StagedDataProcessing):
+
+    def __init__(self, filepath, validate_schema=True, data=None,
+                 fast_validation=False, checkpoint_dir=None, resume=False,
+                 controller_score_cutoff=100, validate_file=True):
+        self._validation = PharmacyViewDataValidation(
+            filepath, validate_schema, data, fast_validation, validate_file)
+        # below 100 product names are also near matched to the controllers
+        self._controller_score_cutoff = controller_score_cutoff
+        self._checkpoints = None
+        if checkpoint_dir is not None:
+            stages = [('validated',
+                       [StageCheckpoints.get_file_fingerprint(filepath),
+                        validate_schema, fast_validation, validate_file]),
+                      ('controllers_relievers', [controller_score_cutoff]),
+                      ('amr_scores', []),
+                      ('last_controllers', [])]
+            self._checkpoints = StageCheckpoints(checkpoint_dir, stages,
+                                                 resume)
+        self._df = (None if self._checkpoints is not None
+                    else self._validation.get_validated_data())
+
+    def _get_controllers_and_relievers(self):
+        IdentifyControllersRelievers(
+            self._controller_score_cutoff).get_controllers_and_relievers(
+                self._df)
+        return self._df
+
+    def _get_amr_scores(self):
         amr = CalculateAMRScore().get_amr_scores(self._df)
         amr['member_medicaid_id'] = (amr.member_medicaid_id.astype(int)
                                      .astype(str))
+        return amr
+
+    def _get_controllers(self):
         controllers = GetLastThreeControllers(self._df).get_controllers()
         controllers['member_medicaid_id'] = (controllers.member_medicaid_id
                                              .astype(int).astype(str))
-        return amr.merge(controllers, how='outer')
+        return controllers
+
+    def get_member_level_data(self):
+        # the fills aren't needed once both member-level stages are done
+        if not self._is_resumable('amr_scores', 'last_controllers'):
+            self._run_stages([
+                ('validated', self._validation.get_validated_data),
+                ('controllers_relievers',
+                 self._get_controllers_and_relievers)])
+        amr = self._run_stage('amr_scores', self._get_amr_scores)
+        controllers = self._run_stage('last_controllers',
+                                      self._get_controllers)
+        return MemberLevelAssembler().add(amr).add(controllers).assemble()
+
+
+class PharmacyViewChunkedDataProcessing(ViewChunkedDataProcessing):
+
+    def __init__(self, filepath, num_buckets=16, batch_size=500_000,
+                 validate_schema=True, tmp_dir=None):
+        super().__init__(filepath, PharmacyViewFileValidation(filepath),
+                         num_buckets, batch_size, validate_schema, tmp_dir)
+
+    def _get_bucket_member_level_data(self, path):
+        return PharmacyViewDataProcessing(
+            path, validate_schema=False,
+            validate_file=False).get_member_level_data()
 
 
 class GetCombinedMemberLevelData:
 
-    def __init__(self, filepath_claim, filepath_pharmacy):
+    def __init__(self, filepath_claim, filepath_pharmacy, validate_schema=True,
+                 load_async=True, fast_validation=False, backend='pandas',
+                 checkpoint_dir=None, resume=False,
+                 controller_score_cutoff=100):
         self._fc = filepath_claim
         self._fp = filepath_pharmacy
+        self._validate_schema = validate_schema
+        # a resumed run may skip loading the views, so they aren't read
+        # ahead
+        self._load_async = load_async and not resume
+        self._fast_validation = fast_validation
+        self._backend = backend
+        self._checkpoint_dirs = (
+            [None, None] if checkpoint_dir is None else
+            [os.path.join(checkpoint_dir, pipeline)
+             for pipeline in ['claim', 'pharmacy']])
+        self._resume = resume
+        self._controller_score_cutoff = controller_score_cutoff
 
     def get_data(self):
-        claims = ClaimViewDataProcessing(self._fc).get_member_level_data()
-        pharma = PharmacyViewDataProcessing(self._fp).get_member_level_data()
-        return claims.merge(pharma, how='outer')
+        claim_data, pharmacy_data = None, None
+        # the footer statistics are checked once, either by the loader or
+        # by the validators before they read their file
+        if self._load_async:
+            claim_data, pharmacy_data = AsyncViewLoader(
+                [(self._fc, 'claim'), (self._fp, 'pharmacy')],
+                self._validate_schema,
+                self._fast_validation).load()
+
+        claims = ClaimViewDataProcessing(
+            self._fc, self._validate_schema, data=claim_data,
+            fast_validation=self._fast_validation, backend=self._backend,
+            checkpoint_dir=self._checkpoint_dirs[0],
+            resume=self._resume).get_member_level_data()
+        pharma = PharmacyViewDataProcessing(
+            self._fp, self._validate_schema, data=pharmacy_data,
+            fast_validation=self._fast_validation,
+            checkpoint_dir=self._checkpoint_dirs[1], resume=self._resume,
+            controller_score_cutoff=self._controller_score_cutoff
+        ).get_member_level_data()
+        return MemberLevelAssembler().add(claims).add(pharma).assemble()
@@ -1,12 +1,26 @@
 import os
 import pandas as pd
+import pyarrow as pa
 from asthma.validate_schema import ValidateSchema
-from asthma.claim.claim_data_validation_cls import *
+from asthma.claim.claim_data_validation_cls import (DiagnosisCodeValidation,
+                                                   ValidateRevenueCodes,
+                                                   ParsePlaceOfServiceCodes,
+                                                   ValidatePlaceOfServiceCodes)
+from asthma.claim.claim_data_processing_cls import ProcessMemberMedicaidIDs
+
+
+__all__ = ['ViewDataValidation', 'ClaimViewDataValidation',
+           'PharmacyViewDataValidation', 'ClaimViewFileValidation',
+           'PharmacyViewFileValidation']
 
 
 class ViewDataValidation:
 
-    def __init__(self, filepath):
+    # 'claim' or 'pharmacy', set by the subclasses
+    view = None
+
+    def __init__(self, filepath, validate_schema=True, data=None,
+                 fast_validation=False):
         if os.path.exists(filepath):
             self._filepath = filepath
         else:
@@ -14,22 +28,45 @@ class ViewDataValidation:
 
         self._df = None
         self._column_names = None
+        self._check_schema = validate_schema
+        # range and missing value checks answered from the parquet footer
+        # instead of the loaded columns
+        self._fast_validation = fast_validation
+        # data already read (and schema- and statistics-validated) from the
+        # filepath, e.g. by AsyncViewLoader
+        if data is not None:
+            self._set_data(data)
 
     def _validate_schema(self):
-        if self._df is None:
+        if self._df is None and self._check_schema:
             print('Validating schema ...')
             validator = ValidateSchema(self._filepath)
             validator.validate_schemas()
 
+    def _validate_statistics(self):
+        # imported here, as validate_statistics depends on this module
+        from asthma.validate_statistics import ValidateStatistics
+        ValidateStatistics(self._filepath, self.view).validate()
+
     def _read_data_from_filepath(self):
         self._validate_schema()
+        # bad files are rejected before they are loaded
+        if self._fast_validation:
+            self._validate_statistics()
         print('Reading data from the path ...')
-        self._df = pd.read_parquet(self._filepath)
+        self._set_data(pd.read_parquet(self._filepath))
+
+    def _set_data(self, df):
+        self._df = df
         self._column_names = self._df.columns
         self._df.columns = self._process_column_names()
 
+    @staticmethod
+    def normalize_column_name(column):
+        return column.lower().strip().replace(' ', '_')
+
     def _process_column_names(self):
-        return [c.lower().strip().replace(' ', '_') for c in self._df.columns]
+        return [self.normalize_column_name(c) for c in self._df.columns]
 
     def get_raw_data(self):
         if self._df is None:
@@ -41,17 +78,34 @@ class ViewDataValidation:
 
 class ClaimViewDataValidation(ViewDataValidation):
 
-    def __init__(self, filepath):
-        super().__init__(filepath)
+    view = 'claim'
+
+    def __init__(self, filepath, validate_schema=True, data=None,
+                 fast_validation=False, validate_file=True):
+        super().__init__(filepath, validate_schema, data, fast_validation)
+        # the checks that only hold for the whole file are left out for a
+        # part of it, e.g. a member bucket, see ClaimViewFileValidation
+        self._validate_file = validate_file
         self._validated = False
 
     def validate(self):
         if self._df is None:
             self._read_data_from_filepath()
 
+        # rows are checked on their own, so this holds for a part of the file
         DiagnosisCodeValidation().validate(self._df)
-        ValidateRevenueCodes().validate(self._df.revenue_code)
-        ValidatePlaceOfServiceCodes().validate(self._df.place_of_service)
+        if not self._validate_file:
+            self._df['place_of_service'] = ParsePlaceOfServiceCodes.parse(
+                self._df.place_of_service)
+            self._validated = True
+            return
+
+        if not self._fast_validation:
+            ValidateRevenueCodes().validate(self._df.revenue_code)
+        # the parsed codes are kept, so that visit typing doesn't parse the
+        # strings again
+        self._df['place_of_service'] = ValidatePlaceOfServiceCodes().validate(
+            self._df.place_of_service)
         self._validated = True
         print('Validation process completed!', end='\n\n')
 
@@ -63,21 +117,85 @@ class ClaimViewDataValidation(ViewDataValidation):
 
 class PharmacyViewDataValidation(ViewDataValidation):
 
-    def __init__(self, filepath):
-        super().__init__(filepath)
+    view = 'pharmacy'
+
+    def __init__(self, filepath, validate_schema=True, data=None,
+                 fast_validation=False, validate_file=True):
+        super().__init__(filepath, validate_schema, data, fast_validation)
+        # e.g. a member bucket may have no ages at all, see
+        # PharmacyViewFileValidation
+        self._validate_file = validate_file
         self._validated = False
 
     def validate(self):
         if self._df is None:
             self._read_data_from_filepath()
 
-        assert self._df.days_supply.isnull().sum() == 0
-        assert self._df.claim_start_date.isnull().sum() == 0
-        assert self._df.member_age_on_date_of_service.min() >= 0
-        assert self._df.member_age_on_date_of_service.max() <= 17
+        if self._validate_file and not self._fast_validation:
+            assert self._df.days_supply.isnull().sum() == 0
+            assert self._df.claim_start_date.isnull().sum() == 0
+            assert self._df.member_age_on_date_of_service.min() >= 0
+            assert self._df.member_age_on_date_of_service.max() <= 17
         self._validated = True
 
     def get_validated_data(self):
         if not self._validated:
             self.validate()
         return self._df
+
+
+class ClaimViewFileValidation:
+
+    # the checks of ClaimViewDataValidation that only hold for the whole file,
+    # for a file that is read batch by batch, e.g. while it is partitioned by
+    # member; the diagnosis codes are checked row by row, so they are left to
+    # the parts
+
+    _id_columns = ['claimid', 'member_medicaid_id', 'member_first_name',
+                   'member_last_name']
+
+    def __init__(self, filepath):
+        self._filepath = filepath
+        self._place_of_service_codes = []
+        self._ids = []
+
+    def update(self, batch):
+        table = pa.Table.from_batches([batch])
+        table = table.rename_columns(
+            [ViewDataValidation.normalize_column_name(c)
+             for c in table.column_names])
+        # only the distinct codes and claim/member pairs are kept
+        self._place_of_service_codes.append(
+            table.column('place_of_service').unique())
+        ids = table.select(self._id_columns).to_pandas().drop_duplicates()
+        self._ids.append(ids)
+
+    def validate(self):
+        print('Validating the whole file ...')
+        # imported here, as validate_statistics depends on this module
+        from asthma.validate_statistics import ValidateStatistics
+        ValidateStatistics(self._filepath, 'claim').validate()
+
+        codes = pa.chunked_array(self._place_of_service_codes).unique()
+        ValidatePlaceOfServiceCodes().validate(pd.Series(codes.to_pylist()))
+        # the record counts reported are of the distinct claim and member
+        # pairs
+        ids = pd.concat(self._ids, ignore_index=True).drop_duplicates()
+        ProcessMemberMedicaidIDs().process_medicaid_ids(ids)
+        print('Validation process completed!', end='\n\n')
+
+
+class PharmacyViewFileValidation:
+
+    # the checks of PharmacyViewDataValidation, answered from the parquet
+    # footer of the whole file
+
+    def __init__(self, filepath):
+        self._filepath = filepath
+
+    def update(self, batch):
+        pass
+
+    def validate(self):
+        from asthma.validate_statistics import ValidateStatistics
+        ValidateStatistics(self._filepath, 'pharmacy').validate()
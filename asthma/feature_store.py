@@ -0,0 +1,111 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+import pandas as pd
+
+
+__all__ = ['MemberFeatureStore']
+
+
+class MemberFeatureStore:
+
+    _table = 'member_features'
+    _metadata_table = 'member_features_metadata'
+    # SQLite limits the number of host parameters in a single statement
+    _max_ids_per_query = 500
+
+    def __init__(self, path):
+        self._path = path
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self._path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def materialize(self, df, index_date=None, replace=True):
+        df = df.copy()
+        if 'index_date' not in df.columns:
+            if index_date is None:
+                raise ValueError('Either an "index_date" column or the '
+                                 'index_date argument is needed.')
+            df['index_date'] = index_date
+
+        # index dates are stored as ISO strings so that as-of lookups can
+        # compare them in SQL
+        df['index_date'] = pd.to_datetime(df.index_date).dt.strftime('%Y-%m-%d')
+        df['member_medicaid_id'] = df.member_medicaid_id.astype(str)
+        date_columns = [col for col in df.columns
+                        if pd.api.types.is_datetime64_any_dtype(df[col])]
+        date_columns.append('index_date')
+
+        if_exists = 'replace' if replace else 'append'
+        print('Materializing {:,} member-level records ...'.format(df.shape[0]))
+        with self._connect() as conn:
+            # appended records keep the date columns of the earlier ones
+            if not replace and self._has_table(conn, self._metadata_table):
+                date_columns = list(dict.fromkeys(
+                    self._read_date_columns(conn) + date_columns))
+            metadata = pd.DataFrame({'column_name': date_columns,
+                                     'data_type': 'datetime'})
+            df.to_sql(self._table, conn, if_exists=if_exists, index=False)
+            metadata.to_sql(self._metadata_table, conn, if_exists='replace',
+                            index=False)
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{self._table}_member_date '
+                f'ON {self._table} (member_medicaid_id, index_date)')
+
+    @staticmethod
+    def _has_table(conn, table):
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)).fetchone() is not None
+
+    def _read_date_columns(self, conn):
+        return pd.read_sql(f'SELECT column_name FROM {self._metadata_table}',
+                           conn).column_name.tolist()
+
+    def _query_member_features(self, conn, ids, as_of):
+        placeholders = ', '.join('?' * len(ids))
+        query = f"""
+            SELECT f.*
+            FROM {self._table} f
+            JOIN (SELECT member_medicaid_id, MAX(index_date) AS index_date
+                  FROM {self._table}
+                  WHERE member_medicaid_id IN ({placeholders})
+                    AND index_date <= ?
+                  GROUP BY member_medicaid_id) latest
+            USING (member_medicaid_id, index_date)
+            """
+        return pd.read_sql(query, conn, params=list(ids) + [as_of])
+
+    def get_member_features(self, ids, as_of=None):
+        if not os.path.exists(self._path):
+            raise FileNotFoundError('No feature store in the given path.')
+
+        if isinstance(ids, str):
+            ids = [ids]
+        ids = list(dict.fromkeys(str(i).strip() for i in ids))
+        # without a date the latest materialized features are returned
+        as_of = ('9999-12-31' if as_of is None
+                 else pd.Timestamp(as_of).strftime('%Y-%m-%d'))
+
+        with self._connect() as conn:
+            date_columns = self._read_date_columns(conn)
+            chunks = [self._query_member_features(
+                          conn, ids[i:i + self._max_ids_per_query], as_of)
+                      for i in range(0, len(ids), self._max_ids_per_query)]
+            # no ids, so only the feature columns are returned
+            if not chunks:
+                chunks = [pd.read_sql(f'SELECT * FROM {self._table} LIMIT 0',
+                                      conn)]
+        df = pd.concat(chunks, ignore_index=True)
+        for col in date_columns:
+            df[col] = pd.to_datetime(df[col])
+
+        order = {idx: i for i, idx in enumerate(ids)}
+        return (df.sort_values('member_medicaid_id',
+                               key=lambda x: x.map(order), ignore_index=True))
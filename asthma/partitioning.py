@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from asthma.data_validation import ViewDataValidation
+
+
+__all__ = ['PartitionByMember']
+
+
+class PartitionByMember:
+
+    def __init__(self, filepath, num_buckets=16, batch_size=500_000,
+                 member_column='member_medicaid_id', date_column=None):
+        if os.path.exists(filepath):
+            self._filepath = filepath
+        else:
+            raise FileNotFoundError('No such file in the given path.')
+
+        if num_buckets < 1:
+            raise ValueError('At least one bucket is needed.')
+
+        self.num_buckets = num_buckets
+        self.batch_size = batch_size
+        self.member_column = member_column
+        self.date_column = date_column
+        self.max_date = None
+
+    @staticmethod
+    def _get_raw_column_name(schema, column):
+        for name in schema.names:
+            if ViewDataValidation.normalize_column_name(name) == column:
+                return name
+        raise KeyError(f'"{column}" not found in {schema.names}.')
+
+    def _get_bucket_numbers(self, ids):
+        # ids are stripped the same way as ProcessMemberMedicaidIDs does, so
+        # that all records of a member end up in the same bucket
+        if pa.types.is_string(ids.type) or pa.types.is_large_string(ids.type):
+            ids = pc.utf8_trim_whitespace(ids)
+        arr = pd.util.hash_array(np.asarray(ids.to_numpy(zero_copy_only=False),
+                                            dtype=object))
+        return (arr % np.uint64(self.num_buckets)).astype(np.int64)
+
+    def _update_max_date(self, dates):
+        value = pc.max(dates).as_py()
+        if value is not None and (self.max_date is None or
+                                  value > self.max_date):
+            self.max_date = value
+
+    def partition(self, directory, on_batch=None):
+        parquet_file = pq.ParquetFile(self._filepath)
+        schema = parquet_file.schema_arrow
+        member_column = self._get_raw_column_name(schema, self.member_column)
+        date_column = None
+        if self.date_column is not None:
+            date_column = self._get_raw_column_name(schema, self.date_column)
+
+        print('Partitioning records into {:,} member buckets ...'
+              .format(self.num_buckets))
+        paths = [os.path.join(directory, f'bucket_{i:05d}.parquet')
+                 for i in range(self.num_buckets)]
+        writers = {}
+        try:
+            for batch in parquet_file.iter_batches(batch_size=self.batch_size):
+                # e.g. to validate the whole file on the same read
+                if on_batch is not None:
+                    on_batch(batch)
+                if date_column is not None:
+                    self._update_max_date(batch.column(date_column))
+
+                buckets = self._get_bucket_numbers(batch.column(member_column))
+                order = np.argsort(buckets, kind='stable')
+                bounds = np.searchsorted(buckets[order],
+                                         np.arange(self.num_buckets + 1))
+                batch = batch.take(pa.array(order))
+                for i in np.flatnonzero(np.diff(bounds)):
+                    if i not in writers:
+                        writers[i] = pq.ParquetWriter(paths[i], schema)
+                    writers[i].write_batch(
+                        batch.slice(bounds[i], bounds[i + 1] - bounds[i]))
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return [paths[i] for i in sorted(writers)]
@@ -1,10 +1,20 @@
-from asthma.codebook import *
-from fuzzywuzzy import fuzz, process
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from asthma.assembly import MemberLevelAssembler
+from asthma.segments import MemberSegments
+from asthma.compiled_codebook import get_compiled_codebook
+
+
+__all__ = ['IdentifyControllersRelievers', 'CalculateAMRScore',
+           'CalculateControllerCoverage', 'GetLastThreeControllers']
 
 
 class IdentifyControllersRelievers:
 
-    def __init__(self):
+    def __init__(self, score_cutoff=100):
+        self.score_cutoff = score_cutoff
+        self.match_report = None
         self._processed_generic_product_name = False
         self._processed_claim_status = False
 
@@ -22,15 +32,49 @@ class IdentifyControllersRelievers:
         if not self._processed_generic_product_name:
             self._process_generic_product_name(df)
 
-        matching_controllers = (df
-            .generic_product_name.drop_duplicates()
-            .loc[lambda x: x != ''].to_frame().apply(
-                lambda x: process.extractOne(x['generic_product_name'],
-                                             CONTROLLERS,
-                                             scorer=fuzz.token_sort_ratio,
-                                             score_cutoff=100), axis=1)
-            .dropna().map(lambda x: x[0]).drop_duplicates().values)
-        self.controllers = matching_controllers
+        # a token_sort_ratio of 100 means equal normalized tokens for names
+        # as short as the controllers, so exact matches are a dictionary
+        # lookup
+        compiled = get_compiled_codebook()
+        names = (df.generic_product_name.drop_duplicates()
+                 .loc[lambda x: x != ''].reset_index(drop=True))
+        report = pd.DataFrame({
+            'generic_product_name': names,
+            'controller': (names.map(compiled.normalize_controller_name)
+                           .map(compiled.controller_tokens))})
+        report['score'] = np.where(report.controller.notnull(), 100, np.nan)
+        report['match_type'] = np.where(report.controller.notnull(), 'exact',
+                                        None)
+        report['num_candidates'] = 0
+
+        if self.score_cutoff < 100:
+            idx = report.loc[lambda x: x.controller.isnull()].index
+            near_matches = [self._get_near_match(name)
+                            for name in report.generic_product_name[idx]]
+            if near_matches:
+                report.loc[idx, ['controller', 'score', 'num_candidates']] = (
+                    near_matches)
+                report.loc[idx, 'match_type'] = np.where(
+                    report.controller[idx].notnull(), 'near', None)
+
+        self.match_report = report
+        self.controllers = report.controller.dropna().drop_duplicates().values
+        self._matched_product_names = (report.dropna(subset=['controller'])
+                                       .generic_product_name.values)
+
+    def _get_near_match(self, name):
+        # fuzzywuzzy is only loaded once a name has to be near matched
+        from fuzzywuzzy import fuzz, process
+
+        # only the controllers sharing an ingredient or strength token with
+        # the name are scored
+        candidates = get_compiled_codebook().get_controller_candidates(name)
+        match = process.extractOne(name, candidates,
+                                   scorer=fuzz.token_sort_ratio,
+                                   score_cutoff=self.score_cutoff)
+        if match is None:
+            return None, np.nan, len(candidates)
+        return match[0], match[1], len(candidates)
 
     def get_matching_controllers(self, df):
         if not hasattr(self, 'controllers'):
@@ -44,10 +88,15 @@ class IdentifyControllersRelievers:
         if not self._processed_claim_status:
             self._process_claim_status(df)
 
+        # with exact matching only names spelled as in the codebook are
+        # flagged; near matching flags product names by their own match, so
+        # that label variants of a controller are flagged too
+        names = (self.controllers if self.score_cutoff >= 100
+                 else self._matched_product_names)
         df['controller'] = 0
         idx = df.loc[
             lambda x: ((x.claim_status == 'PAID') &
-                       (x.generic_product_name.isin(self.controllers)))].index
+                       (x.generic_product_name.isin(names)))].index
         df.loc[idx, 'controller'] = 1
 
     def identify_relievers(self, df):
@@ -81,30 +130,40 @@ class CalculateAMRScore:
                 """
                 raise KeyError(msg)
 
-    def get_amr_score_old(self, df):
+    @staticmethod
+    def _get_segments(df):
+        # fills sorted once by member and fill date, shared by the scores
+        return MemberSegments(df.member_medicaid_id, df.claim_start_date)
+
+    def get_amr_score_old(self, df, segments=None):
         self._check_data_for_amr(df)
-        temp = df.groupby(['member_medicaid_id', 'claim_start_date']).agg(
-            controller_=('controller', 'sum'), reliever_=('reliever', 'sum'))
-        temp['controller_'] = (temp.controller_ > 0).astype(int)
-        temp['reliever_'] = (temp.reliever_ > 0).astype(int)
-        temp.reset_index(inplace=True)
-        df_final = temp.groupby('member_medicaid_id').agg(
-            num_controller_old=('controller_', 'sum'),
-            num_reliever_old=('reliever_', 'sum'))
-        df_final.reset_index(inplace=True)
+        if segments is None:
+            segments = self._get_segments(df)
+        # number of fill dates with a controller and with a reliever
+        df_final = pd.DataFrame({
+            'num_controller_old': segments.count_distinct_dates(
+                segments.take(df.controller) > 0),
+            'num_reliever_old': segments.count_distinct_dates(
+                segments.take(df.reliever) > 0)},
+            index=segments.members).reset_index()
         df_final['AMR_old'] = df_final.num_controller_old.div(
             df_final.num_controller_old.add(df_final.num_reliever_old))
         return (df_final.dropna(subset='AMR_old').assign(
             member_medicaid_id=lambda x: x.member_medicaid_id.astype(int),
             AMR_old=lambda x: x.AMR_old.round(1)))
 
-    def get_amr_score_count(self, df):
+    def get_amr_score_count(self, df, segments=None):
         self._check_data_for_amr(df)
-        temp = df.loc[lambda x: x.controller == 1].groupby(
-            'member_medicaid_id').agg(
-            num_controller_count=('controller', 'sum'),
-            num_reliever_new=('reliever', 'sum'))
-        temp.reset_index(inplace=True)
+        if segments is None:
+            segments = self._get_segments(df)
+        controller = segments.take(df.controller)
+        is_controller = controller == 1
+        temp = pd.DataFrame({
+            'num_controller_count': segments.sum(controller, is_controller),
+            'num_reliever_new': segments.sum(segments.take(df.reliever),
+                                             is_controller)},
+            index=segments.members)
+        temp = temp.loc[segments.any(is_controller)].reset_index()
         temp['AMR_count'] = temp.num_controller_count.div(
             temp.num_controller_count.add(temp.num_reliever_new))
         return (temp.dropna(
@@ -112,12 +171,18 @@ class CalculateAMRScore:
             member_medicaid_id=lambda x: x.member_medicaid_id.astype(int),
             AMR_count=lambda x: x.AMR_count.round(1)))
 
-    def get_amr_score_days_supply(self, df):
+    def get_amr_score_days_supply(self, df, segments=None):
         self._check_data_for_amr(df)
-        temp = df.loc[lambda x: x.controller == 1].groupby(
-            'member_medicaid_id').agg(total_days_supply=('days_supply', 'sum'),
-                                      num_reliever=('reliever', 'sum'))
-        temp.reset_index(inplace=True)
+        if segments is None:
+            segments = self._get_segments(df)
+        is_controller = segments.take(df.controller) == 1
+        temp = pd.DataFrame({
+            'total_days_supply': segments.sum(segments.take(df.days_supply),
+                                              is_controller),
+            'num_reliever': segments.sum(segments.take(df.reliever),
+                                         is_controller)},
+            index=segments.members)
+        temp = temp.loc[segments.any(is_controller)].reset_index()
         temp['num_controller_days_supply'] = temp.total_days_supply.div(30)
         temp['AMR_days_supply'] = temp.num_controller_days_supply.div(
             temp.num_controller_days_supply.add(temp.num_reliever))
@@ -130,78 +195,156 @@ class CalculateAMRScore:
             AMR_days_supply=lambda x: x.AMR_days_supply.round(1)))
 
     def get_amr_scores(self, df):
-        df_amr_old = self.get_amr_score_old(df)
-        df_amr_count = self.get_amr_score_count(df)
-        df_amr_supply = self.get_amr_score_days_supply(df)
-        return df_amr_old.merge(df_amr_count, how='outer').merge(
-            df_amr_supply, how='outer')
+        self._check_data_for_amr(df)
+        segments = self._get_segments(df)
+        df_amr_old = self.get_amr_score_old(df, segments)
+        df_amr_count = self.get_amr_score_count(df, segments)
+        df_amr_supply = self.get_amr_score_days_supply(df, segments)
+        return (MemberLevelAssembler()
+                .add(df_amr_old).add(df_amr_count).add(df_amr_supply)
+                .assemble())
+
+
+class CalculateControllerCoverage:
+
+    def __init__(self, windows=(12, 6, 3), period=None):
+        self.windows = list(windows)
+        self.period = period
+
+    @staticmethod
+    def _to_days(dates):
+        return dates.values.astype('datetime64[D]').astype(np.int64)
+
+    def _get_controller_fills(self, df):
+        CalculateAMRScore._check_data_for_amr(df)
+        fills = df.loc[lambda x: x.controller == 1,
+                       ['member_medicaid_id', 'claim_start_date',
+                        'days_supply']]
+        member_idx, members = pd.factorize(fills.member_medicaid_id,
+                                           sort=True)
+        start = self._to_days(fills.claim_start_date)
+        days_supply = fills.days_supply.values.astype(np.int64)
+        # fills without supply cover nothing and would break the gaps
+        order = np.lexsort((start, member_idx))
+        order = order[days_supply[order] > 0]
+        return member_idx[order], members, start[order], days_supply[order]
+
+    @staticmethod
+    def _shift_overlapping_fills(member_idx, start, days_supply):
+        # a fill starting before the previous supply runs out is shifted to
+        # the day after it; with D the running supply per member, the last
+        # covered day is E_i = D_i + max_{k<=i}(start_k - 1 - D_{k-1}), so
+        # the shifting is a cumsum and a per-member cummax
+        n = member_idx.shape[0]
+        if n == 0:
+            return start, start, np.ones(0, dtype=bool)
+
+        is_first = np.ones(n, dtype=bool)
+        is_first[1:] = member_idx[1:] != member_idx[:-1]
+        total = np.cumsum(days_supply)
+        member_start = np.maximum.accumulate(
+            np.where(is_first, np.arange(n), 0))
+        supply = total - (total - days_supply)[member_start]
+
+        # members are sorted, so an offset per member keeps the cummax from
+        # crossing member boundaries
+        offset = member_idx * (start.max() - start.min() + supply.max() + 2)
+        lag = start - 1 - (supply - days_supply) + offset
+        end = supply + np.maximum.accumulate(lag) - offset
+        return end - days_supply + 1, end, is_first
+
+    def _get_window_coverage(self, member_idx, num_members, start, end,
+                             is_first, period, months_back):
+        low = self._to_days(pd.Series(
+            [period - relativedelta(months=months_back)]))[0]
+        high = self._to_days(pd.Series([period]))[0]
+        window_days = high - low + 1
+
+        covered = np.bincount(
+            member_idx, minlength=num_members,
+            weights=(np.minimum(end, high) - np.maximum(start, low) + 1)
+            .clip(0)).astype(np.int64)
+
+        # gaps between consecutive fills, plus the one after the last fill
+        prev_end = np.roll(end, 1)
+        prev_end[is_first] = low - 1
+        gaps = (start.clip(low, high + 1) - prev_end.clip(low - 1, high) - 1
+                ).clip(0)
+        max_gap = np.zeros(num_members, dtype=np.int64)
+        np.maximum.at(max_gap, member_idx, gaps)
+        is_last = np.roll(is_first, -1)
+        # members without any fill up to the period have no coverage at all
+        trailing_gap = np.full(num_members, window_days, dtype=np.int64)
+        trailing_gap[member_idx[is_last]] = (
+            high - end[is_last].clip(low - 1, high))
+
+        return {f'controller_covered_days_{months_back}': covered,
+                f'controller_PDC_{months_back}': (covered / window_days
+                                                  ).round(2),
+                f'controller_gap_days_{months_back}': window_days - covered,
+                f'controller_max_gap_{months_back}': np.maximum(
+                    max_gap, trailing_gap)}
+
+    def get_coverage(self, df):
+        # windows end at the last fill date unless a period is given, and
+        # PDC is the share of the whole window covered by controller supply
+        period = (df.claim_start_date.max() if self.period is None
+                  else pd.Timestamp(self.period).normalize())
+        member_idx, members, start, days_supply = (
+            self._get_controller_fills(df))
+        if self.period is not None:
+            idx = start <= self._to_days(pd.Series([period]))[0]
+            member_idx, start, days_supply = (member_idx[idx], start[idx],
+                                              days_supply[idx])
+        start, end, is_first = self._shift_overlapping_fills(
+            member_idx, start, days_supply)
+
+        df_ = pd.DataFrame({'member_medicaid_id': members})
+        for months_back in self.windows:
+            coverage = self._get_window_coverage(
+                member_idx, members.shape[0], start, end, is_first, period,
+                months_back)
+            for col, values in coverage.items():
+                df_[col] = values
+        return df_
 
 
 class GetLastThreeControllers:
 
     def __init__(self, df):
-        self._data = (df[
+        data = (df[
             ['member_medicaid_id', 'claim_start_date', 'drug_strength',
              'drug_product_name', 'claim_status', 'refill_code', 'days_supply',
              'generic_product_name', 'pharmacy_name', 'pharmacy_phone_number',
              'controller']]
-                      .loc[lambda x: x.controller == 1]
-                      .drop('controller', axis=1)
-                      .reset_index(drop=True))
-
-    @staticmethod
-    def _extract_last_controller(group):
-        temp = group.sort_values('claim_start_date', ascending=False)
-        if temp.shape[0] >= 1:
-            return temp.head(1)
-        else:
-            return None
+                .loc[lambda x: x.controller == 1]
+                .drop('controller', axis=1)
+                .reset_index(drop=True))
+        # latest fills first, fills of the same date in their order
+        self._segments = MemberSegments(data.member_medicaid_id,
+                                        data.claim_start_date,
+                                        descending=True)
+        self._data = self._segments.sort(data)
 
-    def _get_last_controller(self):
-        temp = self._data.groupby('member_medicaid_id').apply(
-            self._extract_last_controller)
-        temp.reset_index(drop=True, inplace=True)
-        col_names = [f'{col}_rec1'
+    def _get_nth_last_controller(self, n):
+        idx = self._segments.nth_index(n)
+        temp = self._data.iloc[idx[idx >= 0]].reset_index(drop=True)
+        col_names = [f'{col}_rec{n}'
                      for col in temp.drop('member_medicaid_id', axis=1).columns]
         temp.columns = ['member_medicaid_id'] + col_names
         return temp
 
-    @staticmethod
-    def _extract_last_second_controller(group):
-        temp = group.sort_values('claim_start_date', ascending=False)
-        if temp.shape[0] >= 2:
-            return temp.head(2).tail(1)
-        else:
-            return None
+    def _get_last_controller(self):
+        return self._get_nth_last_controller(1)
 
     def _get_last_second_controller(self):
-        temp = self._data.groupby('member_medicaid_id').apply(
-            self._extract_last_second_controller)
-        temp.reset_index(drop=True, inplace=True)
-        col_names = [f'{col}_rec2'
-                     for col in temp.drop('member_medicaid_id', axis=1).columns]
-        temp.columns = ['member_medicaid_id'] + col_names
-        return temp
-
-    @staticmethod
-    def _extract_last_third_controller(group):
-        temp = group.sort_values('claim_start_date', ascending=False)
-        if temp.shape[0] >= 3:
-            return temp.head(3).tail(1)
-        else:
-            return None
+        return self._get_nth_last_controller(2)
 
     def _get_last_third_controller(self):
-        temp = self._data.groupby('member_medicaid_id').apply(
-            self._extract_last_third_controller)
-        temp.reset_index(drop=True, inplace=True)
-        col_names = [f'{col}_rec3'
-                     for col in temp.drop('member_medicaid_id', axis=1).columns]
-        temp.columns = ['member_medicaid_id'] + col_names
-        return temp
+        return self._get_nth_last_controller(3)
 
     def get_controllers(self):
         df1 = self._get_last_controller()
         df2 = self._get_last_second_controller()
         df3 = self._get_last_third_controller()
-        return df1.merge(df2, how='outer').merge(df3, how='outer')
+        return MemberLevelAssembler().add(df1).add(df2).add(df3).assemble()
@@ -0,0 +1,215 @@
+import os
+import tempfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from asthma.data_validation import ViewDataValidation
+from asthma.assembly import MemberLevelAssembler
+from asthma.data_processing import (ClaimViewDataProcessing,
+                                    ClaimViewChunkedDataProcessing,
+                                    PharmacyViewDataProcessing,
+                                    PharmacyViewChunkedDataProcessing)
+
+
+__all__ = ['ExecutionPlanner']
+
+
+def _get_resident_size():
+    # /proc is only there on Linux; elsewhere the whole budget is available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+class ExecutionPlanner:
+
+    # bytes of a loaded value in pandas: numbers are 8 bytes and strings a
+    # pointer plus their (mostly shared) string objects
+    _numeric_value_bytes = 8
+    _string_value_bytes = 16
+    # peak memory of a stage relative to the loaded data, and the size of
+    # the member-level output, measured on the synthetic benchmark views
+    _stage_factors = {'claim': {'load': 1.7, 'process': 4.2},
+                      'pharmacy': {'load': 2.5, 'process': 5.5}}
+    _output_bytes_per_member = {'claim': 600, 'pharmacy': 1_500}
+    # member buckets are hash partitions, so some are larger than average
+    _bucket_skew = 1.25
+    # a record batch is held about three times while it is partitioned
+    _partition_factor = 3
+
+    def __init__(self, filepath_claim, filepath_pharmacy, memory_budget_mb,
+                 max_buckets=256, batch_size=500_000):
+        for filepath in [filepath_claim, filepath_pharmacy]:
+            if not os.path.exists(filepath):
+                raise FileNotFoundError('No such file found in the given '
+                                        'path.')
+        self._filepaths = {'claim': filepath_claim,
+                           'pharmacy': filepath_pharmacy}
+        self.memory_budget = int(memory_budget_mb * 2 ** 20)
+        self.max_buckets = max_buckets
+        self.batch_size = batch_size
+        self.footprint = None
+        self.plan = None
+
+    @staticmethod
+    def _count_members(parquet_file):
+        # the only column read; everything else comes from the footer
+        schema = parquet_file.schema_arrow
+        column = [name for name in schema.names
+                  if ViewDataValidation.normalize_column_name(name) ==
+                  'member_medicaid_id'][0]
+        ids = parquet_file.read(columns=[column]).column(0)
+        if pa.types.is_string(ids.type) or pa.types.is_large_string(ids.type):
+            ids = pc.utf8_trim_whitespace(ids)
+        return pc.count_distinct(ids).as_py()
+
+    def _estimate_pipeline(self, pipeline):
+        parquet_file = pq.ParquetFile(self._filepaths[pipeline])
+        metadata = parquet_file.metadata
+        loaded = 0
+        for i in range(metadata.num_columns):
+            if metadata.schema.column(i).physical_type == 'BYTE_ARRAY':
+                loaded += (metadata.num_rows * self._string_value_bytes +
+                           sum(metadata.row_group(j).column(i)
+                               .total_uncompressed_size
+                               for j in range(metadata.num_row_groups)))
+            else:
+                loaded += metadata.num_rows * self._numeric_value_bytes
+
+        num_members = self._count_members(parquet_file)
+        factors = self._stage_factors[pipeline]
+        return {'pipeline': pipeline,
+                'num_rows': metadata.num_rows,
+                'num_members': num_members,
+                'row_bytes': loaded / max(metadata.num_rows, 1),
+                'loaded_bytes': loaded,
+                'load_peak_bytes': loaded * factors['load'],
+                'process_peak_bytes': loaded * factors['process'],
+                'output_bytes': (num_members *
+                                 self._output_bytes_per_member[pipeline])}
+
+    def estimate_footprint(self):
+        self.footprint = pd.DataFrame(
+            [self._estimate_pipeline(pipeline) for pipeline in self._filepaths])
+        return self.footprint
+
+    def _get_bucket_peak(self, estimate, num_buckets, batch_size):
+        partition_peak = (batch_size * estimate['row_bytes'] *
+                          self._partition_factor)
+        return max(partition_peak, estimate['process_peak_bytes'] *
+                   self._bucket_skew / num_buckets)
+
+    def _plan_pipeline(self, estimate, available):
+        output = estimate['output_bytes']
+        if estimate['process_peak_bytes'] + output <= available:
+            return {'strategy': 'in_memory', 'num_buckets': 1,
+                    'batch_size': None,
+                    'peak_bytes': estimate['process_peak_bytes'] + output}
+
+        # batches are kept within a quarter of what is available
+        batch_size = int(min(self.batch_size, max(
+            1_000, available / 4 /
+            (estimate['row_bytes'] * self._partition_factor))))
+        num_buckets = 2
+        while num_buckets <= self.max_buckets:
+            peak = self._get_bucket_peak(estimate, num_buckets, batch_size)
+            # the outputs of every bucket are concatenated at the end
+            if peak + 2 * output <= available:
+                return {'strategy': 'chunked', 'num_buckets': num_buckets,
+                        'batch_size': batch_size,
+                        'peak_bytes': peak + 2 * output}
+            num_buckets *= 2
+
+        # bucket outputs go to disk and are read back for the final join
+        num_buckets = 2
+        while num_buckets <= self.max_buckets:
+            peak = self._get_bucket_peak(estimate, num_buckets, batch_size)
+            if peak <= available:
+                return {'strategy': 'spill', 'num_buckets': num_buckets,
+                        'batch_size': batch_size, 'peak_bytes': peak}
+            num_buckets *= 2
+        raise MemoryError(
+            'The {} pipeline does not fit in {:,.0f} MB even with {:,} '
+            'member buckets.'.format(estimate['pipeline'], available / 2 ** 20,
+                                     self.max_buckets))
+
+    def get_plan(self):
+        if self.footprint is None:
+            self.estimate_footprint()
+
+        available = self.memory_budget - _get_resident_size()
+        if available <= 0:
+            raise MemoryError('The process already uses more than the '
+                              'memory budget.')
+        held, rows = 0, []
+        for estimate in self.footprint.to_dict('records'):
+            step = self._plan_pipeline(estimate, available - held)
+            rows.append({'pipeline': estimate['pipeline'],
+                         'strategy': step['strategy'],
+                         'num_buckets': step['num_buckets'],
+                         'batch_size': step['batch_size'],
+                         'estimated_peak_mb': round(
+                             (held + step['peak_bytes']) / 2 ** 20, 1)})
+            # the output stays in memory while the next pipeline runs,
+            # unless it was spilled
+            if step['strategy'] != 'spill':
+                held += estimate['output_bytes']
+
+        # the outputs and their join are in memory together at the end
+        final_peak = 2 * self.footprint.output_bytes.sum()
+        if final_peak > available:
+            raise MemoryError(
+                'The member-level output needs about {:,.0f} MB, more than '
+                'the {:,.0f} MB available.'.format(final_peak / 2 ** 20,
+                                                   available / 2 ** 20))
+        self.plan = pd.DataFrame(rows).astype({'batch_size': 'Int64'})
+        return self.plan
+
+    def _run_pipeline(self, step, validate_schema, spill_dir):
+        filepath = self._filepaths[step['pipeline']]
+        if step['strategy'] == 'in_memory':
+            if step['pipeline'] == 'claim':
+                return ClaimViewDataProcessing(
+                    filepath, validate_schema).get_member_level_data()
+            return PharmacyViewDataProcessing(
+                filepath, validate_schema).get_member_level_data()
+
+        chunked = (ClaimViewChunkedDataProcessing
+                   if step['pipeline'] == 'claim'
+                   else PharmacyViewChunkedDataProcessing)(
+            filepath, num_buckets=step['num_buckets'],
+            batch_size=int(step['batch_size']),
+            validate_schema=validate_schema,
+            tmp_dir=spill_dir)
+        if step['strategy'] == 'chunked':
+            return chunked.get_member_level_data()
+        return chunked.write_member_level_data(
+            os.path.join(spill_dir, step['pipeline']))
+
+    @staticmethod
+    def _read_spilled(paths):
+        df = pd.concat([pd.read_parquet(path) for path in paths],
+                       ignore_index=True)
+        return df.sort_values('member_medicaid_id', ignore_index=True)
+
+    def get_data(self, validate_schema=True, tmp_dir=None):
+        if self.plan is None:
+            self.get_plan()
+        for step in self.plan.to_dict('records'):
+            buckets = ('' if step['strategy'] == 'in_memory' else
+                       '{:,} buckets, '.format(step['num_buckets']))
+            print('Planned the {} pipeline {} ({}about {:,} MB).'.format(
+                step['pipeline'], step['strategy'].replace('_', ' '), buckets,
+                step['estimated_peak_mb']))
+
+        with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+            results = [self._run_pipeline(step, validate_schema, spill_dir)
+                       for step in self.plan.to_dict('records')]
+            results = [self._read_spilled(result)
+                       if isinstance(result, list) else result
+                       for result in results]
+        claims, pharma = results
+        return MemberLevelAssembler().add(claims).add(pharma).assemble()
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+
+__all__ = ['MemberSegments']
+
+
+class MemberSegments:
+
+    def __init__(self, members, dates=None, descending=False):
+        # rows are sorted once by member and date; the sort is stable, so
+        # rows of the same date keep their order, and rows without a member
+        # are left out as in a groupby
+        member_idx, members = pd.factorize(pd.Series(members), sort=True)
+        self.members = pd.Index(members, name='member_medicaid_id')
+        keys = [member_idx]
+        if dates is not None:
+            dates = np.asarray(dates, dtype='datetime64[ns]')
+            keys.insert(0, -dates.view(np.int64) if descending
+                        else dates.view(np.int64))
+        order = np.lexsort(keys)
+        self.order = order[member_idx[order] >= 0]
+
+        self.member_idx = member_idx[self.order].astype(np.int64)
+        self.dates = None if dates is None else dates[self.order]
+        self.num_rows = self.order.shape[0]
+        is_start = np.ones(self.num_rows, dtype=bool)
+        is_start[1:] = self.member_idx[1:] != self.member_idx[:-1]
+        self.starts = np.flatnonzero(is_start)
+        self.ends = (np.append(self.starts[1:], self.num_rows)
+                     if self.num_rows else self.starts)
+
+    def sort(self, df):
+        return df.iloc[self.order].reset_index(drop=True)
+
+    def take(self, values):
+        return np.asarray(values)[self.order]
+
+    def _get_mask(self, mask):
+        if mask is None:
+            return np.ones(self.num_rows, dtype=bool)
+        return np.asarray(mask, dtype=bool)
+
+    def _reduce(self, ufunc, values, dtype):
+        if self.num_rows == 0:
+            return np.zeros(0, dtype=dtype)
+        return ufunc.reduceat(values, self.starts)
+
+    def in_window(self, start, end):
+        start = np.datetime64(pd.Timestamp(start), 'ns')
+        end = np.datetime64(pd.Timestamp(end), 'ns')
+        return (self.dates >= start) & (self.dates <= end)
+
+    def sum(self, values, mask=None):
+        values = np.asarray(values)
+        mask = self._get_mask(mask)
+        if values.dtype.kind == 'f':
+            # missing values are skipped, as in pandas
+            mask = mask & ~np.isnan(values)
+        elif values.dtype.kind in 'biu':
+            values = values.astype(np.int64)
+        return self._reduce(np.add, np.where(mask, values, 0), values.dtype)
+
+    def count(self, mask=None):
+        return self.sum(self._get_mask(mask).astype(np.int64))
+
+    def any(self, mask):
+        return self._reduce(np.logical_or, self._get_mask(mask), bool)
+
+    def bitwise_or(self, values):
+        values = np.asarray(values)
+        return self._reduce(np.bitwise_or, values, values.dtype)
+
+    def max(self, values, mask=None):
+        # NaT or NaN for members without any row in the mask
+        values = np.asarray(values)
+        mask = self._get_mask(mask)
+        if values.dtype.kind == 'M':
+            ints = np.where(mask, values.view(np.int64), np.iinfo(np.int64).min)
+            return self._reduce(np.maximum, ints, np.int64).view(values.dtype)
+        floats = np.where(mask, values.astype(float), -np.inf)
+        result = self._reduce(np.maximum, floats, float)
+        return np.where(np.isneginf(result), np.nan, result)
+
+    def count_distinct(self, keys, mask=None):
+        # keys are sorted within every member, e.g. the dates or ids that
+        # increase with them
+        idx = np.flatnonzero(self._get_mask(mask))
+        keys = np.asarray(keys)[idx]
+        member_idx = self.member_idx[idx]
+        is_new = np.ones(idx.shape[0], dtype=bool)
+        is_new[1:] = ((member_idx[1:] != member_idx[:-1]) |
+                      (keys[1:] != keys[:-1]))
+        return np.bincount(member_idx[is_new],
+                           minlength=self.members.shape[0]).astype(np.int64)
+
+    def count_distinct_dates(self, mask=None):
+        return self.count_distinct(self.dates.view(np.int64), mask)
+
+    def date_any(self, mask):
+        # whether any row of the same member and date is in the mask, for
+        # every row
+        mask = self._get_mask(mask)
+        if self.num_rows == 0:
+            return mask
+        is_start = np.ones(self.num_rows, dtype=bool)
+        is_start[1:] = ((self.member_idx[1:] != self.member_idx[:-1]) |
+                        (self.dates[1:] != self.dates[:-1]))
+        starts = np.flatnonzero(is_start)
+        return np.logical_or.reduceat(mask, starts)[np.cumsum(is_start) - 1]
+
+    def nth_index(self, n, mask=None, from_end=False):
+        # row of the n-th (1-based) row in the mask of every member, -1 if
+        # the member has fewer rows than that
+        mask = self._get_mask(mask)
+        cs = np.cumsum(mask)
+        before = np.where(self.starts > 0, cs[self.starts - 1], 0)
+        total = cs[self.ends - 1] - before
+        rank = before + (total - n + 1 if from_end else n)
+        idx = np.searchsorted(cs, rank, side='left')
+        return np.where(total >= n, idx, -1)
+
+    def first_index(self, mask=None):
+        return self.nth_index(1, mask)
+
+    def last_index(self, mask=None):
+        return self.nth_index(1, mask, from_end=True)
+
+    @staticmethod
+    def take_index(values, idx):
+        # missing values (NaN or NaT) where the index is -1
+        return pd.api.extensions.take(np.asarray(values), idx,
+                                      allow_fill=True)
@@ -1,7 +1,7 @@
 import os
-import pandas as pd
-import pyarrow.parquet as pq
-from pandas.testing import assert_frame_equal
+
+
+__all__ = ['ValidateSchema']
 
 
 class ValidateSchema:
@@ -12,7 +12,12 @@ class ValidateSchema:
         else:
             raise FileNotFoundError('No such file found in the given path.')
 
-    def _read_data_schema(self):
+    def read_data_schema(self):
+        # pandas and pyarrow are loaded on first use, so that importing the
+        # validator stays cheap for jobs that don't get this far
+        import pandas as pd
+        import pyarrow.parquet as pq
+
         ext = os.path.splitext(self._filepath)[-1]
         if ext == '.parquet':
             schema = pq.read_schema(self._filepath, memory_map=True)
@@ -26,6 +31,8 @@ class ValidateSchema:
 
     @staticmethod
     def _read_claim_default_schema():
+        import pandas as pd
+
         path = ('/home/{}/T-Drive/PCHPAsthma/Data/'
                 'MSSQL_Data/schema_claims_view_20220406.json'
                 .format(os.environ['USER']))
@@ -33,18 +40,28 @@ class ValidateSchema:
 
     @staticmethod
     def _read_pharmacy_default_schema():
+        import pandas as pd
+
         path = ('/home/{}/T-Drive/PCHPAsthma/Data/'
                 'MSSQL_Data/schema_pharmacy_view_20220406.json'
                 .format(os.environ['USER']))
         return pd.read_json(path)
 
-    def validate_schemas(self):
+    def read_default_schema(self):
         if 'claim' in self._filepath.lower():
-            default = self._read_claim_default_schema()
+            return self._read_claim_default_schema()
         elif 'pharma' in self._filepath.lower():
-            default = self._read_pharmacy_default_schema()
+            return self._read_pharmacy_default_schema()
         else:
-            default = None
+            return None
+
+    @staticmethod
+    def compare_schemas(default, data):
+        from pandas.testing import assert_frame_equal
 
-        data = self._read_data_schema()
         assert_frame_equal(default, data)
+
+    def validate_schemas(self):
+        default = self.read_default_schema()
+        data = self.read_data_schema()
+        self.compare_schemas(default, data)
@@ -0,0 +1,95 @@
+import os
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from asthma.data_validation import ViewDataValidation
+
+
+__all__ = ['ValidateStatistics']
+
+
+class ValidateStatistics:
+
+    # (column, lowest allowed value, highest allowed value, nulls allowed)
+    # of every view; nulls allowed only as long as the column isn't entirely
+    # null
+    _checks = {'claim': [('revenue_code', 100, 9_999, True)],
+               'pharmacy': [('days_supply', None, None, False),
+                            ('claim_start_date', None, None, False),
+                            ('member_age_on_date_of_service', 0, 17, True)]}
+
+    def __init__(self, filepath, view):
+        if os.path.exists(filepath):
+            self._filepath = filepath
+        else:
+            raise FileNotFoundError('No such file found in the given path.')
+        # the view is given rather than guessed from the file name, which
+        # may name neither or be misleading
+        if view not in self._checks:
+            raise ValueError(f'Unknown view "{view}", expected one of '
+                             f'{list(self._checks)}.')
+        self._view = view
+        self.report = None
+
+    @staticmethod
+    def _get_column_index(metadata, column):
+        for i in range(metadata.num_columns):
+            name = metadata.schema.column(i).path
+            if ViewDataValidation.normalize_column_name(name) == column:
+                return i
+        raise KeyError(f'"{column}" not found in the parquet file.')
+
+    @staticmethod
+    def _read_row_group_statistics(parquet_file, row_group, column_idx):
+        column = parquet_file.metadata.row_group(row_group).column(column_idx)
+        stats = column.statistics
+        num_rows = parquet_file.metadata.row_group(row_group).num_rows
+        if stats is not None and stats.has_null_count:
+            if stats.null_count == num_rows:
+                return {'min': None, 'max': None, 'null_count': num_rows}
+            if stats.has_min_max:
+                return {'min': stats.min, 'max': stats.max,
+                        'null_count': stats.null_count}
+
+        # statistics missing (or without min/max), so only this row group of
+        # the column is read
+        name = column.path_in_schema
+        arr = parquet_file.read_row_group(row_group, columns=[name]).column(0)
+        min_max = pc.min_max(arr)
+        return {'min': min_max['min'].as_py(), 'max': min_max['max'].as_py(),
+                'null_count': arr.null_count, 'read': True}
+
+    def _get_column_statistics(self, parquet_file, column):
+        column_idx = self._get_column_index(parquet_file.metadata, column)
+        stats = pd.DataFrame(
+            [self._read_row_group_statistics(parquet_file, i, column_idx)
+             for i in range(parquet_file.metadata.num_row_groups)],
+            columns=['min', 'max', 'null_count', 'read'])
+        return {'min': stats['min'].dropna().min(),
+                'max': stats['max'].dropna().max(),
+                'null_count': int(stats.null_count.sum()),
+                'num_rows': parquet_file.metadata.num_rows,
+                'row_groups_read': int(stats.read.fillna(False).sum())}
+
+    def validate(self):
+        print('Validating column statistics ...', end=' ')
+        parquet_file = pq.ParquetFile(self._filepath)
+        rows = []
+        for column, low, high, nullable in self._checks[self._view]:
+            stats = self._get_column_statistics(parquet_file, column)
+            rows.append({'column_name': column, **stats})
+            if nullable:
+                assert stats['null_count'] < stats['num_rows'], \
+                    f'"{column}" has only missing values.'
+            else:
+                assert stats['null_count'] == 0, \
+                    f'"{column}" has {stats["null_count"]:,} missing values.'
+            if low is not None:
+                assert stats['min'] >= low, \
+                    f'"{column}" has values below {low}.'
+            if high is not None:
+                assert stats['max'] <= high, \
+                    f'"{column}" has values above {high}.'
+        self.report = pd.DataFrame(rows)
+        print('Done!')
+        return self.report
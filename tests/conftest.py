@@ -0,0 +1,10 @@
+import pytest
+from asthma.benchmark import SyntheticViews
+
+
+@pytest.fixture(scope='session')
+def views(tmp_path_factory):
+    # small synthetic claim and pharmacy views, (claims path, pharmacy path)
+    directory = tmp_path_factory.mktemp('views')
+    return SyntheticViews(num_members=100, num_claims=3_000,
+                          num_prescriptions=1_500).write(str(directory))
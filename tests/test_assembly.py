@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from asthma.assembly import MemberLevelAssembler
+
+
+def get_blocks():
+    visits = pd.DataFrame({'member_medicaid_id': ['3', '1'], 'ED': [2, 1]})
+    amr = pd.DataFrame({'member_medicaid_id': ['2', '1'], 'amr': [0.5, 0.8]})
+    return visits, amr
+
+
+def test_assemble():
+    visits, amr = get_blocks()
+    df = MemberLevelAssembler().add(visits).add(amr).assemble()
+    expected = visits.merge(amr, how='outer').sort_values(
+        'member_medicaid_id', ignore_index=True)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_assemble_fill_values():
+    visits, amr = get_blocks()
+    df = (MemberLevelAssembler()
+          .add(visits, fill_values=0)
+          .add(amr, fill_values={'amr': -1.0})
+          .assemble())
+    assert df.ED.tolist() == [1, 0, 2]
+    assert df.amr.tolist() == [0.8, 0.5, -1.0]
+
+
+def test_assemble_given_members():
+    visits, amr = get_blocks()
+    df = (MemberLevelAssembler(members=['4', '1'])
+          .add(visits).add(amr).assemble())
+    assert df.member_medicaid_id.tolist() == ['1', '4']
+    assert df.ED.tolist()[0] == 1
+    assert np.isnan(df.amr.tolist()[1])
+
+
+def test_duplicated_columns():
+    visits, _ = get_blocks()
+    with pytest.raises(ValueError):
+        MemberLevelAssembler().add(visits).add(visits)
@@ -0,0 +1,59 @@
+import os
+import pandas as pd
+import pytest
+from asthma.batch import BatchRunner, main
+
+
+@pytest.fixture
+def manifest(views, tmp_path):
+    # one job per view pair, and one whose claim file doesn't exist
+    return pd.DataFrame({
+        'claim': [views[0], str(tmp_path / 'missing.parquet')],
+        'pharmacy': [views[1], views[1]],
+        'output': [str(tmp_path / 'out' / 'plan_a.parquet'),
+                   str(tmp_path / 'out' / 'plan_b.parquet')]})
+
+
+def test_read_manifest(manifest, tmp_path):
+    path = str(tmp_path / 'manifest.csv')
+    manifest.to_csv(path, index=False)
+    jobs = BatchRunner(path).jobs
+    assert [job['job_id'] for job in jobs] == ['plan_a', 'plan_b']
+    assert jobs[0]['claim'] == manifest.claim[0]
+
+    path = str(tmp_path / 'manifest.json')
+    manifest.assign(job_id=['a', 'b']).to_json(path, orient='records')
+    assert [job['job_id'] for job in BatchRunner(path).jobs] == ['a', 'b']
+
+
+def test_invalid_manifest(manifest, tmp_path):
+    with pytest.raises(KeyError):
+        BatchRunner(manifest.drop(columns='pharmacy'))
+    with pytest.raises(ValueError):
+        BatchRunner(manifest.assign(output=manifest.output[0]))
+    with pytest.raises(TypeError):
+        BatchRunner(str(tmp_path / 'manifest.txt'))
+
+
+def test_run(manifest):
+    results = BatchRunner(manifest, max_workers=2,
+                          validate_schema=False).run()
+    assert results.job_id.tolist() == ['plan_a', 'plan_b']
+    assert results.status.tolist() == ['done', 'failed']
+    assert results.num_members[0] == 100
+    assert results.error[1].startswith('FileNotFoundError')
+    assert pd.read_parquet(manifest.output[0]).shape[0] == 100
+    # the pipeline messages of every job go to its log
+    assert os.path.exists(manifest.output[1] + '.log')
+
+
+def test_main(manifest, tmp_path):
+    path = str(tmp_path / 'manifest.csv')
+    report = str(tmp_path / 'report.csv')
+    manifest.to_csv(path, index=False)
+    assert main([path, '--workers', '1', '--no-schema-validation',
+                 '--report', report]) == 1
+    assert pd.read_csv(report).status.tolist() == ['done', 'failed']
+
+    manifest.iloc[:1].to_csv(path, index=False)
+    assert main([path, '--no-schema-validation']) == 0
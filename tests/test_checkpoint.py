@@ -0,0 +1,94 @@
+import os
+import pandas as pd
+import pytest
+from asthma.checkpoint import StageCheckpoints
+from asthma.data_processing import (GetCombinedMemberLevelData,
+                                    ClaimViewDataProcessing)
+from asthma.claim.claim_member_level_cls import (IdentifyComorbidities,
+                                                 IdentifyPastVisits)
+
+
+@pytest.fixture(scope='module')
+def in_memory(views):
+    return GetCombinedMemberLevelData(*views, validate_schema=False).get_data()
+
+
+def count_calls(monkeypatch, cls, name):
+    calls = []
+    method = getattr(cls, name)
+
+    def counted(*args, **kwargs):
+        calls.append(name)
+        return method(*args, **kwargs)
+
+    if isinstance(vars(cls)[name], staticmethod):
+        counted = staticmethod(counted)
+    monkeypatch.setattr(cls, name, counted)
+    return calls
+
+
+def test_checkpoints(tmp_path):
+    stages = [('first', ['a']), ('second', [])]
+    checkpoints = StageCheckpoints(str(tmp_path), stages)
+    df = pd.DataFrame({'x': [1, 2]})
+    checkpoints.run('first', lambda: df)
+    assert not checkpoints.is_resumable('first')
+
+    resumed = StageCheckpoints(str(tmp_path), stages, resume=True)
+    assert resumed.is_resumable('first')
+    assert not resumed.is_resumable('first', 'second')
+    pd.testing.assert_frame_equal(resumed.run('first', lambda: None), df)
+
+    # a changed input invalidates the stage and every stage after it
+    changed = StageCheckpoints(str(tmp_path), [('first', ['b']),
+                                               ('second', [])], resume=True)
+    assert not changed.is_resumable('first')
+    assert changed.fingerprints['second'] != resumed.fingerprints['second']
+
+
+def test_resume_matches_in_memory(views, in_memory, tmp_path):
+    directory = str(tmp_path)
+    df = GetCombinedMemberLevelData(*views, validate_schema=False,
+                                    checkpoint_dir=directory).get_data()
+    pd.testing.assert_frame_equal(df, in_memory)
+    assert os.path.exists(os.path.join(directory, 'claim', 'manifest.json'))
+
+    df = GetCombinedMemberLevelData(*views, validate_schema=False,
+                                    checkpoint_dir=directory,
+                                    resume=True).get_data()
+    pd.testing.assert_frame_equal(df, in_memory)
+
+
+def test_resume_skips_completed_stages(views, tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    ClaimViewDataProcessing(views[0], validate_schema=False,
+                            checkpoint_dir=directory).get_member_level_data()
+
+    comorbidities = count_calls(monkeypatch, IdentifyComorbidities,
+                                'identify_comorbidities')
+    visits = count_calls(monkeypatch, IdentifyPastVisits, 'get_past_visits')
+    ClaimViewDataProcessing(views[0], validate_schema=False,
+                            checkpoint_dir=directory,
+                            resume=True).get_member_level_data()
+    assert comorbidities == [] and visits == []
+
+    # only the past visits depend on the period
+    ClaimViewDataProcessing(views[0], validate_schema=False,
+                            period=pd.Timestamp('2021-06-30'),
+                            checkpoint_dir=directory,
+                            resume=True).get_member_level_data()
+    assert comorbidities == [] and len(visits) == 1
+
+
+def test_changed_file_invalidates_checkpoints(views, tmp_path):
+    path = str(tmp_path / 'claims.parquet')
+    pd.read_parquet(views[0]).to_parquet(path, index=False)
+    directory = str(tmp_path / 'checkpoints')
+    ClaimViewDataProcessing(path, validate_schema=False,
+                            checkpoint_dir=directory).get_member_level_data()
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    processing = ClaimViewDataProcessing(path, validate_schema=False,
+                                         checkpoint_dir=directory, resume=True)
+    assert not processing._is_resumable('validated')
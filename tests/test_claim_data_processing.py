@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from asthma.claim.claim_data_processing_cls import IdentifyAsthmaRelatedClaims
+
+
+def get_claims():
+    return pd.DataFrame({
+        'claim_header_diagnosis_primary': ['J45.20', '493.90', 'J4521', None,
+                                           'J30.9', '493.90'],
+        'claim_header_diagnosis_primary_icd_vers': [np.nan, 9, 10, np.nan,
+                                                    10, np.nan],
+        'claim_line_diagnosis_1': ['', 'J45.909', None, ' j45 .909', None,
+                                   None],
+        'claim_line_diagnosis_1_icd_vers': [np.nan, 10, np.nan, 10, np.nan,
+                                            np.nan],
+    })
+
+
+def test_asthma_flags():
+    df = get_claims()
+    IdentifyAsthmaRelatedClaims(max_workers=1).extract_asthma_flags(df)
+    assert df.prm_as.tolist() == [1, 1, 1, 0, 0, 0]
+    assert df.prm_sec_as.tolist() == [1, 1, 1, 1, 0, 0]
+
+
+def test_asthma_flags_without_icd_version():
+    # an ICD-10 code is matched even when its ICD version is missing
+    df = get_claims().iloc[[0]].reset_index(drop=True)
+    IdentifyAsthmaRelatedClaims(max_workers=1).extract_asthma_flags(df)
+    assert df.prm_sec_as.tolist() == [1]
+
+
+def test_processed_diagnosis_codes():
+    df = get_claims()
+    IdentifyAsthmaRelatedClaims(max_workers=1).extract_asthma_flags(df)
+    codes = df.claim_line_diagnosis_1
+    assert codes.isnull().tolist() == [True, False, True, False, True, True]
+    assert codes.dropna().tolist() == ['J45.909', 'J45.909']
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from asthma.claim.claim_member_level_cls import IdentifyComorbidities
+
+
+def get_claims():
+    return pd.DataFrame({
+        'member_medicaid_id': ['2', '1', '2', '3'],
+        'claim_header_diagnosis_primary': ['J30.9', '477.5', 'K21.0',
+                                           '327.23'],
+        'claim_header_diagnosis_primary_icd_vers': [10, 9, 10, 10],
+        'claim_line_diagnosis_1': ['278.01', None, '', 'E66.9'],
+        'claim_line_diagnosis_1_icd_vers': [9, np.nan, np.nan, 10],
+    })
+
+
+def test_comorbidities():
+    df = IdentifyComorbidities().identify_comorbidities(get_claims())
+    assert df.member_medicaid_id.tolist() == ['1', '2', '3']
+    assert df.allergic_co.tolist() == [1, 1, 0]
+    assert df.obesity_co.tolist() == [0, 1, 1]
+    # the ICD-9 code only counts on ICD-9 claims
+    assert df.obs_sleep_co.tolist() == [0, 0, 0]
+    assert df.GERD_co.tolist() == [0, 1, 0]
+
+
+def test_single_condition():
+    df = IdentifyComorbidities().identify_gerd_diagnoses(get_claims())
+    assert df.columns.tolist() == ['member_medicaid_id', 'GERD_co']
+
+
+def test_comorbidities_without_claims():
+    df = IdentifyComorbidities().identify_comorbidities(get_claims().iloc[:0])
+    assert df.shape[0] == 0
+    assert df.columns.tolist() == ['member_medicaid_id', 'allergic_co',
+                                   'obesity_co', 'obs_sleep_co', 'GERD_co']
+
+
+def test_comorbidities_without_diagnosis_columns():
+    df = IdentifyComorbidities().identify_comorbidities(
+        get_claims()[['member_medicaid_id']])
+    assert df.member_medicaid_id.tolist() == ['1', '2', '3']
+    assert df.drop(columns='member_medicaid_id').values.sum() == 0
@@ -0,0 +1,43 @@
+import pytest
+from asthma import codebook
+from asthma.compiled_codebook import CompiledCodebook, get_compiled_codebook
+
+
+def test_version(monkeypatch):
+    version = CompiledCodebook().version
+    assert version == CompiledCodebook().version
+    monkeypatch.setattr(codebook, 'GERD_ICD_9_CODE', '530.80')
+    assert CompiledCodebook().version != version
+
+
+def test_visit_type_tables():
+    book = CompiledCodebook()
+    for name, spec in codebook.VISIT_TYPES.items():
+        bit = book.visit_type_bits[name]
+        assert all(book.rev_code_table[code] & bit
+                   for code in spec['rev_codes'])
+        assert all(book.pos_code_table[code] & bit
+                   for code in spec['pos_codes'])
+    assert book.rev_code_table.sum() == sum(
+        book.visit_type_bits[name] * len(set(spec['rev_codes']))
+        for name, spec in codebook.VISIT_TYPES.items())
+    with pytest.raises(ValueError):
+        book.pos_code_table[0] = 1
+
+
+def test_controller_lookups():
+    book = CompiledCodebook()
+    name = codebook.CONTROLLERS[0]
+    key = book.normalize_controller_name(name)
+    assert book.controller_tokens[key] == name
+    assert name in book.get_controller_candidates(name.lower())
+    assert book.get_controller_candidates('AMOXICILLIN') == []
+
+
+def test_shared_codebook():
+    assert get_compiled_codebook() is get_compiled_codebook()
+
+
+def test_compile():
+    book = CompiledCodebook().compile()
+    assert 'rev_code_table' in vars(book)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from asthma.pharmacy.pharmacy_data_processing_cls import (
+    CalculateControllerCoverage)
+
+
+def get_fills(seed=0, n=300):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'member_medicaid_id': rng.integers(0, 20, n).astype(str),
+        'claim_start_date': (pd.Timestamp('2021-01-01') +
+                             pd.to_timedelta(rng.integers(0, 400, n),
+                                             unit='D')),
+        'days_supply': rng.choice([0, 15, 30, 90], n),
+        'controller': rng.integers(0, 2, n),
+        'reliever': 0})
+
+
+def get_reference_coverage(df, period, months_back):
+    # day by day: overlapping fills are shifted to the day after the
+    # previous supply runs out
+    low = period - relativedelta(months=months_back)
+    window = pd.date_range(low, period)
+    rows = []
+    for member, fills in df.loc[df.controller == 1].groupby(
+            'member_medicaid_id'):
+        covered = set()
+        end = None
+        for start, days in fills.sort_values('claim_start_date')[
+                ['claim_start_date', 'days_supply']].values:
+            if days == 0 or start > period:
+                continue
+            start = pd.Timestamp(start)
+            if end is not None and start <= end:
+                start = end + pd.Timedelta(days=1)
+            end = start + pd.Timedelta(days=days - 1)
+            covered.update(pd.date_range(start, end))
+        is_covered = window.isin(list(covered))
+        runs = np.diff(np.flatnonzero(np.r_[True, is_covered, True])) - 1
+        rows.append({'member_medicaid_id': member,
+                     f'controller_covered_days_{months_back}':
+                         int(is_covered.sum()),
+                     f'controller_max_gap_{months_back}': int(runs.max())})
+    return pd.DataFrame(rows)
+
+
+def test_coverage():
+    df = pd.DataFrame({
+        'member_medicaid_id': ['1', '1', '1', '2'],
+        'claim_start_date': pd.to_datetime(['2021-01-01', '2021-01-20',
+                                            '2021-03-01', '2021-03-31']),
+        'days_supply': [30, 30, 10, 1],
+        'controller': 1,
+        'reliever': 0})
+    coverage = CalculateControllerCoverage(windows=[3]).get_coverage(df)
+    # the window is Dec 31 - Mar 31; the second fill starts on Jan 31 and
+    # the third one on Mar 2, after the supply before them runs out
+    assert coverage.controller_covered_days_3.tolist() == [70, 1]
+    assert coverage.controller_gap_days_3.tolist() == [21, 90]
+    assert coverage.controller_max_gap_3.tolist() == [20, 90]
+    assert coverage.controller_PDC_3.tolist() == [0.77, 0.01]
+
+
+def test_coverage_matches_day_by_day():
+    df = get_fills()
+    period = pd.Timestamp('2021-12-31')
+    coverage = CalculateControllerCoverage(period=period).get_coverage(df)
+    for months_back in [12, 6, 3]:
+        expected = get_reference_coverage(df, period, months_back)
+        columns = expected.columns.tolist()
+        actual = coverage.loc[coverage.member_medicaid_id.isin(
+            expected.member_medicaid_id), columns].reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from asthma.validate_statistics import ValidateStatistics
+from asthma.partitioning import PartitionByMember
+from asthma.data_processing import (GetCombinedMemberLevelData,
+                                    ClaimViewChunkedDataProcessing)
+
+
+@pytest.mark.parametrize('load_async', [True, False])
+def test_fast_validation_reads_footers_once(views, monkeypatch, load_async):
+    validated = []
+    validate = ValidateStatistics.validate
+
+    def validate_once(self):
+        validated.append(self._filepath)
+        return validate(self)
+
+    monkeypatch.setattr(ValidateStatistics, 'validate', validate_once)
+    GetCombinedMemberLevelData(*views, validate_schema=False,
+                               load_async=load_async,
+                               fast_validation=True).get_data()
+    assert sorted(validated) == sorted(views)
+
+
+@pytest.fixture
+def claims_without_bucket_revenue_codes(views, tmp_path):
+    # a valid file, but the claims of the first of two member buckets have
+    # no revenue codes at all
+    df = pd.read_parquet(views[0])
+    buckets = PartitionByMember(views[0], num_buckets=2)._get_bucket_numbers(
+        pa.array(df.member_medicaid_id))
+    df.loc[buckets == 0, 'revenue_code'] = np.nan
+    path = str(tmp_path / 'view.parquet')
+    df.to_parquet(path, index=False)
+    return path
+
+
+def test_chunked_claims_validate_the_whole_file(
+        claims_without_bucket_revenue_codes, capsys):
+    df = ClaimViewChunkedDataProcessing(
+        claims_without_bucket_revenue_codes, num_buckets=2,
+        validate_schema=False).get_member_level_data()
+    assert df.shape[0] == 100
+    # the Medicaid IDs are checked once, on the whole file
+    assert capsys.readouterr().out.count('Checking Member Medicaid IDs') == 1
+
+
+def test_chunked_claims_reject_missing_revenue_codes(views, tmp_path):
+    df = pd.read_parquet(views[0])
+    df['revenue_code'] = np.nan
+    path = str(tmp_path / 'view.parquet')
+    df.to_parquet(path, index=False)
+    with pytest.raises(AssertionError):
+        ClaimViewChunkedDataProcessing(
+            path, num_buckets=2, validate_schema=False).get_member_level_data()
+
+
+@pytest.fixture
+def neutral_views(views, tmp_path):
+    # file names that tell neither view apart
+    paths = []
+    for path, name in zip(views, ['view_a', 'view_b']):
+        paths.append(str(tmp_path / f'{name}.parquet'))
+        pd.read_parquet(path).to_parquet(paths[-1], index=False)
+    return paths
+
+
+@pytest.mark.parametrize('load_async', [True, False])
+@pytest.mark.parametrize('column, value, view', [
+    ('revenue_code', 5, 0), ('member_age_on_date_of_service', 30, 1)])
+def test_fast_validation_without_view_names(neutral_views, load_async,
+                                            column, value, view):
+    df = pd.read_parquet(neutral_views[view])
+    df.loc[0, column] = value
+    df.to_parquet(neutral_views[view], index=False)
+    with pytest.raises(AssertionError):
+        GetCombinedMemberLevelData(*neutral_views, validate_schema=False,
+                                   load_async=load_async,
+                                   fast_validation=True).get_data()
+
+
+def test_statistics_need_a_known_view(views):
+    with pytest.raises(ValueError):
+        ValidateStatistics(views[0], 'claims')
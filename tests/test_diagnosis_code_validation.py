@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from asthma.claim.claim_data_validation_cls import DiagnosisCodeValidation
+
+
+def get_claims():
+    # the header codes of rows 12 and 14 have no ICD version
+    return pd.DataFrame({
+        'claim_header_diagnosis_1': ['J45.20', '', 'J30.9', '  ', 'E66.9',
+                                     'K21.0'],
+        'claim_header_diagnosis_1_icd_vers': [10, np.nan, np.nan, np.nan,
+                                              np.nan, 10],
+        'claim_line_diagnosis_1': ['', 'J45.909', '', '', '', ''],
+        'claim_line_diagnosis_1_icd_vers': [np.nan, 10, np.nan, np.nan,
+                                            np.nan, np.nan],
+        'claim_header_diagnosis_desc': ['ASTHMA'] * 6,
+    }, index=range(10, 16))
+
+
+def test_report():
+    validation = DiagnosisCodeValidation(num_sample_rows=1)
+    with pytest.raises(ValueError, match='claim_header_diagnosis_1'):
+        validation.validate(get_claims())
+    report = validation.report
+    assert report.code_column.tolist() == ['claim_header_diagnosis_1',
+                                           'claim_line_diagnosis_1']
+    assert report.icd_column.tolist() == [
+        'claim_header_diagnosis_1_icd_vers', 'claim_line_diagnosis_1_icd_vers']
+    assert report.blank_codes.tolist() == [2, 5]
+    assert report.missing_icds.tolist() == [4, 5]
+    assert report.mismatches.tolist() == [2, 0]
+    assert report.sample_rows.tolist() == [[12], []]
+
+    validation = DiagnosisCodeValidation()
+    with pytest.raises(ValueError):
+        validation.validate(get_claims())
+    assert validation.report.sample_rows.tolist() == [[12, 14], []]
+
+
+def test_consistent_codes():
+    df = get_claims()
+    df['claim_header_diagnosis_1_icd_vers'] = df[
+        'claim_header_diagnosis_1_icd_vers'].fillna(10).where(
+            df.claim_header_diagnosis_1.str.strip() != '')
+    validation = DiagnosisCodeValidation()
+    validation.validate(df)
+    assert validation.report.mismatches.sum() == 0
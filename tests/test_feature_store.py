@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+from asthma.feature_store import MemberFeatureStore
+
+
+def get_features(index_date):
+    return pd.DataFrame({
+        'member_medicaid_id': ['100001', '100002', '100003'],
+        'amr': [0.5, 0.8, 1.0],
+        'last_visit': pd.to_datetime(['2020-01-05', '2020-02-10', None]),
+        'index_date': pd.Timestamp(index_date)})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MemberFeatureStore(str(tmp_path / 'features.db'))
+    store.materialize(get_features('2020-06-30'))
+    return store
+
+
+def test_get_member_features(store):
+    df = store.get_member_features([' 100003', 100001, '100003'])
+    assert df.member_medicaid_id.tolist() == ['100003', '100001']
+    assert df.amr.tolist() == [1.0, 0.5]
+    assert pd.api.types.is_datetime64_any_dtype(df.last_visit)
+    assert pd.api.types.is_datetime64_any_dtype(df.index_date)
+    assert store.get_member_features('999999').shape[0] == 0
+
+
+def test_get_member_features_without_ids(store):
+    df = store.get_member_features([])
+    assert df.shape[0] == 0
+    assert df.columns.tolist() == get_features('2020-06-30').columns.tolist()
+
+
+def test_get_member_features_in_chunks(store, monkeypatch):
+    monkeypatch.setattr(MemberFeatureStore, '_max_ids_per_query', 2)
+    df = store.get_member_features(['100003', '100002', '100001'])
+    assert df.member_medicaid_id.tolist() == ['100003', '100002', '100001']
+
+
+def test_get_member_features_as_of(store):
+    features = get_features('2020-12-31').assign(amr=[0.1, 0.2, 0.3])
+    # the later records have no other date column than the index date
+    store.materialize(features.drop(columns='last_visit').assign(
+        last_visit=None), replace=False)
+
+    df = store.get_member_features(['100001'], as_of='2020-09-30')
+    assert df.amr.tolist() == [0.5]
+    assert df.last_visit.tolist() == [pd.Timestamp('2020-01-05')]
+    df = store.get_member_features(['100001'])
+    assert df.amr.tolist() == [0.1]
+    assert df.index_date.tolist() == [pd.Timestamp('2020-12-31')]
+    # the date columns of the earlier records are still parsed
+    assert pd.api.types.is_datetime64_any_dtype(df.last_visit)
+
+
+def test_materialize_needs_an_index_date(store):
+    with pytest.raises(ValueError):
+        store.materialize(get_features('2020-06-30').drop(
+            columns='index_date'))
@@ -0,0 +1,27 @@
+import importlib
+import subprocess
+import sys
+import pytest
+import asthma
+
+
+@pytest.mark.parametrize('name', asthma.__all__)
+def test_exports(name):
+    module = importlib.import_module(asthma._exports[name])
+    assert getattr(asthma, name) is getattr(module, name)
+    assert name in dir(asthma)
+
+
+def test_unknown_name():
+    with pytest.raises(AttributeError, match='no attribute'):
+        asthma.NoSuchClass
+    assert not hasattr(asthma, 'NoSuchClass')
+
+
+def test_import_does_not_load_pandas():
+    code = ('import sys, asthma; '
+            'print(sorted(m for m in ("pandas", "numpy", "pyarrow") '
+            'if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+from asthma.claim.claim_member_level_cls import IdentifyPastInpatientVisits
+
+
+def get_visits():
+    # member 1 has adjacent (Jan 1-2), gapped (Jan 5) and distant (Jan 20)
+    # inpatient days, member 2 two days apart, member 3 no inpatient days
+    rows = [('1', '2021-01-01', 1, 1), ('1', '2021-01-02', 1, 0),
+            ('1', '2021-01-02', 1, 0), ('1', '2021-01-05', 1, 0),
+            ('1', '2021-01-20', 1, 1), ('2', '2021-03-01', 1, 0),
+            ('2', '2021-03-03', 1, 0), ('3', '2021-03-31', 0, 0)]
+    df = pd.DataFrame(rows, columns=['member_medicaid_id', 'dos_from', 'inpt',
+                                     'prm_sec_as'])
+    return df.assign(dos_from=pd.to_datetime(df.dos_from), ED=0,
+                     outpt=1 - df.inpt, virtual=0, visitID=range(len(df)),
+                     total_paid_amt=10.0, claimid=range(len(df)),
+                     prm_as=df.prm_sec_as, attending_providerid='P1')
+
+
+@pytest.mark.parametrize('stay_gap_days, stays, asthma_stays', [
+    (1, [3, 2, 0], [2, 0, 0]), (3, [2, 1, 0], [2, 0, 0]),
+    (15, [1, 1, 0], [2, 0, 0]), (20, [1, 1, 0], [1, 0, 0])])
+def test_unique_stays(stay_gap_days, stays, asthma_stays):
+    visits = IdentifyPastInpatientVisits(get_visits(),
+                                         stay_gap_days=stay_gap_days)
+    df = visits.get_all_cause_unique_inpt_visits()
+    assert df.member_medicaid_id.tolist() == ['1', '2', '3']
+    assert df.inpt_u_n12.tolist() == stays
+    assert df.inpt_u_n3.tolist() == stays
+    df = visits.get_asthma_unique_inpt_visits()
+    assert df.inpt_as_u_n12.tolist() == asthma_stays
+
+
+def test_stay_episodes():
+    episodes = IdentifyPastInpatientVisits(
+        get_visits(), stay_gap_days=1).get_inpt_stay_episodes()
+    # one row per member and day, numbered by stay
+    assert episodes.dos.dt.day.tolist() == [1, 2, 5, 20, 1, 3]
+    assert episodes.stay_id.tolist() == [1, 1, 2, 3, 4, 5]
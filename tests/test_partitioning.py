@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from asthma.partitioning import PartitionByMember
+
+
+@pytest.fixture
+def view(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    path = str(tmp_path_factory.mktemp('view') / 'view.parquet')
+    pd.DataFrame({
+        'Member Medicaid ID': rng.integers(100_000, 100_100, 1_500)
+        .astype(str),
+        'DOS From': pd.Timestamp('2021-01-01') + pd.to_timedelta(
+            rng.integers(0, 365, 1_500), unit='D'),
+        'value': range(1_500),
+    }).to_parquet(path, index=False)
+    return path
+
+
+def test_partition(view, tmp_path):
+    partitioner = PartitionByMember(view, num_buckets=4, batch_size=400,
+                                    date_column='dos_from')
+    paths = partitioner.partition(str(tmp_path))
+    buckets = [pd.read_parquet(path) for path in paths]
+
+    df = pd.read_parquet(view)
+    assert sum(bucket.shape[0] for bucket in buckets) == df.shape[0]
+    # every member ends up in a single bucket
+    members = [set(bucket['Member Medicaid ID']) for bucket in buckets]
+    assert sum(len(m) for m in members) == len(set.union(*members))
+    assert partitioner.max_date == df['DOS From'].max()
+
+
+def test_partition_strips_member_ids(tmp_path):
+    path = str(tmp_path / 'view.parquet')
+    pd.DataFrame({'Member Medicaid ID': ['100001', ' 100001 ', '100002'] * 10,
+                  'value': range(30)}).to_parquet(path, index=False)
+    paths = PartitionByMember(path, num_buckets=8).partition(str(tmp_path))
+    counts = [pd.read_parquet(p)['Member Medicaid ID'].str.strip()
+              .eq('100001').sum() for p in paths]
+    assert sorted(counts)[-2:] == [0, 20]
+
+
+def test_partition_calls_on_batch(view, tmp_path):
+    num_rows = []
+    PartitionByMember(view, num_buckets=2, batch_size=500).partition(
+        str(tmp_path), on_batch=lambda batch: num_rows.append(batch.num_rows))
+    assert num_rows == [500, 500, 500]
+
+
+def test_partition_needs_a_bucket(view):
+    with pytest.raises(ValueError):
+        PartitionByMember(view, num_buckets=0)
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+from asthma.claim.claim_member_level_cls import PastVisitsData
+
+
+def get_visits():
+    return pd.DataFrame({
+        'member_medicaid_id': ['1', '1', '1', '1', '1', '2'],
+        'ED': [1, 1, 1, 1, 0, 1],
+        'inpt': [0] * 6,
+        'outpt': [0, 0, 0, 0, 1, 0],
+        'virtual': [0] * 6,
+        'dos_from': pd.to_datetime(['2021-01-05 10:00', '2021-01-05 10:00',
+                                    '2021-01-05 14:00', '2021-01-05 10:00',
+                                    '2021-02-01', '2021-01-05']),
+        'visitID': ['1_a', '1_a', '1_a', '1_a', '1_b', '2_a'],
+        'total_paid_amt': [10.0, 10.0, 10.0, 25.0, 5.0, 10.0],
+        'claimid': ['c1', 'c1', 'c1', 'c1', 'c2', 'c1'],
+        'prm_as': [1, 1, 1, 1, 0, 1],
+        'prm_sec_as': [1, 1, 1, 1, 0, 1],
+        'attending_providerid': ['p1'] * 6,
+        'claim_line_number': range(6),
+    }, index=[10, 11, 12, 13, 14, 15])
+
+
+def test_drop_duplicates():
+    data = PastVisitsData(get_visits()).data
+    # row 11 is a copy of row 10, and row 12 only differs in the time of
+    # service; row 13 differs in the paid amount, row 15 in the member
+    assert 'dos_from' not in data.columns
+    assert 'claim_line_number' not in data.columns
+    rows = data[['member_medicaid_id', 'dos', 'total_paid_amt']]
+    assert sorted(rows.itertuples(index=False, name=None)) == [
+        ('1', pd.Timestamp('2021-01-05'), 10.0),
+        ('1', pd.Timestamp('2021-01-05'), 25.0),
+        ('1', pd.Timestamp('2021-02-01'), 5.0),
+        ('2', pd.Timestamp('2021-01-05'), 10.0)]
+
+
+def test_drop_duplicates_keeps_first_row():
+    df = get_visits().drop('claim_line_number', axis=1).iloc[[1, 0, 3]]
+    data = PastVisitsData._drop_duplicates(df)
+    assert data.index.tolist() == [11, 13]
+    assert PastVisitsData._drop_duplicates(df.iloc[:0]).empty
+
+
+def test_missing_column():
+    with pytest.raises(KeyError, match='claimid'):
+        PastVisitsData(get_visits().drop('claimid', axis=1))
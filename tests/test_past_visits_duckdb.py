@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+from asthma.data_processing import ClaimViewDataProcessing
+from asthma.claim.claim_member_level_cls import IdentifyPastVisits
+
+pytest.importorskip('duckdb')
+from asthma.claim.claim_member_level_duckdb import IdentifyPastVisitsDuckDB
+
+
+@pytest.fixture(scope='module')
+def claims(views):
+    return ClaimViewDataProcessing(
+        views[0], validate_schema=False).get_processed_data()
+
+
+@pytest.mark.parametrize('period', [None, pd.Timestamp('2021-06-30')])
+def test_duckdb_matches_pandas(claims, period):
+    expected = IdentifyPastVisits.get_past_visits(claims, period)
+    df = IdentifyPastVisits.get_past_visits(claims, period, backend='duckdb')
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_duckdb_reads_parquet(claims, tmp_path):
+    path = str(tmp_path / 'claims.parquet')
+    claims.to_parquet(path, index=False)
+    expected = IdentifyPastVisits.get_past_visits(claims)
+    df = IdentifyPastVisitsDuckDB(path, threads=1).get_past_visits()
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_unknown_backend(claims):
+    with pytest.raises(ValueError):
+        IdentifyPastVisits.get_past_visits(claims, backend='spark')
@@ -0,0 +1,34 @@
+import pandas as pd
+from asthma.pharmacy.pharmacy_data_processing_cls import (
+    IdentifyControllersRelievers)
+
+
+def get_fills():
+    return pd.DataFrame({
+        'generic_product_name': [
+            'ZILEUTON 600 MG ORAL TABLET', ' zileuton 600 mg oral tablet ',
+            'ZILEUTON 600 MG ORAL TABLET EXTENDED RELEASE',
+            'TABLET ORAL MG 600 ZILEUTON', 'ZILEUTON 600MG ORAL TABLET',
+            'ALBUTEROL 90 MCG/INH', 'ZILEUTON 600 MG ORAL TABLET'],
+        'claim_status': ['PAID', 'paid ', 'PAID', 'PAID', 'PAID', 'PAID',
+                         'REVERSED'],
+    })
+
+
+def test_exact_controllers():
+    # at the default cutoff only names spelled as in the codebook are
+    # controllers, as with the original fuzzywuzzy search
+    df = get_fills()
+    IdentifyControllersRelievers().get_controllers_and_relievers(df)
+    assert df.controller.tolist() == [1, 1, 0, 0, 0, 0, 0]
+    assert df.reliever.tolist() == [0, 0, 0, 0, 0, 1, 0]
+
+
+def test_near_matched_controllers():
+    df = get_fills()
+    identifier = IdentifyControllersRelievers(score_cutoff=90)
+    identifier.get_controllers_and_relievers(df)
+    assert df.controller.tolist() == [1, 1, 1, 1, 1, 0, 0]
+    report = identifier.match_report.set_index('generic_product_name')
+    assert report.loc['TABLET ORAL MG 600 ZILEUTON', 'match_type'] == 'exact'
+    assert report.loc['ZILEUTON 600MG ORAL TABLET', 'match_type'] == 'near'
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+from asthma.claim.claim_data_validation_cls import (ParsePlaceOfServiceCodes,
+                                                   ValidatePlaceOfServiceCodes)
+
+
+def test_parse():
+    codes = pd.Series(['Not Applicable', ' 23 ', '02', '23', '11 '],
+                      index=[5, 6, 7, 8, 9], name='place_of_service')
+    arr = ParsePlaceOfServiceCodes.parse(codes)
+    assert arr.tolist() == [0, 23, 2, 23, 11]
+    assert arr.dtype == np.int8
+    assert arr.index.tolist() == [5, 6, 7, 8, 9]
+    assert arr.name == 'place_of_service'
+    # parsed codes are passed through
+    assert ParsePlaceOfServiceCodes.parse(arr) is arr
+    assert ParsePlaceOfServiceCodes.parse(
+        pd.Series([21, 0])).tolist() == [21, 0]
+
+
+@pytest.mark.parametrize('codes', [['21', None], ['21', '123'], ['21', '-1'],
+                                   ['21', 'AB']])
+def test_parse_invalid_codes(codes):
+    with pytest.raises(ValueError):
+        ParsePlaceOfServiceCodes.parse(pd.Series(codes))
+
+
+def test_validate():
+    arr = ValidatePlaceOfServiceCodes().validate(pd.Series(['21', ' 11']))
+    assert arr.tolist() == [21, 11]
+    with pytest.raises(AssertionError):
+        ValidatePlaceOfServiceCodes().validate(
+            pd.Series(['Not Applicable', ' Not Applicable ']))
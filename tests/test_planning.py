@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+from asthma.planning import ExecutionPlanner
+from asthma.data_processing import (ViewChunkedDataProcessing,
+                                    GetCombinedMemberLevelData)
+
+
+@pytest.fixture(scope='module')
+def in_memory(views):
+    return GetCombinedMemberLevelData(*views, validate_schema=False).get_data()
+
+
+def test_chunked_processing_is_abstract(views):
+    with pytest.raises(TypeError):
+        ViewChunkedDataProcessing(views[0])
+
+
+def test_footprint(views):
+    footprint = ExecutionPlanner(*views, 1_000).estimate_footprint()
+    assert footprint.pipeline.tolist() == ['claim', 'pharmacy']
+    assert footprint.num_rows.tolist() == [3_000, 1_500]
+    assert footprint.num_members.tolist() == [100, 100]
+    assert (footprint.process_peak_bytes > footprint.loaded_bytes).all()
+
+
+def test_plan_strategies(views):
+    planner = ExecutionPlanner(*views, 1_000)
+    claim = planner.estimate_footprint().to_dict('records')[0]
+    peak = claim['process_peak_bytes']
+    assert planner._plan_pipeline(claim, 10 * peak)['strategy'] == 'in_memory'
+
+    step = planner._plan_pipeline(claim, peak / 2)
+    assert step['strategy'] == 'chunked'
+    assert step['num_buckets'] >= 2
+    assert step['peak_bytes'] <= peak / 2
+
+    # no room for the outputs, so they go to disk
+    planner._output_bytes_per_member = {'claim': peak, 'pharmacy': peak}
+    claim = planner.estimate_footprint().to_dict('records')[0]
+    assert planner._plan_pipeline(claim, peak / 2)['strategy'] == 'spill'
+
+    with pytest.raises(MemoryError):
+        planner._plan_pipeline(claim, 1)
+
+
+def test_plan_over_budget(views):
+    with pytest.raises(MemoryError):
+        ExecutionPlanner(*views, 1).get_plan()
+
+
+def test_in_memory_plan(views, in_memory):
+    planner = ExecutionPlanner(*views, 100_000)
+    assert planner.get_plan().strategy.tolist() == ['in_memory'] * 2
+    pd.testing.assert_frame_equal(planner.get_data(validate_schema=False),
+                                  in_memory)
+
+
+@pytest.mark.parametrize('strategy', ['chunked', 'spill'])
+def test_bucketed_plans(views, in_memory, tmp_path, strategy):
+    planner = ExecutionPlanner(*views, 100_000)
+    planner.get_plan()
+    planner.plan['strategy'] = strategy
+    planner.plan['num_buckets'] = 4
+    planner.plan['batch_size'] = pd.array([1_000, 1_000], dtype='Int64')
+    df = planner.get_data(validate_schema=False, tmp_dir=str(tmp_path))
+    # counts of buckets without missing members stay integers
+    pd.testing.assert_frame_equal(df, in_memory, check_dtype=False)
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+from asthma.claim.claim_member_level_cls import ProviderAttribution
+
+
+def get_visits():
+    rows = [('1', '2021-12-01', 'P1', 1), ('1', '2021-11-01', 'P1', 1),
+            ('1', '2021-11-01', 'P1', 1), ('1', '2021-03-01', 'P2', 1),
+            ('1', '2021-02-01', 'P2', 1), ('1', '2021-01-15', 'P2', 1),
+            ('1', '2021-12-15', None, 1), ('2', '2021-06-01', 'PA', 1),
+            ('2', '2021-10-01', 'PB', 1), ('3', '2021-12-01', 'P1', 0)]
+    df = pd.DataFrame(rows, columns=['member_medicaid_id', 'dos_from',
+                                     'attending_providerid', 'outpt'])
+    return df.assign(dos_from=pd.to_datetime(df.dos_from),
+                     ED=1 - df.outpt, inpt=0, virtual=0,
+                     visitID=range(df.shape[0]), total_paid_amt=10.0,
+                     claimid=[str(i) for i in range(df.shape[0])],
+                     prm_as=0, prm_sec_as=0)
+
+
+def test_attributions():
+    df = ProviderAttribution(get_visits(), period='2021-12-31',
+                             windows=(3, 12)).get_attributions()
+    assert df.member_medicaid_id.tolist() == ['1', '2', '3']
+    # the same day with a provider counts once
+    assert df.attributed_provider_12.tolist()[:2] == ['P2', 'PB']
+    assert df.attributed_visits_12.tolist() == [3, 1, 0]
+    assert df.attributed_provider_3.tolist()[:2] == ['P1', 'PB']
+    assert df.attributed_visits_3.tolist() == [2, 1, 0]
+    assert df.attributed_provider_12.isnull().tolist() == [False, False, True]
+
+
+def test_attributions_tie_breaker():
+    df = ProviderAttribution(get_visits(), period='2021-12-31', windows=[12],
+                             tie_breaker='provider').get_attributions()
+    assert df.attributed_provider_12.tolist()[:2] == ['P2', 'PA']
+    with pytest.raises(ValueError):
+        ProviderAttribution(get_visits(), tie_breaker='visits')
+
+
+def test_visit_table_and_panel_sizes():
+    attribution = ProviderAttribution(get_visits(), period='2021-12-31',
+                                      windows=(12, 3))
+    table = attribution.get_visit_table()
+    assert table.attending_providerid.tolist() == ['P1', 'P2', 'PA', 'PB']
+    assert table.outpt_visits_12.tolist() == [2, 3, 1, 1]
+    assert table.last_visit.tolist() == pd.to_datetime(
+        ['2021-12-01', '2021-03-01', '2021-06-01', '2021-10-01']).tolist()
+
+    panel = attribution.get_panel_sizes()
+    assert panel.panel_size_12.tolist() == [0, 1, 0, 1]
+    assert panel.panel_size_3.tolist() == [1, 0, 0, 1]
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from asthma.segments import MemberSegments
+
+
+def get_rows(seed=0, n=200):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'member_medicaid_id': rng.choice(['3', '1', '2', None], n,
+                                         p=[0.3, 0.3, 0.3, 0.1]),
+        'dos': (pd.Timestamp('2021-01-01') +
+                pd.to_timedelta(rng.integers(0, 60, n), unit='D')),
+        'value': rng.integers(0, 5, n),
+        'amount': np.where(rng.random(n) < 0.2, np.nan, rng.random(n)),
+        'mask': rng.random(n) < 0.5})
+    return df
+
+
+def test_sort():
+    df = get_rows()
+    segments = MemberSegments(df.member_medicaid_id, df.dos)
+    data = segments.sort(df)
+    expected = (df.dropna(subset=['member_medicaid_id'])
+                .sort_values(['member_medicaid_id', 'dos'], kind='stable')
+                .reset_index(drop=True))
+    pd.testing.assert_frame_equal(data, expected)
+    assert segments.members.tolist() == ['1', '2', '3']
+
+    data = MemberSegments(df.member_medicaid_id, df.dos,
+                          descending=True).sort(df)
+    assert (data.groupby('member_medicaid_id').dos.diff().dropna() <=
+            pd.Timedelta(0)).all()
+
+
+def test_reductions():
+    df = get_rows()
+    segments = MemberSegments(df.member_medicaid_id, df.dos)
+    data = segments.sort(df)
+    grouped = data.groupby('member_medicaid_id')
+    masked = data.loc[data['mask']].groupby('member_medicaid_id')
+
+    assert segments.sum(data.value).tolist() == grouped.value.sum().tolist()
+    np.testing.assert_allclose(segments.sum(data.amount),
+                               grouped.amount.sum())
+    assert (segments.count(data['mask']).tolist() ==
+            masked.size().reindex(segments.members, fill_value=0).tolist())
+    assert (segments.any(data.value == 4).tolist() ==
+            grouped.value.apply(lambda x: (x == 4).any()).tolist())
+    np.testing.assert_allclose(
+        segments.max(data.value, data['mask']),
+        masked.value.max().reindex(segments.members))
+    assert (pd.Series(segments.max(data.dos, data['mask'])).tolist() ==
+            masked.dos.max().reindex(segments.members).tolist())
+    assert (segments.count_distinct_dates(data['mask']).tolist() ==
+            masked.dos.nunique().reindex(segments.members,
+                                         fill_value=0).tolist())
+
+
+def test_date_any():
+    df = get_rows()
+    segments = MemberSegments(df.member_medicaid_id, df.dos)
+    data = segments.sort(df)
+    expected = (data.groupby(['member_medicaid_id', 'dos'])['mask']
+                .transform('any'))
+    assert segments.date_any(data['mask']).tolist() == expected.tolist()
+
+
+def test_nth_index():
+    df = get_rows()
+    segments = MemberSegments(df.member_medicaid_id, df.dos)
+    data = segments.sort(df)
+    rows = data.loc[data['mask']].reset_index().groupby('member_medicaid_id')
+    for n in [1, 2]:
+        expected = rows['index'].nth(n - 1).tolist()
+        idx = segments.nth_index(n, data['mask'])
+        assert idx[idx >= 0].tolist() == expected
+        expected = rows['index'].nth(-n).tolist()
+        idx = segments.nth_index(n, data['mask'], from_end=True)
+        assert idx[idx >= 0].tolist() == expected
+    assert segments.first_index().tolist() == segments.starts.tolist()
+    assert segments.last_index().tolist() == (segments.ends - 1).tolist()
+    values = MemberSegments.take_index(data.amount.fillna(0),
+                                       np.array([0, -1]))
+    assert np.isnan(values[1])
+
+
+def test_without_rows():
+    segments = MemberSegments(pd.Series([], dtype=object),
+                              pd.Series([], dtype='datetime64[ns]'))
+    assert segments.members.shape[0] == 0
+    assert segments.sum(np.zeros(0)).shape[0] == 0
+    assert segments.count().shape[0] == 0
+    assert segments.max(np.zeros(0)).shape[0] == 0
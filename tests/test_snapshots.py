@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from asthma.claim.claim_member_level_cls import (
+    IdentifyPastVisits, IdentifyPastInpatientVisits,
+    IdentifyPastVisitsSnapshots)
+
+
+def get_visits(seed=0, n=600):
+    rng = np.random.default_rng(seed)
+    types = rng.choice(['ED', 'inpt', 'outpt', 'virtual'], n,
+                       p=[0.2, 0.2, 0.5, 0.1])
+    df = pd.DataFrame({
+        'member_medicaid_id': rng.integers(0, 20, n).astype(str),
+        'dos_from': (pd.Timestamp('2020-01-01') +
+                     pd.to_timedelta(rng.integers(0, 730, n), unit='D')),
+        'ED': (types == 'ED').astype(int),
+        'inpt': (types == 'inpt').astype(int),
+        'outpt': np.isin(types, ['outpt', 'virtual']).astype(int),
+        'virtual': (types == 'virtual').astype(int),
+        'total_paid_amt': rng.gamma(2, 100, n).round(2),
+        'prm_sec_as': rng.integers(0, 2, n),
+        'attending_providerid': rng.choice(['P1', 'P2', 'P3', None], n)})
+
+    # member 20 has its first claim after the first index date, and member
+    # 21 an inpatient stay from Mar 28 to Mar 31, across the start of the 3
+    # months window (Mar 30) of the Jun 30 index date
+    extra = pd.DataFrame({
+        'member_medicaid_id': ['20', '20', '21', '21', '21', '21'],
+        'dos_from': pd.to_datetime(['2021-09-01', '2021-10-01', '2021-03-28',
+                                    '2021-03-29', '2021-03-30',
+                                    '2021-03-31']),
+        'ED': 0, 'inpt': [0, 0, 1, 1, 1, 1], 'outpt': [1, 1, 0, 0, 0, 0],
+        'virtual': 0, 'total_paid_amt': 50.0, 'prm_sec_as': 1,
+        'attending_providerid': 'P1'})
+    df = pd.concat([df, extra], ignore_index=True)
+    return df.assign(
+        visitID=df.member_medicaid_id + df.dos_from.dt.strftime('%Y%m%d'),
+        claimid=[str(i) for i in range(len(df))], prm_as=df.prm_sec_as)
+
+
+def get_expected(df, index_date, stay_gap_days):
+    # the features of a single period on the claims up to the index date
+    visits = df.loc[df.dos_from <= index_date]
+    expected = IdentifyPastVisits.get_past_visits(visits, period=index_date)
+    inpt = IdentifyPastInpatientVisits(visits, period=index_date,
+                                       stay_gap_days=stay_gap_days)
+    stays = inpt.get_all_cause_unique_inpt_visits().merge(
+        inpt.get_asthma_unique_inpt_visits())
+    columns = ['inpt_u_n12', 'inpt_u_n3', 'inpt_as_u_n12', 'inpt_as_u_n3']
+    expected[columns] = stays[columns].values
+    return expected
+
+
+@pytest.mark.parametrize('stay_gap_days', [1, 3, 10])
+def test_snapshots_match_single_period(stay_gap_days):
+    df = get_visits()
+    index_dates = pd.to_datetime(['2020-03-31', '2021-06-30', '2021-12-31'])
+    snapshots = IdentifyPastVisitsSnapshots(
+        df, index_dates, stay_gap_days=stay_gap_days).get_past_visits()
+    for index_date in index_dates:
+        actual = (snapshots.loc[snapshots.index_date == index_date]
+                  .drop(columns='index_date').reset_index(drop=True))
+        expected = get_expected(df, index_date, stay_gap_days)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_snapshots_members():
+    df = get_visits()
+    snapshots = IdentifyPastVisits.get_past_visits_snapshots(
+        df, ['2021-06-30', '2021-12-31'])
+    members = snapshots.groupby('index_date').member_medicaid_id.apply(set)
+    # a member is only part of the snapshots after its first claim
+    assert '20' not in members.iloc[0]
+    assert '20' in members.iloc[1]
+    # the stay across the window start counts once in the 3 months window
+    row = snapshots.loc[(snapshots.member_medicaid_id == '21') &
+                        (snapshots.index_date == '2021-06-30')]
+    assert row.inpt_u_n3.tolist() == [1]
+    assert row.inpt_n3.tolist() == [2]
@@ -0,0 +1,46 @@
+import pandas as pd
+from asthma.claim.claim_data_processing_cls import IdentifyVisitTypes
+from asthma.claim.claim_member_level_cls import IdentifyPastVisits
+
+
+def test_virtual_visit_types():
+    df = pd.DataFrame({
+        'member_medicaid_id': ['1', '2', '2', '3'],
+        'dos_from': pd.to_datetime(['2021-01-01'] * 4),
+        'revenue_code': [None, None, 100, None],
+        'place_of_service': ['02', '10', '10', '11']})
+    IdentifyVisitTypes().extract_visit_types(df)
+    # flagged alongside outpatient visits, unless inpatient takes over
+    assert df.virtual.tolist() == [1, 0, 0, 0]
+    assert df.outpt.tolist() == [1, 0, 0, 1]
+
+
+def get_visits():
+    # member 1 has virtual visits on Jan 10 (asthma) and Jun 1 (two lines),
+    # and both members an outpatient visit that isn't virtual
+    rows = [('1', '2021-01-10', 1, 20.0, 1), ('1', '2021-06-01', 1, 30.0, 0),
+            ('1', '2021-06-01', 1, 5.0, 0), ('1', '2021-06-15', 0, 10.0, 0),
+            ('2', '2021-05-01', 0, 10.0, 1)]
+    df = pd.DataFrame(rows, columns=['member_medicaid_id', 'dos_from',
+                                     'virtual', 'total_paid_amt',
+                                     'prm_sec_as'])
+    return df.assign(dos_from=pd.to_datetime(df.dos_from), ED=0, inpt=0,
+                     outpt=1, visitID=df.member_medicaid_id + df.dos_from,
+                     claimid=[str(i) for i in range(len(df))],
+                     prm_as=df.prm_sec_as, attending_providerid='P1')
+
+
+def test_virtual_visit_features():
+    df = IdentifyPastVisits.get_past_visits(get_visits())
+    assert df.member_medicaid_id.tolist() == ['1', '2']
+    assert df.virtual_n12.tolist() == [2, 0]
+    assert df.virtual_pd_12.tolist() == [55.0, 0]
+    assert df.virtual_as_n12.tolist() == [1, 0]
+    assert df.virtual_as_pd_12.tolist() == [20.0, 0]
+    assert df.virtual_n6.tolist() == [2, 0]
+    # the 3 months window starts on Mar 15
+    assert df.virtual_n3.tolist() == [1, 0]
+    assert df.virtual_pd_3.tolist() == [35.0, 0]
+    assert df.virtual_as_n3.tolist() == [0, 0]
+    # virtual visits are also counted as outpatient visits
+    assert df.outpt_n12.tolist() == [3, 1]
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from asthma.claim.claim_data_processing_cls import IdentifyVisitTypes
+
+
+def get_claims():
+    # member 1 has inpatient, ED and outpatient lines on one visit, member 2
+    # ED and outpatient lines, member 3 an outpatient line only
+    rows = [('1', '2021-01-01', 100, 'Not Applicable'),
+            ('1', '2021-01-01', 450, ' 23'), ('1', '2021-01-01', 510, '11'),
+            ('2', '2021-01-01', np.nan, '23'), ('2', '2021-01-01', 510, '11'),
+            ('3', '2021-01-01', np.nan, '11')]
+    df = pd.DataFrame(rows, columns=['member_medicaid_id', 'dos_from',
+                                     'revenue_code', 'place_of_service'])
+    return df.assign(dos_from=pd.to_datetime(df.dos_from))
+
+
+def test_visit_type_precedence():
+    df = get_claims()
+    IdentifyVisitTypes().extract_visit_types(df)
+    # inpatient takes precedence over ED over outpatient on a visit
+    assert df.inpt.tolist() == [1, 1, 1, 0, 0, 0]
+    assert df.ED.tolist() == [0, 0, 0, 1, 1, 0]
+    assert df.outpt.tolist() == [0, 0, 0, 0, 0, 1]
+    assert df.visitID.tolist() == ['1-20210101'] * 3 + ['2-20210101'] * 2 + [
+        '3-20210101']